@@ -1,7 +1,5 @@
 import os
-import sys
-import re
-import shutil
+import queue
 import signal
 import subprocess
 import threading
@@ -10,22 +8,30 @@ from tkinter import ttk, filedialog
 from tkinterdnd2 import TkinterDnD, DND_FILES
 import winreg
 import ctypes
-import concurrent.futures
-from concurrent.futures import ThreadPoolExecutor
-import time
-
-def resource_path(relative_path):
-    """ Получает корректный путь для ресурсов в exe и dev режиме """
-    if hasattr(sys, '_MEIPASS'):
-        return os.path.join(sys._MEIPASS, relative_path)
-    else:
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        return os.path.join(script_dir, relative_path)
-   
+
+import engine
+from engine import (resource_path, find_tool, get_base_name, pair_tracks,
+                    get_track_language_info, select_embedded_tracks,
+                    resolve_target_audio_index, BatchEngine, MixSettings)
+from encoders import DEFAULT_PROFILE
+from loudness import DEFAULT_TARGET_LUFS, DEFAULT_RATIO_DB
+from ducking import DEFAULT_DUCK_DB
+from variants import parse_variant
+from scheduler import DEFAULT_ORDER, ORDER_POLICIES
+from telemetry import default_report_dir
+from joblog import default_log_dir
+from watcher import FolderFeed, DEFAULT_VIDEO_WAIT
+from pairing import FilePairing
+import preview
+from probe_pool import ProbePool, DEFAULT_PROBE_WORKERS
+from ui_updates import UiUpdateQueue, DEFAULT_REFRESH_HZ
+
 def save_to_registry(key_name, value):
     try:
         reg_key = winreg.CreateKey(winreg.HKEY_CURRENT_USER, r"Software\MergeApp")
-        winreg.SetValueEx(reg_key, key_name, 0, winreg.REG_DWORD, value)
+        # Строковые настройки (job_order, encoder_profile) - REG_SZ, остальные - DWORD
+        value_type = winreg.REG_SZ if isinstance(value, str) else winreg.REG_DWORD
+        winreg.SetValueEx(reg_key, key_name, 0, value_type, value)
         winreg.CloseKey(reg_key)
     except Exception as e:
         print(f"Ошибка при сохранении в реестр: {e}")
@@ -50,9 +56,6 @@ def minimize_console():
     if hwnd:
         user32.ShowWindow(hwnd, 6)
 
-video_ext = ['.flv', '.mp4', '.avi', '.mov', '.mkv', '.m4v']
-audio_ext = ['.mp3', '.wav', '.flac', '.aac']
-
 class ToolTip:
     def __init__(self, widget, text):
         self.widget = widget
@@ -84,6 +87,103 @@ class ToolTip:
             self.tooltip.destroy()
             self.tooltip = None
 
+class TreeRows:
+    """Модель строк списка с ключом base.
+
+    Хранит base <-> item и последние значения строк, поэтому поиск строки
+    занимает O(1), а в Treeview уходят только реально изменившиеся строки.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.items = {}    # base -> item
+        self.bases = {}    # item -> base
+        self.rows = {}     # base -> (values, status)
+        self.order = []    # base в порядке отображения
+
+    def __contains__(self, base):
+        return base in self.items
+
+    def base_of(self, item):
+        return self.bases.get(item)
+
+    def values_of(self, base):
+        row = self.rows.get(base)
+        return row[0] if row else None
+
+    def status_of(self, base):
+        row = self.rows.get(base)
+        return row[1] if row else None
+
+    def set_row(self, base, values, status):
+        """Обновляет одну строку; False, если такой строки нет"""
+        item = self.items.get(base)
+        if item is None:
+            return False
+        values = tuple(values)
+        if self.rows[base] != (values, status):
+            self.tree.item(item, values=values, tags=(status,))
+            self.rows[base] = (values, status)
+        return True
+
+    def remove(self, bases):
+        """Удаляет строки разом: порядок пересобирается один раз, а не order.remove на каждую"""
+        removed = set()
+        items = []
+        for base in bases:
+            item = self.items.pop(base, None)
+            if item is None:
+                continue
+            del self.bases[item]
+            del self.rows[base]
+            removed.add(base)
+            items.append(item)
+        if not items:
+            return
+        self.order = [base for base in self.order if base not in removed]
+        self.tree.delete(*items)
+
+    def clear(self):
+        self.tree.delete(*self.items.values())
+        self.items.clear()
+        self.bases.clear()
+        self.rows.clear()
+        self.order = []
+
+    def sync(self, rows):
+        """Приводит список к rows = [(base, values, status), ...], трогая только отличия"""
+        new_order = [base for base, _, _ in rows]
+        wanted = set(new_order)
+        self.remove([base for base in self.order if base not in wanted])
+
+        # Оставшиеся строки переставляем, только если сменился их взаимный порядок
+        kept = [base for base in new_order if base in self.items]
+        if kept != self.order:
+            for index, base in enumerate(kept):
+                self.tree.move(self.items[base], '', index)
+            self.order = kept
+
+        for index, (base, values, status) in enumerate(rows):
+            if base in self.items:
+                self.set_row(base, values, status)
+                continue
+            values = tuple(values)
+            item = self.tree.insert('', index, values=values, tags=(status,))
+            self.items[base] = item
+            self.bases[item] = base
+            self.rows[base] = (values, status)
+        self.order = new_order
+
+    def visible_bases(self):
+        """base строк, попадающих в видимую область списка"""
+        if not self.order:
+            return []
+        first, last = self.tree.yview()
+        start = int(float(first) * len(self.order))
+        end = min(len(self.order), int(float(last) * len(self.order)) + 1)
+        return self.order[start:end]
+
+
 class MergeApp(TkinterDnD.Tk):
     def __init__(self):
         super().__init__()
@@ -101,6 +201,12 @@ class MergeApp(TkinterDnD.Tk):
         self.ffmpeg_process = None
         self.ffplay_process = None
         self.preview_button = None
+        # Декодированные окна дорожек для предпрослушивания (до ~256 МБ)
+        self.pcm_cache = preview.PcmCache()
+        self.preview_player = None
+        self.preview_position = tk.StringVar(value="0:00")
+        self.preview_sources = None
+        self.preview_request = 0
         self.processed = 0
         signal.signal(signal.SIGINT, self.handle_sigint)
         self.protocol("WM_DELETE_WINDOW", self.on_close)
@@ -109,7 +215,7 @@ class MergeApp(TkinterDnD.Tk):
         self.animation_index = 0
         self.after_id = None
         self.stop_event = None
-        self.active_ffmpeg_processes = []
+        self.batch_engine = None
         self.geometry("370x440")
         self.minsize(370, 440)
         self.attributes('-topmost', 1)
@@ -124,57 +230,68 @@ class MergeApp(TkinterDnD.Tk):
         self.file_pairs = {}
         self.created_files = []
         self.skipped_files = []
-        self.all_files = {'video': [], 'audio': []}
+        self.all_files = engine.MediaFiles()
+        # Пары наблюдаемых файлов пополняются по одному файлу; None - собрать заново из all_files
+        self.file_pairing = None
         self.orig_volume = tk.DoubleVar(value=load_from_registry("orig_volume", 5))
         self.new_volume = tk.DoubleVar(value=load_from_registry("new_volume", 100))
         self.remove_source = tk.BooleanVar(value=False)
         self.invert_tracks = tk.BooleanVar(value=False)
         self.is_processing = False
         self.backup_files = tk.BooleanVar(value=True)
+        self.auto_gain = tk.BooleanVar(value=bool(load_from_registry("auto_gain", 0)))
+        self.auto_gain.trace_add("write", lambda *_: save_to_registry("auto_gain", int(self.auto_gain.get())))
+        self.ducking = tk.BooleanVar(value=bool(load_from_registry("ducking", 0)))
+        self.ducking.trace_add("write", lambda *_: save_to_registry("ducking", int(self.ducking.get())))
+        # Наблюдение за перетащенными папками: новые файлы добавляются и склеиваются сами
+        self.watch_folders = tk.BooleanVar(value=bool(load_from_registry("watch_folders", 0)))
+        self.watch_folders.trace_add("write", lambda *_: self.on_watch_toggled())
+        self.watched_roots = set()
+        self.folder_feed = None
+        self.watch_start_id = None
+        self.watch_restart = False
         self.file_status = {}
+        self.probe_pool = ProbePool(engine.probe_video,
+                                    max_workers=load_from_registry("probe_workers", DEFAULT_PROBE_WORKERS))
+        # Статусы из потока обработки применяются с фиксированной частотой
+        self.ui_updates = UiUpdateQueue()
+        self.ui_refresh_ms = max(20, 1000 // max(1, load_from_registry("ui_refresh_hz", DEFAULT_REFRESH_HZ)))
         self.create_widgets()
         self.setup_volume_labels()
         self.setup_dnd()
+        self.drain_probe_results()
+        self.drain_ui_updates()
+
+    def load_output_variants(self):
+        """Результаты задания из строки реестра output_variants, например "RUS;RUS20:20:100".
+
+        Формат каждого - как у --output консольного режима (variants.parse_variant).
+        """
+        text = load_from_registry("output_variants", "")
+        variants = []
+        for spec in str(text or "").split(';'):
+            if not spec.strip():
+                continue
+            try:
+                variants.append(parse_variant(spec.strip()))
+            except ValueError as e:
+                print(e)
+        return tuple(variants)
 
     def handle_sigint(self, signum, frame):
         self.on_close()
 
-    def get_video_duration(self, video_path):
-        ffprobe_path = resource_path("ffprobe.exe")
-        cmd = [
-            ffprobe_path,
-            '-v', 'error',
-            '-show_entries', 'format=duration',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            video_path
-        ]
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            duration = float(result.stdout.strip())
-            return duration
-        except Exception as e:
-            print(f"Ошибка при получении длительности {video_path}: {e}")
-            return None
-
     def on_close(self):
         """Вызывается при закрытии окна"""
         self.stop_preview()
+        if self.folder_feed is not None:
+            self.folder_feed.stop()
+        if self.preview_player is not None:
+            self.preview_player.close()
         self.stop_processing()
+        self.probe_pool.shutdown()
         self.destroy()
         
-    def read_ffmpeg_logs(self, process, base, duration):
-        for line in iter(process.stderr.readline, ''):
-            if self.stop_event.is_set():
-                break
-            # Выводим строку лога в консоль
-            print(line.strip())
-            # Парсим прогресс как раньше
-            current_time = self.parse_ffmpeg_progress(line)
-            if current_time is not None:
-                progress = (current_time / duration) * 100
-                self.update_item_status(base, 'processing', progress=min(progress, 100))
-        process.stderr.close()
-    
     def start_animation(self):
         pass
 
@@ -184,12 +301,11 @@ class MergeApp(TkinterDnD.Tk):
                 self.after_cancel(self.after_id)
                 self.after_id = None
             return
-        for item in self.tree.get_children():
-            if self.tree.item(item, 'tags')[0] == 'processing':
-                values = self.tree.item(item, 'values')
+        for base in self.rows.order:
+            if self.rows.status_of(base) == 'processing':
+                values = self.rows.values_of(base)
                 new_symbol = self.animation_phases[self.animation_index]
-                new_values = (new_symbol, values[1], values[2])
-                self.tree.item(item, values=new_values)
+                self.rows.set_row(base, (new_symbol, values[1], values[2]), 'processing')
         self.animation_index = (self.animation_index + 1) % len(self.animation_phases)
         self.after_id = self.after(300, self.update_animation)
             
@@ -210,13 +326,13 @@ class MergeApp(TkinterDnD.Tk):
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         text_area.config(yscrollcommand=scrollbar.set)
         for base, pair in self.file_pairs.items():
-            if pair.get('video') and pair.get('track_info'):
+            if pair.get('video') and pair.get('media'):
                 video_name = os.path.basename(pair['video'])
                 text_area.insert(tk.END, f"\nФайл: {video_name}\n", "header")
-                for track in pair.get('track_info', []):
-                    language = track.get('language', 'неизвестно').upper()
-                    index = track.get('track_index')
-                    info = track.get('full_info', '')
+                for track in pair['media'].audio_streams:
+                    language = track.language.upper()
+                    index = track.track_index
+                    info = track.full_info
                     role = ""
                     if language == "ENG":
                         role = "(оригинал)"
@@ -280,13 +396,20 @@ class MergeApp(TkinterDnD.Tk):
 
         vsb = ttk.Scrollbar(file_frame, orient="vertical", command=self.tree.yview)
         hsb = ttk.Scrollbar(file_frame, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+        self.tree_vsb = vsb
+        self.tree.configure(yscrollcommand=self.on_tree_scroll, xscrollcommand=hsb.set)
         self.tree.grid(row=0, column=0, sticky="nsew")
         vsb.grid(row=0, column=1, sticky="ns")
         hsb.grid(row=1, column=0, sticky="ew")
 
         self.tree.bind("<Delete>", self.delete_selected_items)
         self.tree.bind("<<TreeviewSelect>>", self.on_treeview_select)
+        self.tree_menu = tk.Menu(self, tearoff=0)
+        self.tree_menu.add_command(label="Склеить первыми", command=self.pin_selected)
+        self.tree_menu.add_command(label="Обычный порядок", command=self.unpin_selected)
+        self.tree_menu.add_separator()
+        self.tree_menu.add_command(label="Лог ffmpeg", command=self.show_job_log)
+        self.tree.bind("<Button-3>", self.show_tree_menu)
 
         button_frame = ttk.Frame(main_frame)
         button_frame.grid(row=2, column=0, columnspan=2, sticky="ew", pady=2)
@@ -304,6 +427,11 @@ class MergeApp(TkinterDnD.Tk):
         self.preview_button.pack(side=tk.RIGHT, padx=5)
         ToolTip(self.preview_button, "Предпрослушать смесь аудио (30 секунд)")
 
+        position_entry = ttk.Entry(button_frame, textvariable=self.preview_position, width=7)
+        position_entry.pack(side=tk.RIGHT)
+        position_entry.bind("<Return>", self.jump_preview)
+        ToolTip(position_entry, "С какого места слушать (мм:сс).\nEnter во время прослушивания - перейти сюда.")
+
         self.clear_button = ttk.Button(button_frame, text="Очистить",
                                       command=self.clear_list)
         self.clear_button.pack(side=tk.RIGHT, padx=5)
@@ -343,6 +471,21 @@ class MergeApp(TkinterDnD.Tk):
         self.target_track = tk.IntVar(value=1)
         self.target_track_frame.grid_remove()
 
+        options_frame = ttk.Frame(volume_frame)
+        options_frame.grid(row=3, column=0, sticky='w')
+        auto_gain_checkbox = ttk.Checkbutton(options_frame, text="Auto Volume (LUFS)", variable=self.auto_gain)
+        auto_gain_checkbox.pack(side=tk.LEFT)
+        ducking_checkbox = ttk.Checkbutton(options_frame, text="Ducking", variable=self.ducking)
+        ducking_checkbox.pack(side=tk.LEFT, padx=(10, 0))
+        ToolTip(ducking_checkbox, "Оригинал звучит громче там, где в переводе не говорят,\n"
+                                  "и плавно приглушается к началу каждой фразы.")
+        watch_checkbox = ttk.Checkbutton(options_frame, text="Watch", variable=self.watch_folders)
+        watch_checkbox.pack(side=tk.LEFT, padx=(10, 0))
+        ToolTip(watch_checkbox, "Следить за перетащенными папками: новые серии и дорожки\n"
+                                "добавляются в список и склеиваются без повторного перетаскивания.")
+        ToolTip(auto_gain_checkbox, "Громкость подбирается для каждого файла по измеренной громкости дорожек.\n"
+                                    "Ползунки используются только для дорожек, которые не удалось измерить.")
+
         # Кнопка GO остается справа
         self.merge_button = tk.Button(main_frame, text="GO", bg="#4CAF50", fg="white",
                                      command=self.toggle_processing, relief=tk.FLAT, cursor="hand2",
@@ -401,7 +544,9 @@ class MergeApp(TkinterDnD.Tk):
         version_label = ttk.Label(bottom_frame, text=f"Version: {self.version}")
         version_label.grid(row=0, column=3, sticky='e', padx=5)
 
+        self.rows = TreeRows(self.tree)
         self.tree.tag_configure('pending', foreground='gray')
+        self.tree.tag_configure('probing', foreground='gray')
         self.tree.tag_configure('processing', foreground='orange')
         self.tree.tag_configure('done', foreground='green')
         self.tree.tag_configure('error', foreground='red')
@@ -417,23 +562,29 @@ class MergeApp(TkinterDnD.Tk):
             return
         
         item = selected[0]
-        values = self.tree.item(item, 'values')
-        base = self.get_base_name(values[1])
+        base = self.rows.base_of(item)
         pair = self.file_pairs.get(base)
         
         if not pair or not pair.get('video'):
             self.target_track_frame.grid_remove()
             return
+
+        # Плеер запускается заранее, чтобы "▶" звучал сразу
+        if preview.numpy_available() and not self.is_processing:
+            self.get_preview_player(warm=True)
         
         # Проверяем есть ли внешний аудио файл
         has_external_audio = pair.get('audio') is not None
         
         if has_external_audio:
+            if 'media' not in pair:
+                # Дорожки ещё не прочитаны: ставим файл первым в очередь,
+                # селектор покажется, когда придёт результат
+                self.probe_pool.submit(pair['video'], priority=-1)
+                self.target_track_frame.grid_remove()
+                return
             # Получаем информацию о внутренних дорожках
-            track_info = pair.get('track_info')
-            if not track_info:
-                track_count, track_info = self.check_audio_tracks(pair['video'])
-                pair['track_info'] = track_info
+            track_info = list(pair['media'].audio_streams) if pair['media'] else []
             
             audio_tracks = len(track_info)
             
@@ -463,8 +614,8 @@ class MergeApp(TkinterDnD.Tk):
         
         # ИСПРАВЛЕНО: Размещаем радиокнопки горизонтально с помощью grid
         for i, track in enumerate(track_info):
-            lang = track.get('language', 'und').upper()
-            track_index = track.get('track_index', i)
+            lang = track.language.upper()
+            track_index = track.track_index
             
             # Определяем текст для радиокнопки
             if lang == 'ENG':
@@ -483,7 +634,7 @@ class MergeApp(TkinterDnD.Tk):
             radio.grid(row=0, column=i, sticky='w', padx=5)  # ИСПРАВЛЕНО: используем grid
             
             # Добавляем тултип с подробной информацией
-            tooltip_text = f"Дорожка #{track_index}: {lang}\n{track.get('full_info', '')[:60]}..."
+            tooltip_text = f"Дорожка #{track_index}: {lang}\n{track.full_info[:60]}..."
             ToolTip(radio, tooltip_text)
         
         # Показываем фрейм
@@ -510,14 +661,86 @@ class MergeApp(TkinterDnD.Tk):
             else:
                 user32.ShowWindow(hwnd, 0)  # SW_HIDE = 0
 
+    def show_tree_menu(self, event):
+        item = self.tree.identify_row(event.y)
+        if item and item not in self.tree.selection():
+            self.tree.selection_set(item)
+        if self.tree.selection():
+            self.tree_menu.tk_popup(event.x_root, event.y_root)
+
+    def pin_selected(self):
+        """Выбранные пары склеиваются раньше остальных; закреплённые позже - ещё раньше"""
+        selected = [self.rows.base_of(item) for item in self.tree.selection()]
+        top = max((pair.get('priority', 0) for pair in self.file_pairs.values()), default=0)
+        for number, base in enumerate(selected):
+            if base in self.file_pairs:
+                self.file_pairs[base]['priority'] = top + len(selected) - number
+        self.update_treeview()
+
+    def unpin_selected(self):
+        for item in self.tree.selection():
+            pair = self.file_pairs.get(self.rows.base_of(item))
+            if pair is not None:
+                pair.pop('priority', None)
+        self.update_treeview()
+
+    def show_job_log(self):
+        """Последние строки ffmpeg выбранного задания; пока задание идёт, окно обновляется"""
+        selection = self.tree.selection()
+        if not selection:
+            return
+        base = self.rows.base_of(selection[0])
+        logs = self.batch_engine.logs if self.batch_engine is not None else {}
+        if base not in logs:
+            tk.messagebox.showinfo("Лог ffmpeg", "Для этого файла в последнем запуске лога нет")
+            return
+        job_log = logs[base]
+        log_window = tk.Toplevel(self)
+        log_window.title(f"Лог ffmpeg: {base}")
+        log_window.geometry("700x400")
+        text_area = tk.Text(log_window, wrap=tk.NONE, width=90, height=20)
+        text_area.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        scrollbar = ttk.Scrollbar(text_area, command=text_area.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        text_area.config(yscrollcommand=scrollbar.set)
+        path_label = ttk.Label(log_window, text="")
+        path_label.pack(padx=10, anchor=tk.W)
+        ttk.Button(log_window, text="ОК", command=log_window.destroy).pack(pady=10)
+        shown = [None]
+
+        def refresh():
+            if not log_window.winfo_exists():
+                return
+            text = job_log.text() or "(ffmpeg ничего не сообщал)"
+            if text != shown[0]:
+                shown[0] = text
+                text_area.config(state=tk.NORMAL)
+                text_area.delete("1.0", tk.END)
+                text_area.insert(tk.END, text)
+                text_area.see(tk.END)
+                text_area.config(state=tk.DISABLED)
+            if job_log.path:
+                path_label.config(text=f"Сохранён в {job_log.path}")
+            if self.file_status.get(base) == 'processing':
+                log_window.after(1000, refresh)
+
+        refresh()
+
+    def load_job_order(self):
+        """Порядок заданий из реестра (job_order): строка longest, shortest или input.
+        Записанный как DWORD - номер в том же списке (0 - longest)"""
+        order = load_from_registry("job_order", DEFAULT_ORDER)
+        if isinstance(order, int) and 0 <= order < len(ORDER_POLICIES):
+            return ORDER_POLICIES[order]
+        return order if order in ORDER_POLICIES else DEFAULT_ORDER
+
     def delete_selected_items(self, event=None):
         selected_items = self.tree.selection()
         if not selected_items:
             return
 
         for item in selected_items:
-            values = self.tree.item(item, 'values')
-            base = self.get_base_name(values[1])
+            base = self.rows.base_of(item)
             video_path = self.file_pairs[base]['video'] if base in self.file_pairs and self.file_pairs[base]['video'] else None
             audio_path = self.file_pairs[base]['audio'] if base in self.file_pairs and self.file_pairs[base]['audio'] else None
             
@@ -528,11 +751,12 @@ class MergeApp(TkinterDnD.Tk):
                 del self.file_status[base]
             
             # Удаляем из all_files
-            if video_path and video_path in self.all_files['video']:
-                self.all_files['video'].remove(video_path)
-            if audio_path and audio_path in self.all_files['audio']:
-                self.all_files['audio'].remove(audio_path)
+            if video_path:
+                self.all_files.discard(video_path)
+            if audio_path:
+                self.all_files.discard(audio_path)
 
+        self.file_pairing = None
         self.update_treeview()
     
     def toggle_preview(self):
@@ -551,9 +775,7 @@ class MergeApp(TkinterDnD.Tk):
             tk.messagebox.showwarning("Внимание", "Выберите файл из списка для предпрослушивания")
             return
 
-        item = selected[0]
-        values = self.tree.item(item, 'values')
-        base = self.get_base_name(values[1])
+        base = self.rows.base_of(selected[0])
         pair = self.file_pairs.get(base)
 
         if not pair or not pair.get('video'):
@@ -562,120 +784,170 @@ class MergeApp(TkinterDnD.Tk):
 
         video_path = pair['video']
         audio_path = pair.get('audio')
-        orig_vol = self.orig_volume.get() / 100
-        new_vol = self.new_volume.get() / 100
-
         try:
-            ffmpeg_path = resource_path("ffmpeg.exe")
-            ffplay_path = resource_path("ffplay.exe")
+            start = preview.parse_position(self.preview_position.get())
+        except ValueError:
+            tk.messagebox.showwarning("Внимание", "Позиция задаётся как мм:сс, например 12:30")
+            return
 
+        try:
+            track_info = pair_tracks(pair)
             if audio_path:
                 # Получаем целевую дорожку для смешивания
-                track_info = pair.get('track_info', [])
-                if track_info and len(track_info) > 1:
-                    target_track_index = self.target_track.get()
-                    if target_track_index < len(track_info):
-                        target_audio_index = track_info[target_track_index]['audio_index']
-                    else:
-                        target_audio_index = 0
-                else:
-                    target_audio_index = 0
-                
-                cmd = [
-                    ffmpeg_path,
-                    '-i', video_path,
-                    '-i', audio_path,
-                    '-filter_complex',
-                    f'[0:a:{target_audio_index}]volume={orig_vol}[a0];[1:a]volume={new_vol}[a1];[a0][a1]amix=duration=shortest[a]',
-                    '-map', '[a]',
-                    '-t', '30',
-                    '-f', 'wav',
-                    '-'
-                ]
+                target_audio_index = resolve_target_audio_index(track_info, self.target_track.get())
+                sources = ((video_path, f'a:{target_audio_index}'), (audio_path, 'a:0'))
             else:
                 # Используем внутренние дорожки как обычно
-                track_info = pair.get('track_info', [])
                 if len(track_info) < 2:
                     tk.messagebox.showerror("Ошибка", "Недостаточно дорожек для микса")
                     return
 
-                eng_track = next((t for t in track_info if t['language'] == 'eng'), None)
-                rus_track = next((t for t in track_info if t['language'] == 'rus'), None)
-
-                if eng_track and rus_track:
-                    track1 = eng_track['audio_index']
-                    track2 = rus_track['audio_index']
-                else:
-                    track1 = track_info[0]['audio_index']
-                    track2 = track_info[1]['audio_index']
-
-                if self.invert_tracks.get():
-                    track1, track2 = track2, track1
-
-                cmd = [
-                    ffmpeg_path,
-                    '-i', video_path,
-                    '-filter_complex',
-                    f'[0:a:{track1}]volume={orig_vol}[a0];[0:a:{track2}]volume={new_vol}[a1];[a0][a1]amix=duration=shortest[a]',
-                    '-map', '[a]',
-                    '-t', '30',
-                    '-f', 'wav',
-                    '-'
-                ]
-
-            ffplay_cmd = [
-                ffplay_path,
-                '-nodisp',
-                '-autoexit',
-                '-'
-            ]
-
-            # Start processes
-            self.ffmpeg_process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.DEVNULL,
-                bufsize=0
-            )
-
-            self.ffplay_process = subprocess.Popen(
-                ffplay_cmd,
-                stdin=self.ffmpeg_process.stdout,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
+                orig_track, trans_track = select_embedded_tracks(track_info, self.invert_tracks.get())
+                sources = ((video_path, f'a:{orig_track.audio_index}'),
+                           (video_path, f'a:{trans_track.audio_index}'))
 
             self.is_preview_playing = True
             self.preview_button.config(text=self.pause_icon_text)
-
-            threading.Thread(target=self.wait_for_preview, daemon=True).start()
+            # Метаданные видео уже прочитаны - ffmpeg может не анализировать его долго.
+            # Внешняя дорожка не пробовалась, её вход анализируется как обычно
+            self.preview_sources = (sources, video_path if pair.get('media') else None)
+            self.play_preview_from(start)
 
         except Exception as e:
             tk.messagebox.showerror("Ошибка", f"Ошибка предпрослушивания: {str(e)}")
             self.stop_preview()
 
+    def play_preview_from(self, start):
+        sources, probed_path = self.preview_sources
+        self.preview_request += 1
+        if preview.numpy_available():
+            # Плеер и громкость (переменные Tk) - только в главном потоке
+            player = self.get_preview_player()
+            self.update_preview_gains()
+            # Декодирование может занять время - не держим окно
+            threading.Thread(target=self.play_pcm_preview,
+                             args=(self.preview_request, player, sources, start, probed_path),
+                             daemon=True).start()
+        else:
+            self.start_pipeline_preview(*sources, start)
+
+    def jump_preview(self, event=None):
+        """Enter в поле позиции: переход без перезапуска плеера"""
+        if not self.is_preview_playing or self.preview_sources is None:
+            return
+        try:
+            start = preview.parse_position(self.preview_position.get())
+        except ValueError:
+            return
+        if not preview.numpy_available():
+            self.stop_pipeline_processes()
+            self.is_preview_playing = True
+        self.play_preview_from(start)
+
+    def get_preview_player(self, warm=False):
+        if self.preview_player is None:
+            self.preview_player = preview.PreviewPlayer([
+                find_tool("ffplay"), '-nodisp', '-loglevel', 'error',
+                '-fflags', 'nobuffer', '-probesize', '32', '-'
+            ])
+        if warm:
+            try:
+                self.preview_player.start()
+            except OSError as e:
+                print(f"Не удалось запустить плеер: {e}")
+        return self.preview_player
+
+    def play_pcm_preview(self, request, player, sources, start, probed_path):
+        """Смесь из кэша PCM: громкость меняется на лету ползунками.
+
+        Работает в отдельном потоке и не трогает виджеты и переменные Tk.
+        """
+        try:
+            ffmpeg_path = find_tool("ffmpeg")
+            on_finished = lambda: self.ui_updates.call_soon(self.preview_finished)
+            windows = [self.pcm_cache.peek(path, stream, start) for path, stream in sources]
+            if all(window is not None for window in windows):
+                if request == self.preview_request:
+                    player.play(*windows, on_finished=on_finished)
+                return
+
+            # Сначала короткое начало, остальное окно догружается во время игры
+            heads = [preview.decode_pcm(ffmpeg_path, path, stream, start, preview.HEAD_SECONDS,
+                                        path == probed_path)
+                     for path, stream in sources]
+            if request != self.preview_request:
+                return
+            generation = player.play(*heads, on_finished=on_finished, partial=True)
+            windows = [self.pcm_cache.load(ffmpeg_path, path, stream, start, fast_probe=path == probed_path)
+                       for path, stream in sources]
+            player.extend(generation, *windows)
+        except Exception as e:
+            message = f"Ошибка предпрослушивания: {str(e)}"
+            self.ui_updates.call_soon(lambda: tk.messagebox.showerror("Ошибка", message))
+            self.ui_updates.call_soon(self.stop_preview)
+
+    def start_pipeline_preview(self, orig_source, new_source, start=0):
+        """Без NumPy: ffmpeg смешивает дорожки и отдаёт WAV в ffplay"""
+        ffmpeg_path = find_tool("ffmpeg")
+        ffplay_path = find_tool("ffplay")
+        orig_vol = self.orig_volume.get() / 100
+        new_vol = self.new_volume.get() / 100
+        (orig_path, orig_stream), (new_path, new_stream) = orig_source, new_source
+
+        cmd = [ffmpeg_path, '-ss', str(start), '-i', orig_path]
+        if new_path != orig_path:
+            cmd += ['-ss', str(start), '-i', new_path]
+            new_input = 1
+        else:
+            new_input = 0
+        cmd += [
+            '-filter_complex',
+            f'[0:{orig_stream}]volume={orig_vol}[a0];[{new_input}:{new_stream}]volume={new_vol}[a1];[a0][a1]amix=duration=shortest[a]',
+            '-map', '[a]',
+            '-t', '30',
+            '-f', 'wav',
+            '-'
+        ]
+
+        ffplay_cmd = [
+            ffplay_path,
+            '-nodisp',
+            '-autoexit',
+            '-'
+        ]
+
+        # Start processes
+        self.ffmpeg_process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0
+        )
+
+        self.ffplay_process = subprocess.Popen(
+            ffplay_cmd,
+            stdin=self.ffmpeg_process.stdout,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+        threading.Thread(target=self.wait_for_preview, args=(self.ffplay_process,), daemon=True).start()
+
+    def update_preview_gains(self):
+        if self.preview_player is not None:
+            self.preview_player.set_gains(self.orig_volume.get() / 100, self.new_volume.get() / 100)
+
+    def preview_finished(self):
+        self.is_preview_playing = False
+        self.preview_button.config(text=self.play_icon_text)
+
     def stop_preview(self):
         """Останавливает текущее воспроизведение и убивает все связанные процессы"""
         try:
-            if self.ffplay_process:
-                try:
-                    self.ffplay_process.terminate()
-                    self.ffplay_process.wait(timeout=1)
-                except (subprocess.TimeoutExpired, AttributeError):
-                    if hasattr(self.ffplay_process, 'pid'):
-                        os.kill(self.ffplay_process.pid, signal.SIGTERM)
-                finally:
-                    self.ffplay_process = None
-
-            if self.ffmpeg_process:
-                try:
-                    self.ffmpeg_process.terminate()
-                    self.ffmpeg_process.wait(timeout=1)
-                except (subprocess.TimeoutExpired, AttributeError):
-                    if hasattr(self.ffmpeg_process, 'pid'):
-                        os.kill(self.ffmpeg_process.pid, signal.SIGTERM)
-                finally:
-                    self.ffmpeg_process = None
+            self.preview_request += 1
+            if self.preview_player is not None:
+                self.preview_player.stop()
+            self.stop_pipeline_processes()
 
             self.is_preview_playing = False
             if self.preview_button:
@@ -683,14 +955,33 @@ class MergeApp(TkinterDnD.Tk):
         except Exception as e:
             print(f"Ошибка при остановке превью: {e}")
 
-    def wait_for_preview(self):
-        """Ожидает завершения воспроизведения и обновляет состояние."""
+    def stop_pipeline_processes(self):
         if self.ffplay_process:
-            self.ffplay_process.wait()
-        self.is_preview_playing = False
-        self.preview_button.config(text=self.play_icon_text)  # Показываем иконку воспроизведения
-        self.ffplay_process = None
-        self.ffmpeg_process = None
+            try:
+                self.ffplay_process.terminate()
+                self.ffplay_process.wait(timeout=1)
+            except (subprocess.TimeoutExpired, AttributeError):
+                if hasattr(self.ffplay_process, 'pid'):
+                    os.kill(self.ffplay_process.pid, signal.SIGTERM)
+            finally:
+                self.ffplay_process = None
+
+        if self.ffmpeg_process:
+            try:
+                self.ffmpeg_process.terminate()
+                self.ffmpeg_process.wait(timeout=1)
+            except (subprocess.TimeoutExpired, AttributeError):
+                if hasattr(self.ffmpeg_process, 'pid'):
+                    os.kill(self.ffmpeg_process.pid, signal.SIGTERM)
+            finally:
+                self.ffmpeg_process = None
+
+    def wait_for_preview(self, ffplay_process):
+        """Ожидает завершения воспроизведения и обновляет состояние."""
+        ffplay_process.wait()
+        # После перехода к другой позиции играет уже новый процесс
+        if self.ffplay_process is ffplay_process:
+            self.ui_updates.call_soon(self.preview_finished)
  
     def create_color_image(self, color):
         """Создает цветной квадрат 16x16 указанного цвета"""
@@ -711,69 +1002,16 @@ class MergeApp(TkinterDnD.Tk):
         
         def update_animation():
             nonlocal current_phase
-            for item in self.tree.get_children():
-                values = self.tree.item(item, 'values')
-                if self.get_base_name(values[1]) == base and self.file_status.get(base) == 'processing':
-                    new_values = (phases[current_phase], values[1], values[2])
-                    self.tree.item(item, values=new_values)
-                    current_phase = (current_phase + 1) % len(phases)
-                    self.animation_job = self.after(500, update_animation)
-                    break
+            values = self.rows.values_of(base)
+            if values and self.file_status.get(base) == 'processing':
+                self.rows.set_row(base, (phases[current_phase], values[1], values[2]), 'processing')
+                current_phase = (current_phase + 1) % len(phases)
+                self.animation_job = self.after(500, update_animation)
             else:
                 self.animation_job = None
         
         update_animation()
 
-    def check_audio_tracks(self, video_path):
-        ffmpeg_path = resource_path("ffmpeg.exe")
-        cmd = [ffmpeg_path, '-i', video_path, '-hide_banner']
-
-        try:
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.PIPE, 
-                universal_newlines=True,
-                encoding='utf-8',  
-                errors='ignore' 
-            )
-            
-            output_text = process.stderr.read()
-            process.wait()
-
-            if output_text is None:
-                output_text = ""
-
-            audio_streams = []
-            audio_index = 0
-            for line in output_text.split('\n'):
-                if "Stream #" in line and "Audio:" in line:
-                    stream_id = line.split('#')[1].split('[')[0].strip()
-                    lang_match = re.search(r'\(([a-z]{3})\)', line)
-                    lang = lang_match.group(1) if lang_match else "und"
-                    
-                    track_index_match = re.search(r'Stream #0:(\d+)', line)
-                    track_index = int(track_index_match.group(1)) if track_index_match else -1
-                    
-                    parts = [p.strip() for p in line.split(',')]
-                    channel_layout = parts[2] if len(parts) > 2 else "unknown"
-                    
-                    audio_streams.append({
-                        "stream_id": stream_id,
-                        "language": lang,
-                        "track_index": track_index,
-                        "audio_index": audio_index,
-                        "full_info": line.strip(),
-                        "channel_layout": channel_layout
-                    })
-                    audio_index += 1
-            
-            return len(audio_streams), audio_streams
-
-        except Exception as e:
-            print(f"Ошибка при проверке аудио дорожек: {e}")
-            return 0, []
-
     def create_status_icon(self, text='⌛', color='gray'):
         # Создаем изображение для статуса
         img = tk.Canvas(self, width=20, height=20, highlightthickness=0)
@@ -816,6 +1054,9 @@ class MergeApp(TkinterDnD.Tk):
         # Связываем изменение значений переменных
         self.orig_volume.trace_add("write", lambda *_: self.update_volume_labels_and_save())
         self.new_volume.trace_add("write", lambda *_: self.update_volume_labels_and_save())
+        # Идущее предпрослушивание сразу подхватывает новую громкость
+        self.orig_volume.trace_add("write", lambda *_: self.update_preview_gains())
+        self.new_volume.trace_add("write", lambda *_: self.update_preview_gains())
 
     def update_volume_labels_and_save(self):
         self.update_volume_labels()
@@ -970,186 +1211,215 @@ class MergeApp(TkinterDnD.Tk):
             self.process_paths(paths)
 
     def process_paths(self, paths):
-            for path in self.tk.splitlist(paths):
-                path = path.strip('{}')
-                if path not in self.all_files['video'] and path not in self.all_files['audio']:
-                    if os.path.isdir(path):
-                        for root, _, files in os.walk(path):
-                            for file in files:
-                                full_path = os.path.join(root, file)
-                                if full_path not in self.all_files['video'] and full_path not in self.all_files['audio']:
-                                    self.classify_file(full_path, self.all_files)
-                    else:
-                        self.classify_file(path, self.all_files)
+            paths = self.tk.splitlist(paths)
+            engine.collect_files(paths, self.all_files)
             
             self.old_file_pairs = self.file_pairs.copy()
-            self.update_file_pairs(self.all_files)
+            self.file_pairs = engine.build_file_pairs(self.all_files, self.old_file_pairs)
+            self.file_pairing = None
             self.update_treeview()
 
-    def classify_file(self, path, storage):
-        ext = os.path.splitext(path)[1].lower()
-        if ext in audio_ext:
-            storage['audio'].append(path)
-        elif ext in video_ext:
-            storage['video'].append(path)
-
-    def update_file_pairs(self, files):
-        base_names = {}
-        
-        for video_path in files['video']:
-            base = self.get_base_name(video_path)
-            base_names[base] = {'video': video_path, 'audio': None}
-        
-        for audio_path in files['audio']:
-            audio_base = self.get_base_name(audio_path)
-            matched = False
-            for video_base in base_names:
-                if self.is_similar_name(video_base, audio_base):
-                    base_names[video_base]['audio'] = audio_path
-                    matched = True
-                    break
-            if not matched:
-                base_names[audio_base] = {'video': None, 'audio': audio_path}
-        
-        self.file_pairs = base_names
-
-    def get_base_name(self, path):
-        name = os.path.basename(path)
-        name = re.sub(r'_(rus|eng|audio|track)(?=\.[^.]+$)', '', name, flags=re.IGNORECASE)
-        name = re.sub(r'\([^)]*\)', '', name)
-        name = re.sub(r'_+', '_', name)
-        base, ext = os.path.splitext(name)
-        base = re.sub(r'\.+', '.', base)
-        name = base + ext
-        return os.path.splitext(name.lower())[0]
-
-    def normalize_name(self, name):
-        """Улучшенная нормализация имени файла с обработкой числовых префиксов"""
-        # Удаляем расширение
-        name = os.path.splitext(name)[0].lower()
-        
-        # Удаляем числовые префиксы в начале (1., 01, 09, etc.)
-        name = re.sub(r'^\d+[\.\s]*', '', name)
-        
-        # Удаляем суффиксы языков и типов
-        name = re.sub(r'[_\-\s]*(rus|eng|audio|track|russian|english)(?=\s|$)', '', name, flags=re.IGNORECASE)
-        
-        # Удаляем содержимое в скобках и квадратных скобках
-        name = re.sub(r'[\(\[\{].*?[\)\]\}]', '', name)
-        
-        # Удаляем лишние пробелы и знаки препинания
-        name = re.sub(r'[^\w\s]', ' ', name)
-        name = re.sub(r'\s+', ' ', name).strip()
-        
-        # Приводим к единому формату (только буквы и цифры)
-        normalized = re.sub(r'[^a-z0-9]', '', name)
-        
-        return normalized
-
-    def is_similar_name(self, video_base, audio_base):
-        """Улучшенная функция сравнения имен с несколькими методами"""
-        import difflib
-        
-        norm_video = self.normalize_name(video_base)
-        norm_audio = self.normalize_name(audio_base)
-        
-        # Метод 1: Прямое вхождение (оригинальный)
-        if norm_video and norm_audio:
-            if norm_video in norm_audio or norm_audio in norm_video:
-                return True
-        
-        # Метод 2: Сравнение по коэффициенту подобия
-        if len(norm_video) > 3 and len(norm_audio) > 3:
-            similarity = difflib.SequenceMatcher(None, norm_video, norm_audio).ratio()
-            if similarity >= 0.8:  # 80% схожесть
-                return True
-        
-        # Метод 3: Альтернативная нормализация для цифровых префиксов
-        def extract_core_name(name):
-            """Извлекает основное имя без префиксов и суффиксов"""
-            # Убираем числовые префиксы
-            clean = re.sub(r'^\d+[\.\s\-_]*', '', name.lower())
-            # Убираем языковые суффиксы
-            clean = re.sub(r'[_\-\s]*(rus|eng|audio|track).*$', '', clean, flags=re.IGNORECASE)
-            # Убираем расширение
-            clean = os.path.splitext(clean)[0]
-            # Нормализуем пробелы
-            clean = re.sub(r'\s+', ' ', clean.strip())
-            return clean
-        
-        video_core = extract_core_name(video_base)
-        audio_core = extract_core_name(audio_base)
-        
-        if video_core and audio_core and len(video_core) > 3 and len(audio_core) > 3:
-            core_similarity = difflib.SequenceMatcher(None, video_core, audio_core).ratio()
-            if core_similarity >= 0.85:  # 85% схожесть для основных имен
-                return True
-        
-        return False
+            folders = {os.path.abspath(path.strip('{}')) for path in paths if os.path.isdir(path.strip('{}'))}
+            if folders - self.watched_roots:
+                self.watched_roots |= folders
+                self.on_watch_toggled()
+
+    def on_watch_toggled(self):
+        """(Пере)запускает наблюдение за перетащенными папками"""
+        save_to_registry("watch_folders", int(self.watch_folders.get()))
+        if self.folder_feed is not None:
+            self.folder_feed.stop()
+            self.folder_feed = None
+        if not self.watch_folders.get() or not self.watched_roots:
+            return
+        feed = FolderFeed(sorted(self.watched_roots))
+
+        def on_files(paths):
+            # Готовые *_RUS.mkv появляются в тех же папках
+            outputs = engine.own_outputs(paths)
+            paths = [path for path in paths if path not in outputs]
+            if paths:
+                self.ui_updates.call_soon(lambda: self.add_watched_files(paths))
+
+        self.folder_feed = feed
+        threading.Thread(target=feed.run, args=(on_files,), daemon=True).start()
+
+    def add_watched_files(self, paths):
+        """Дописанные файлы из наблюдаемых папок: в список и, когда пары готовы, в обработку"""
+        new_paths = [path for path in paths if path not in self.all_files.paths]
+        if not new_paths:
+            return
+        if self.file_pairing is None:
+            # Уже известные файлы сопоставляются один раз, дальше - только новые
+            self.file_pairing = FilePairing()
+            for path in self.all_files['video']:
+                self.file_pairing.add_video(path)
+            for path in self.all_files['audio']:
+                self.file_pairing.add_audio(path)
+        engine.collect_files(new_paths, self.all_files)
+        pairing = self.file_pairing
+        pairing.changed.clear()
+        for path in new_paths:
+            # Тот же файл под другим именем в список не попал
+            if path not in self.all_files.paths:
+                continue
+            if os.path.splitext(path)[1].lower() in engine.video_ext:
+                pairing.add_video(path)
+            else:
+                pairing.add_audio(path)
+        changed = []
+        for base in sorted(pairing.changed):
+            if base not in pairing.pairs:
+                # Дорожка, ждавшая своё видео, теперь в его паре
+                self.file_pairs.pop(base, None)
+                self.file_status.pop(base, None)
+                continue
+            changed.append(base)
+            pair = dict(pairing.pairs[base])
+            old = self.file_pairs.get(base)
+            if old is not None and old.get('video') == pair['video']:
+                # Метаданные и закрепление той же серии сохраняем
+                for key in ('media', 'priority'):
+                    if key in old:
+                        pair[key] = old[key]
+            self.file_pairs[base] = pair
+        self.update_treeview()
+        if self.is_processing:
+            # Склеим после текущего пакета
+            self.watch_restart = True
+            return
+        # Видео без внешнего перевода даём время дождаться дорожки
+        waiting = any(self.file_pairs[base]['video'] in new_paths and not self.file_pairs[base]['audio']
+                      for base in changed)
+        if self.watch_start_id is not None:
+            self.after_cancel(self.watch_start_id)
+        self.watch_start_id = self.after(int(DEFAULT_VIDEO_WAIT * 1000) if waiting else 0,
+                                         self.start_watched_processing)
+
+    def start_watched_processing(self):
+        self.watch_start_id = None
+        if self.is_processing or not self.watch_folders.get():
+            return
+        if any(pair['video'] and self.file_status.get(base, 'pending') == 'pending'
+               for base, pair in self.file_pairs.items()):
+            self.start_processing()
 
-    def update_treeview(self):
-        self.tree.delete(*self.tree.get_children())  # Очищаем Treeview
-        for base, pair in self.file_pairs.items():
-            video = os.path.basename(pair['video']) if pair['video'] else ""
-            audio = ""
+    def pair_row(self, base, pair):
+        """Статус и тексты колонок строки; ffprobe здесь не запускается"""
+        video = os.path.basename(pair['video']) if pair['video'] else ""
+        if video and pair.get('priority'):
+            # Закреплённая пара склеивается первой
+            video = "▲ " + video
+        audio = ""
 
-            current_status = self.file_status.get(base, 'pending')
+        current_status = self.file_status.get(base, 'pending')
 
-            if current_status == 'done':
-                status = 'done'
+        if current_status == 'done':
+            status = 'done'
+            if pair['audio']:
+                audio = os.path.basename(pair['audio'])
+            else:
+                track_info = pair['media'].audio_streams if pair.get('media') else None
+                if track_info:
+                    lang_info = get_track_language_info(track_info)
+                    audio = f"({lang_info})"
+                else:
+                    audio = "None"
+        else:
+            if pair['video']:
                 if pair['audio']:
+                    status = 'pending'
                     audio = os.path.basename(pair['audio'])
+                elif 'media' not in pair:
+                    # Метаданные читаются в фоне, строка обновится по результату
+                    status = 'probing'
+                    audio = "..."
                 else:
-                    track_info = pair.get('track_info', [])
-                    if track_info:
-                        lang_info = self.get_track_language_info(track_info)
+                    track_info = pair['media'].audio_streams if pair['media'] else ()
+                    if len(track_info) > 1:
+                        status = 'pending'
+                        lang_info = get_track_language_info(track_info)
                         audio = f"({lang_info})"
                     else:
+                        status = 'error'
                         audio = "None"
             else:
-                if pair['video']:
-                    if pair['audio']:
-                        status = 'pending'
-                        audio = os.path.basename(pair['audio'])
-                    else:
-                        track_count, track_info = self.check_audio_tracks(pair['video'])
-                        pair['track_info'] = track_info
-                        if track_count > 1:
-                            status = 'pending'
-                            lang_info = self.get_track_language_info(track_info)
-                            audio = f"({lang_info})"
-                        else:
-                            status = 'error'
-                            audio = "None"
-                else:
-                    status = 'error'
-                    audio = "None"
+                status = 'error'
+                audio = "None"
+
+        return status, video, audio
 
-            self.tree.insert('', 'end', values=(self.status_text(status), video, audio), tags=(status,))
+    def update_treeview(self):
+        rows = []
+        for base, pair in self.file_pairs.items():
+            status, video, audio = self.pair_row(base, pair)
+            rows.append((base, (self.status_text(status), video, audio), status))
             self.file_status[base] = status
+        # Применяются только отличия: удалённые, новые и изменившиеся строки
+        self.rows.sync(rows)
 
         for base in list(self.file_status.keys()):
             if base not in self.file_pairs:
                 del self.file_status[base]
 
         self.update_merge_button_state()
-            
-    def get_track_language_info(self, track_info):
-        if not track_info:
-            return "неизвестно"
-        
-        lang_info = []
-        for track in track_info:
-            lang = track["language"].upper()
-            idx = track["track_index"]
-            lang_info.append(f"{idx}:{lang}")
-        
-        return ", ".join(lang_info)
+        self.queue_probes()
+
+    def queue_probes(self):
+        """Ставит в фоновую очередь видео без метаданных.
+
+        Пары с внутренними дорожками идут раньше внешних: от них зависит статус
+        строки, а внешним дорожки нужны только для выбора целевой дорожки.
+        """
+        for order, (base, pair) in enumerate(self.file_pairs.items()):
+            if pair['video'] and 'media' not in pair:
+                priority = order + (len(self.file_pairs) if pair['audio'] else 0) + 10
+                self.probe_pool.submit(pair['video'], priority)
+        self.prioritize_visible()
+
+    def on_tree_scroll(self, first, last):
+        self.tree_vsb.set(first, last)
+        self.prioritize_visible()
+
+    def prioritize_visible(self):
+        """Видимые и выбранные строки проверяются первыми"""
+        if not self.probe_pool.pending_count():
+            return
+        visible = [self.file_pairs[base]['video'] for base in self.rows.visible_bases()]
+        self.probe_pool.prioritize([path for path in visible if path], priority=0)
+        selected = [self.file_pairs[self.rows.base_of(item)]['video'] for item in self.tree.selection()]
+        self.probe_pool.prioritize([path for path in selected if path], priority=-1)
+
+    def drain_probe_results(self):
+        """Разбирает результаты фоновой проверки в главном потоке"""
+        try:
+            while True:
+                path, media = self.probe_pool.results.get_nowait()
+                self.apply_probe_result(path, media)
+        except queue.Empty:
+            pass
+        self.after(100, self.drain_probe_results)
+
+    def apply_probe_result(self, path, media):
+        base = get_base_name(path)
+        pair = self.file_pairs.get(base)
+        if not pair or pair.get('video') != path:
+            return  # пару успели удалить из списка
+        pair['media'] = media
+        if self.file_status.get(base) == 'probing':
+            status, video, audio = self.pair_row(base, pair)
+            self.rows.set_row(base, (self.status_text(status), video, audio), status)
+            self.file_status[base] = status
+        selected = self.tree.selection()
+        if selected and self.rows.base_of(selected[0]) == base:
+            self.on_treeview_select()
 
     def clear_list(self):
+        self.probe_pool.clear()
         self.file_pairs = {}
-        self.all_files = {'video': [], 'audio': []}
-        self.tree.delete(*self.tree.get_children())
+        self.all_files = engine.MediaFiles()
+        self.file_pairing = None
+        self.rows.clear()
         self.created_files = []
         self.skipped_files = []
         self.progress.set(0)
@@ -1157,144 +1427,6 @@ class MergeApp(TkinterDnD.Tk):
         # Обновляем состояние кнопки "GO" после очистки списка
         self.update_merge_button_state()
     
-    def process_file(self, base, pair):
-        if self.stop_event.is_set():
-            return
-        try:
-            duration = self.get_video_duration(pair['video'])
-            if duration is None:
-                raise Exception("Не удалось получить длительность видео")
-            self.update_item_status(base, 'processing', progress=0.0)
-            video_path = pair['video']
-            video_dir = os.path.dirname(video_path)
-            name, ext = os.path.splitext(os.path.basename(video_path))
-            temp_dir = os.path.join(video_dir, "temp")
-            os.makedirs(temp_dir, exist_ok=True)
-            temp_output_path = os.path.join(temp_dir, f"{name}_RUS.mkv")
-            output_path = os.path.join(video_dir, f"{name}_RUS.mkv")
-            
-            if pair['audio']:
-                ffmpeg_process = self.run_ffmpeg_external(pair['video'], pair['audio'], temp_output_path)
-            else:
-                # Убедимся, что track_info актуальна
-                track_count, track_info = self.check_audio_tracks(pair['video'])
-                if track_count < 2:
-                    raise Exception("Недостаточно аудиодорожек")
-                pair['track_info'] = track_info
-                ffmpeg_process = self.run_ffmpeg_embedded(pair['video'], temp_output_path, track_info)
-            
-            # Остальная логика обработки
-            self.active_ffmpeg_processes.append(ffmpeg_process)
-            threading.Thread(target=self.read_ffmpeg_logs, args=(ffmpeg_process, base, duration), daemon=True).start()
-            
-            while ffmpeg_process.poll() is None:
-                if self.stop_event.is_set():
-                    ffmpeg_process.terminate()
-                    self.active_ffmpeg_processes.remove(ffmpeg_process)
-                    self.update_item_status(base, 'stopped')
-                    return
-                time.sleep(0.1)
-
-            if not self.stop_event.is_set() and ffmpeg_process.returncode != 0:
-                raise Exception(f"FFmpeg ошибка (код {ffmpeg_process.returncode})")
-
-            self.active_ffmpeg_processes.remove(ffmpeg_process)
-            if not self.stop_event.is_set():
-                shutil.move(temp_output_path, output_path)
-                self.update_item_status(base, 'done')
-                current_files = [pair['video']]
-                if pair['audio']:
-                    current_files.append(pair['audio'])
-                if self.backup_files.get():
-                    self.create_backup_files(current_files)
-                else:
-                    self.remove_source_files(current_files)
-                self.created_files.extend(current_files)
-        
-        except Exception as e:
-            print(f"Ошибка при обработке {pair['video']}: {str(e)}")
-            if not self.stop_event.is_set():
-                self.update_item_status(base, 'error')
-        finally:
-            self.processed += 1
-            total = sum(1 for base, pair in self.file_pairs.items() 
-                        if pair['video'] and self.file_status.get(base, 'pending') in ['pending', 'stopped', 'error'])
-            progress = (self.processed / total) * 100 if total > 0 else 100
-            self.after(0, lambda p=progress, pr=self.processed, t=total: [
-                self.progress.set(p),
-                self.progress_label.config(text=f"{pr}/{t}")
-            ])
-
-    def run_ffmpeg_external(self, video, audio, output):
-        """Модифицированная версия для работы с выбранной целевой дорожкой"""
-        ffmpeg_path = resource_path("ffmpeg.exe")
-        if not os.path.exists(ffmpeg_path):
-            raise FileNotFoundError(f"FFmpeg не найден: {ffmpeg_path}")
-        
-        orig_vol = self.orig_volume.get() / 100
-        new_vol = self.new_volume.get() / 100
-        
-        # Получаем информацию о выбранном файле
-        selected = self.tree.selection()
-        if selected:
-            item = selected[0]
-            values = self.tree.item(item, 'values')
-            base = self.get_base_name(values[1])
-            pair = self.file_pairs.get(base)
-            track_info = pair.get('track_info', [])
-            
-            # Определяем целевую дорожку
-            if track_info and len(track_info) > 1:
-                target_track_index = self.target_track.get()
-                if target_track_index < len(track_info):
-                    target_audio_index = track_info[target_track_index]['audio_index']
-                else:
-                    target_audio_index = 0  # Fallback к первой дорожке
-            else:
-                target_audio_index = 0
-        else:
-            target_audio_index = 0
-        
-        cmd = [
-            ffmpeg_path,
-            '-i', video,
-            '-i', audio,
-            '-filter_complex',
-            f'[0:a:{target_audio_index}]volume={orig_vol}[a0];[1:a]volume={new_vol}[a1];[a0][a1]amix=inputs=2:duration=first:dropout_transition=2[a_mix]',
-        ]
-        
-        if self.delete_original_track.get():
-            cmd.extend([
-                '-map', '0:v:0',
-                '-map', '[a_mix]',
-                '-c:v', 'copy',
-                '-c:a', 'aac', '-aac_coder', 'twoloop',
-                '-b:a', '96k'
-            ])
-        else:
-            cmd.extend([
-                '-map', '0:v:0',
-                '-map', '[a_mix]',
-                '-map', f'0:a:{target_audio_index}',
-                '-c:v', 'copy',
-                '-c:a:0', 'aac', '-aac_coder', 'twoloop',
-                '-b:a:0', '96k',
-                '-c:a:1', 'copy'
-            ])
-        
-        cmd.extend(['-y', output])
-        
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
-            encoding='utf-8',
-            errors='ignore'
-        )
-        
-        return process
-        
     def toggle_processing(self):
         if self.is_processing:
             self.stop_processing()
@@ -1313,37 +1445,49 @@ class MergeApp(TkinterDnD.Tk):
         self.after(0, lambda t=total: [
             self.progress_label.config(text=f"0/{t}")
         ])
-        self.stop_event = threading.Event()
-        threading.Thread(target=self._processing_thread, daemon=True).start()
+        settings = MixSettings(
+            orig_volume=self.orig_volume.get(),
+            new_volume=self.new_volume.get(),
+            invert_tracks=self.invert_tracks.get(),
+            delete_original_track=self.delete_original_track.get(),
+            backup_files=self.backup_files.get(),
+            target_track=self.target_track.get(),
+            encoder_profile=load_from_registry("encoder_profile", DEFAULT_PROFILE),
+            auto_gain=self.auto_gain.get(),
+            # В реестре (DWORD) целевая громкость хранится без минуса
+            target_lufs=-load_from_registry("auto_gain_target_lufs", -int(DEFAULT_TARGET_LUFS)),
+            ratio_db=load_from_registry("auto_gain_ratio_db", int(DEFAULT_RATIO_DB)),
+            ducking=self.ducking.get(),
+            duck_db=load_from_registry("duck_db", int(DEFAULT_DUCK_DB)),
+            variants=self.load_output_variants(),
+        )
+        # 0 в реестре - число заданий и потоков ffmpeg подбирается по ядрам
+        self.batch_engine = BatchEngine(settings, on_status=self.update_item_status,
+                                        on_progress=self.update_batch_progress,
+                                        max_workers=load_from_registry("job_slots", 0),
+                                        threads=load_from_registry("ffmpeg_threads", 0),
+                                        order=self.load_job_order(),
+                                        report_dir=default_report_dir(),
+                                        log_dir=default_log_dir())
+        self.stop_event = self.batch_engine.stop_event
+        # Поток обработки работает со снимком: наблюдатель папок меняет
+        # file_pairs и file_status в главном потоке, пока идёт пакет
+        threading.Thread(target=self._processing_thread,
+                         args=(dict(self.file_pairs), dict(self.file_status)), daemon=True).start()
 
     def stop_processing(self):
             if self.is_processing:
-                self.stop_event.set()
                 self.is_processing = False
                 
                 # Завершаем активные процессы FFmpeg
-                for process in self.active_ffmpeg_processes:
-                    if process.poll() is None:
-                        process.terminate()
-                        try:
-                            process.wait(timeout=1)
-                        except subprocess.TimeoutExpired:
-                            process.kill()
-                self.active_ffmpeg_processes.clear()
+                self.batch_engine.stop()
 
                 # Удаляем временные файлы и сбрасываем статус
+                self.drain_ui_updates(reschedule=False)
+                engine.remove_temp_outputs(self.file_pairs, self.file_status, self.batch_engine.settings)
                 for base, pair in self.file_pairs.items():
-                    if self.file_status.get(base) != 'done':  # Сохраняем готовые файлы
-                        video_path = pair['video']
-                        video_dir = os.path.dirname(video_path)
-                        name, ext = os.path.splitext(os.path.basename(video_path))
-                        temp_output_path = os.path.join(video_dir, "temp", f"{name}_RUS.mkv")
-                        if os.path.exists(temp_output_path):
-                            try:
-                                os.remove(temp_output_path)
-                            except Exception as e:
-                                print(f"Ошибка при удалении {temp_output_path}: {e}")
-                        self.update_item_status(base, 'pending')  # Сбрасываем статус
+                    if pair['video'] and self.file_status.get(base) != 'done':  # Сохраняем готовые файлы
+                        self.apply_item_status(base, 'pending')  # Сбрасываем статус
 
                 # Обновляем интерфейс
                 self.merge_button.config(text="GO", bg="#4CAF50")
@@ -1355,84 +1499,34 @@ class MergeApp(TkinterDnD.Tk):
                     self.done_label.config(text="")
                 ])
             
-    def _processing_thread(self):
-        total = sum(1 for base, pair in self.file_pairs.items() 
-                    if pair['video'] and self.file_status.get(base, 'pending') in ['pending', 'stopped', 'error'])
-        self.processed = 0  # Сбрасываем счетчик перед началом обработки
-        self.active_ffmpeg_processes = []
-
-        def process_file(base, pair):
-            if self.stop_event.is_set():
-                return
-            try:
-                duration = self.get_video_duration(pair['video'])
-                if duration is None:
-                    raise Exception("Не удалось получить длительность видео")
-                self.update_item_status(base, 'processing', progress=0.0)
-                video_path = pair['video']
-                video_dir = os.path.dirname(video_path)
-                name, ext = os.path.splitext(os.path.basename(video_path))
-                temp_dir = os.path.join(video_dir, "temp")
-                os.makedirs(temp_dir, exist_ok=True)
-                temp_output_path = os.path.join(temp_dir, f"{name}_RUS.mkv")
-                output_path = os.path.join(video_dir, f"{name}_RUS.mkv")
-                
-                if pair['audio']:
-                    ffmpeg_process = self.run_ffmpeg_external(pair['video'], pair['audio'], temp_output_path)
-                else:
-                    ffmpeg_process = self.run_ffmpeg_embedded(pair['video'], temp_output_path, pair.get('track_info', []))
-                
-                self.active_ffmpeg_processes.append(ffmpeg_process)
-                
-                threading.Thread(target=self.read_ffmpeg_logs, args=(ffmpeg_process, base, duration), daemon=True).start()
-                
-                while ffmpeg_process.poll() is None:
-                    if self.stop_event.is_set():
-                        ffmpeg_process.terminate()
-                        self.active_ffmpeg_processes.remove(ffmpeg_process)
-                        self.update_item_status(base, 'stopped')
-                        return
-                    time.sleep(0.1)
-
-                if not self.stop_event.is_set() and ffmpeg_process.returncode != 0:
-                    raise Exception(f"FFmpeg ошибка (код {ffmpeg_process.returncode})")
-
-                self.active_ffmpeg_processes.remove(ffmpeg_process)
-
-                if not self.stop_event.is_set():
-                    shutil.move(temp_output_path, output_path)
-                    self.update_item_status(base, 'done')
-                    current_files = [pair['video']]
-                    if pair['audio']:
-                        current_files.append(pair['audio'])
-                    if self.backup_files.get():
-                        self.create_backup_files(current_files)
-                    else:
-                        self.remove_source_files(current_files)
-            
-            except Exception as e:
-                print(f"Ошибка при обработке {pair['video']}: {str(e)}")
-                if not self.stop_event.is_set():
-                    self.update_item_status(base, 'error')
-            finally:
-                self.processed += 1
-                progress = (self.processed / total) * 100 if total > 0 else 100
-                self.after(0, lambda p=progress, pr=self.processed, t=total: [
-                    self.progress.set(p),
-                    self.progress_label.config(text=f"{pr}/{t}")
-                ])
-
-        with ThreadPoolExecutor() as executor:
-            futures = [executor.submit(process_file, base, pair) 
-                       for base, pair in self.file_pairs.items() 
-                       if pair['video'] and self.file_status.get(base, 'pending') in ['pending', 'stopped', 'error']]
-            for future in concurrent.futures.as_completed(futures):
-                if self.stop_event.is_set():
-                    break
-                future.result()
+    def _processing_thread(self, file_pairs, file_status):
+        self.batch_engine.run(file_pairs, file_status)
 
         if not self.stop_event.is_set():
-            self._finalize_processing()
+            # Итог подводится в главном потоке, когда применены все статусы строк
+            self.ui_updates.call_soon(self._finalize_processing)
+
+    def drain_ui_updates(self, reschedule=True):
+        """Один тик: последние статусы строк и общий прогресс из потока обработки"""
+        rows, batch, calls = self.ui_updates.drain()
+        for base, (status, progress) in rows.items():
+            self.apply_item_status(base, status, progress)
+        if batch is not None:
+            self.apply_batch_progress(*batch)
+        for func in calls:
+            func()
+        if reschedule:
+            self.after(self.ui_refresh_ms, self.drain_ui_updates)
+
+    def update_batch_progress(self, processed, total):
+        """Вызывается из потока обработки"""
+        self.ui_updates.put_batch(processed, total)
+
+    def apply_batch_progress(self, processed, total):
+        self.processed = processed
+        progress = (processed / total) * 100 if total > 0 else 100
+        self.progress.set(progress)
+        self.progress_label.config(text=f"{processed}/{total}")
         
     def update_status(self, message, progress):
         self.after(0, lambda: [
@@ -1441,6 +1535,10 @@ class MergeApp(TkinterDnD.Tk):
         ])
 
     def update_item_status(self, base, status, progress=None):
+        """Вызывается из потока обработки: в очередь, применится на тике"""
+        self.ui_updates.put_status(base, status, progress)
+
+    def apply_item_status(self, base, status, progress=None):
         status_symbols = {
             'pending': '🕒',
             'done': '✓',
@@ -1448,211 +1546,28 @@ class MergeApp(TkinterDnD.Tk):
             'stopped': '⏹'
         }
         
-        for item in self.tree.get_children():
-            values = self.tree.item(item, 'values')
-            if self.get_base_name(values[1]) == base:
-                if status == 'processing' and progress is not None:
-                    status_text = f"{progress:.1f}%"
-                else:
-                    status_text = status_symbols.get(status, '?')
-                
-                self.tree.item(item, values=(status_text, values[1], values[2]), tags=(status,))
-                self.file_status[base] = status
-                break
+        values = self.rows.values_of(base)
+        if values is None:
+            return
+        if status == 'processing' and progress is not None:
+            status_text = f"{progress:.1f}%"
+        else:
+            status_text = status_symbols.get(status, '?')
+        
+        self.rows.set_row(base, (status_text, values[1], values[2]), status)
+        self.file_status[base] = status
 
     @staticmethod
     def status_text(status):
         return {
             'pending': 'Ожидает',
+            'probing': 'Проверка',
             'processing': 'Обработка',
             'done': 'Готово',
             'error': 'Ошибка',
             'stopped': 'Остановлено'  # Новый статус
         }.get(status, '')
 
-    def run_ffmpeg_embedded(self, video, output):
-        track_count, track_info = self.check_audio_tracks(video)
-        if track_count <= 1:
-            raise Exception("Недостаточно аудио дорожек для склейки")
-        
-        orig_vol = self.orig_volume.get() / 100
-        new_vol = self.new_volume.get() / 100
-        
-        original_track = 1
-        translation_track = 0
-        
-        if self.invert_tracks.get():
-            original_track, translation_track = translation_track, original_track
-        
-        cmd = [
-            'ffmpeg', '-i', video,
-            '-filter_complex',
-            f'[0:a:{original_track}]volume={orig_vol}[a0];'
-            f'[0:a:{translation_track}]volume={new_vol}[a1];'
-            f'[a0][a1]amix=inputs=2:duration=first:dropout_transition=2[a_mix]',
-            '-map', '0:v:0', 
-            '-map', '[a_mix]', 
-            '-c:v', 'copy', 
-            '-c:a', 'aac', 
-            '-strict', 'experimental',
-            '-y', output
-        ]
-        
-        # Запуск FFmpeg
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True,
-            encoding='utf-8',  # Указываем кодировку
-            errors='ignore'    # Игнорируем ошибки декодирования
-        )
-
-        # Вывод логов FFmpeg
-        output_text = ""
-        while True:
-            line = process.stdout.readline()
-            if line == '' and process.poll() is not None:
-                break
-            if line:
-                output_text += line
-                print(line.strip())
-        
-        # Проверка результата
-        if process.returncode != 0:
-            raise Exception(f"FFmpeg error (code {process.returncode})")
-
-    def run_ffmpeg_embedded(self, video, output, track_info=None):
-        ffmpeg_path = resource_path("ffmpeg.exe")
-        if not os.path.exists(ffmpeg_path):
-            raise FileNotFoundError(f"FFmpeg не найден: {ffmpeg_path}")
-        if track_info is None:
-            track_count, track_info = self.check_audio_tracks(video)
-        else:
-            track_count = len(track_info)
-        if track_count < 2:
-            raise Exception("Недостаточно аудиодорожек для склейки")
-        
-        eng_track = next((t for t in track_info if t['language'] == 'eng'), None)
-        rus_track = next((t for t in track_info if t['language'] == 'rus'), None)
-        
-        if eng_track and rus_track:
-            orig_track = eng_track
-            trans_track = rus_track
-        else:
-            orig_track = track_info[0]
-            trans_track = track_info[1]
-        
-        orig_audio_index = orig_track['audio_index']
-        trans_audio_index = trans_track['audio_index']
-        orig_channel = orig_track.get('channel_layout', 'stereo')
-        trans_channel = trans_track.get('channel_layout', 'stereo')
-        orig_vol = self.orig_volume.get() / 100
-        new_vol = self.new_volume.get() / 100
-        
-        if self.invert_tracks.get():
-            orig_audio_index, trans_audio_index = trans_audio_index, orig_audio_index
-            orig_vol, new_vol = new_vol, orig_vol
-        
-        if orig_channel == 'mono':
-            orig_filter = f"[0:a:{orig_audio_index}]pan=stereo|c0=c0|c1=c0,volume={orig_vol}[a0]"
-        else:
-            orig_filter = f"[0:a:{orig_audio_index}]volume={orig_vol}[a0]"
-        
-        if trans_channel == 'mono':
-            trans_filter = f"[0:a:{trans_audio_index}]pan=stereo|c0=c0|c1=c0,volume={new_vol}[a1]"
-        else:
-            trans_filter = f"[0:a:{trans_audio_index}]volume={new_vol}[a1]"
-        
-        filter_complex = f"{orig_filter};{trans_filter};[a0][a1]amix=inputs=2:duration=first:dropout_transition=2[a_mix]"
-        
-        cmd = [ffmpeg_path, '-i', video, '-filter_complex', filter_complex]
-        
-        if self.delete_original_track.get():
-            cmd.extend([
-                '-map', '0:v:0',
-                '-map', '[a_mix]',
-                '-c:v', 'copy',
-                '-c:a', 'aac', '-aac_coder', 'twoloop',
-                '-b:a', '96k'
-            ])
-        else:
-            cmd.extend([
-                '-map', '0:v:0',
-                '-map', '[a_mix]',
-                '-map', f'0:a:{orig_track["audio_index"]}',
-                '-c:v', 'copy',
-                '-c:a:0', 'aac', '-aac_coder', 'twoloop',
-                '-b:a:0', '96k',
-                '-c:a:1', 'copy'
-            ])
-        
-        cmd.extend(['-y', output])
-        
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
-            encoding='utf-8',
-            errors='ignore'
-        )
-        
-        threading.Thread(target=self.read_ffmpeg_logs, args=(process,), daemon=True).start()
-        
-        return process
-
-    def parse_ffmpeg_progress(self, line):
-        match = re.search(r'time=(\d+:\d+:\d+\.\d+)', line)
-        if match:
-            time_str = match.group(1)
-            h, m, s = map(float, time_str.split(':'))
-            total_seconds = h * 3600 + m * 60 + s
-            return total_seconds
-        return None
-        
-    def mix_audio_tracks(self, video, output, orig_track, trans_track, orig_vol, new_vol):
-        """
-        Смешивает две аудио дорожки и добавляет их в выходной файл
-        """
-        ffmpeg_path = resource_path("ffmpeg.exe")
-        cmd = [
-            ffmpeg_path, '-i', f'"{video}"',
-            '-filter_complex', 
-            f'[0:a:{orig_track}]volume={orig_vol}[a0];'
-            f'[0:a:{trans_track}]volume={new_vol}[a1];'
-            f'[a0][a1]amix=inputs=2:duration=first:dropout_transition=2[a_mix]',
-            '-map', '0:v:0', 
-            '-map', f'0:a:{orig_track}', 
-            '-map', f'0:a:{trans_track}', 
-            '-map', '[a_mix]',
-            '-c:v', 'copy', 
-            '-c:a:0', 'copy', 
-            '-c:a:1', 'copy', 
-            '-c:a:2', 'aac', 
-            '-strict', 'experimental', 
-            '-y', f'"{output}"'
-        ]
-        
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True
-        )
-
-        output_text = ""
-        while True:
-            line = process.stdout.readline()
-            if line == '' and process.poll() is not None:
-                break
-            if line:
-                output_text += line
-                print(line.strip())
-        
-        if process.returncode != 0:
-            raise Exception(f"FFmpeg error (code {process.returncode})")
-
     def _finalize_processing(self):
         if self.stop_event.is_set():
             return
@@ -1674,18 +1589,6 @@ class MergeApp(TkinterDnD.Tk):
             ])
             self.window_focus_effect()
 
-            # Удаление папки "temp" для каждого видео файла
-            for base, pair in self.file_pairs.items():
-                video_path = pair['video']
-                video_dir = os.path.dirname(video_path)
-                temp_dir = os.path.join(video_dir, "temp")
-                if os.path.exists(temp_dir):
-                    try:
-                        shutil.rmtree(temp_dir)
-                        print(f"Удалена временная папка: {temp_dir}")
-                    except Exception as e:
-                        print(f"Не удалось удалить временную папку {temp_dir}: {e}")
-
         except Exception as e:
             print(f"Ошибка при завершении обработки: {str(e)}")
         
@@ -1696,6 +1599,9 @@ class MergeApp(TkinterDnD.Tk):
             if hasattr(self, 'after_id'):
                 self.after_id = None
             self.merge_button.config(text="GO", bg="#4CAF50")
+            if self.watch_restart:
+                self.watch_restart = False
+                self.start_watched_processing()
         
     def window_focus_effect(self):
         self.bell()
@@ -1706,62 +1612,6 @@ class MergeApp(TkinterDnD.Tk):
 
         # Снимаем флаг "поверх всех окон"
         self.attributes('-topmost', False)
-    
-    def create_backup_files(self, files):
-        for f in files:
-            try:
-                if os.path.exists(f):
-                    backup_dir = os.path.join(os.path.dirname(f), "backup")
-                    os.makedirs(backup_dir, exist_ok=True)
-                    dest = os.path.join(backup_dir, os.path.basename(f))
-                    
-                    if os.path.exists(dest):
-                        os.remove(dest)
-                    
-                    shutil.move(f, backup_dir)
-                    print(f"Файл перемещен в backup: {f} -> {dest}")
-                else:
-                    print(f"Файл не существует: {f}")
-            except Exception as e:
-                print(f"Ошибка перемещения {f}: {str(e)}")
-
-    def remove_source_files(self, files):
-        for f in files:
-            try:
-                if os.path.exists(f):
-                    os.remove(f)
-                    print(f"Файл удален: {f}")
-            except Exception as e:
-                print(f"Ошибка удаления {f}: {str(e)}")
-        # Remove backup folder if it exists
-        for f in files:
-            backup_dir = os.path.join(os.path.dirname(f), "backup")
-            if os.path.exists(backup_dir):
-                try:
-                    shutil.rmtree(backup_dir)
-                    print(f"Папка backup удалена: {backup_dir}")
-                except Exception as e:
-                    print(f"Ошибка удаления папки backup {backup_dir}: {str(e)}")
-
-    def backup_files(self):
-        """
-        Создает резервные копии оригинальных файлов.
-        """
-        for f in self.created_files:
-            try:
-                backup_dir = os.path.join(os.path.dirname(f), "backup")
-                print(f"Создаем папку backup: {backup_dir}")  # Отладочное сообщение
-                os.makedirs(backup_dir, exist_ok=True)
-                dest = os.path.join(backup_dir, os.path.basename(f))
-                
-                if os.path.exists(dest):
-                    print(f"Файл уже существует: {dest}")  # Отладочное сообщение
-                    os.remove(dest)
-                
-                print(f"Перемещаем файл: {f} -> {dest}")  # Отладочное сообщение
-                shutil.move(f, backup_dir)
-            except Exception as e:
-                print(f"Ошибка перемещения {f}: {str(e)}")
 
 if __name__ == "__main__":
     app = MergeApp()
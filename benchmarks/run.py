@@ -0,0 +1,184 @@
+"""Замеры производительности Track-Packer на синтетических библиотеках.
+
+    python benchmarks/run.py --pairs 100 1000 --jobs 1 4 --output results.json
+
+Для каждого размера библиотеки замеряются сканирование папки
+(engine.collect_files), сопоставление пар (engine.build_file_pairs),
+чтение метаданных без кэша и с кэшем, а для --e2e-pairs пар - полный
+пакет (BatchEngine.run) при каждом числе заданий из --jobs. Результат
+пишется в JSON вместе с описанием машины, чтобы прогоны разных версий и
+машин можно было сравнить.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def git_revision():
+    try:
+        result = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=REPO_ROOT,
+                                capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ffmpeg_version(ffmpeg_path):
+    result = subprocess.run([ffmpeg_path, '-version'], capture_output=True, text=True)
+    return result.stdout.splitlines()[0] if result.stdout else None
+
+
+def machine_info(ffmpeg_path):
+    from scheduler import available_cpus
+    return {
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'cpus_available': available_cpus(),
+        'ffmpeg': ffmpeg_version(ffmpeg_path),
+        'revision': git_revision(),
+    }
+
+
+def bench_library(engine, root, library, probe_workers):
+    """Сканирование, сопоставление и чтение метаданных одной библиотеки"""
+    from probe import probe_media
+    from probe_cache import get_default_cache
+
+    scan_time, files = timed(engine.collect_files, [root])
+    pair_time, pairs = timed(engine.build_file_pairs, files)
+    videos = [pair['video'] for pair in pairs.values() if pair['video']]
+    matched = sum(1 for pair in pairs.values() if pair['video'] and pair['audio'])
+
+    ffprobe_path = engine.find_tool("ffprobe")
+    with ThreadPoolExecutor(max_workers=probe_workers) as pool:
+        probe_time, _ = timed(lambda: list(pool.map(lambda path: probe_media(path, ffprobe_path), videos)))
+        # Первый проход через кэш заполняет его, второй читает только из кэша
+        fill_time, _ = timed(lambda: list(pool.map(engine.probe_video, videos)))
+        cached_time, _ = timed(lambda: [engine.probe_video(path) for path in videos])
+
+    cache = get_default_cache()
+    if cache is not None:
+        cache.clear()
+    return {
+        'files': len(files['video']) + len(files['audio']),
+        'pairs_expected': len(library['video']),
+        'external_expected': len(library['audio']),
+        'external_matched': matched,
+        'kinds': library['kinds'],
+        'scan_s': round(scan_time, 4),
+        'pair_s': round(pair_time, 4),
+        'probe_workers': probe_workers,
+        'probe_cold_s': round(probe_time, 4),
+        'probe_cache_fill_s': round(fill_time, 4),
+        'probe_cached_s': round(cached_time, 4),
+    }
+
+
+def bench_batch(engine, synth, templates, root, pairs, jobs, seed):
+    """Полный пакет на свежей копии библиотеки"""
+    from engine import BatchEngine, MixSettings
+
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    synth.generate_library(root, pairs, templates, seed)
+    file_pairs = engine.build_file_pairs(engine.collect_files([root]))
+    batch = BatchEngine(MixSettings(), max_workers=jobs)
+    elapsed, status = timed(batch.run, file_pairs, {})
+    done = sum(1 for value in status.values() if value == 'done')
+    media_seconds = sum(event.out_time or 0 for event in batch.job_progress.values())
+    return {
+        'pairs': pairs,
+        'jobs': jobs,
+        'threads_per_job': batch.plan.threads,
+        'wall_s': round(elapsed, 3),
+        'done': done,
+        'errors': sum(1 for value in status.values() if value == 'error'),
+        'pairs_per_s': round(done / elapsed, 3) if elapsed else None,
+        'realtime': round(media_seconds / elapsed, 1) if elapsed else None,
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Замеры Track-Packer на синтетических медиа")
+    parser.add_argument("--pairs", type=int, nargs="+", default=[50, 500],
+                        help="размеры библиотек для сканирования/сопоставления/ffprobe")
+    parser.add_argument("--e2e-pairs", type=int, default=8,
+                        help="число пар для полного пакета (0 - не запускать)")
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 2, 4],
+                        help="числа одновременных заданий для полного пакета")
+    parser.add_argument("--probe-workers", type=int, default=4)
+    parser.add_argument("--clip-seconds", type=float, default=5.0,
+                        help="длина синтетических файлов, с")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workdir", help="папка для библиотек (по умолчанию временная)")
+    parser.add_argument("--output", default="benchmark.json", help="файл JSON с результатами")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="trackpacker-bench-")
+    # Отдельный кэш метаданных, чтобы не трогать кэш пользователя
+    os.environ["TRACKPACKER_CACHE_DIR"] = os.path.join(workdir, "cache")
+    os.environ.pop("TRACKPACKER_NO_CACHE", None)
+    sys.path.insert(0, REPO_ROOT)
+    import engine
+    import synth
+
+    ffmpeg_path = engine.find_tool("ffmpeg")
+    templates = synth.make_templates(ffmpeg_path, os.path.join(workdir, "templates"), args.clip_seconds)
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': machine_info(ffmpeg_path),
+        'params': vars(args),
+        'library': [],
+        'batch': [],
+    }
+    try:
+        for pairs in args.pairs:
+            root = os.path.join(workdir, f"library-{pairs}")
+            library = synth.generate_library(root, pairs, templates, args.seed)
+            result = bench_library(engine, root, library, args.probe_workers)
+            report['library'].append(result)
+            print(f"{pairs} пар: скан {result['scan_s']} с, пары {result['pair_s']} с, "
+                  f"ffprobe {result['probe_cold_s']} с, из кэша {result['probe_cached_s']} с, "
+                  f"найдено внешних {result['external_matched']}/{result['external_expected']}")
+            shutil.rmtree(root)
+
+        if args.e2e_pairs > 0:
+            for jobs in args.jobs:
+                root = os.path.join(workdir, f"batch-{jobs}")
+                result = bench_batch(engine, synth, templates, root, args.e2e_pairs, jobs, args.seed)
+                report['batch'].append(result)
+                print(f"пакет {args.e2e_pairs} пар, заданий {jobs}: {result['wall_s']} с, "
+                      f"{result['pairs_per_s']} пар/с, x{result['realtime']} реального времени")
+                shutil.rmtree(root)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
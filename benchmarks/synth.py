@@ -0,0 +1,118 @@
+"""Синтетические библиотеки для замеров.
+
+Медиа создаются локально источниками lavfi ffmpeg (testsrc, sine,
+anoisesrc): по одному короткому шаблону на каждый вид файлов, дальше
+шаблоны копируются под нужными именами. Содержимое одинаковое, но
+сканирование, сопоставление и ffprobe работают с реальными файлами.
+Библиотека задаётся числом пар и seed, так что её можно воспроизвести.
+"""
+import os
+import random
+import shutil
+import subprocess
+
+SHOWS = [
+    "Super video tutor", "The Office", "Breaking Bad", "Python Course",
+    "Как приручить дракона", "Doctor Who (2005)", "Lesson",
+]
+
+# Вид пары -> доля в библиотеке
+KINDS = {
+    'embedded': 4,     # MKV с английской и русской дорожками
+    'external': 4,     # MP4 + внешний <имя>_rus.mp3
+    'mono': 1,         # MKV: моно оригинал + стерео перевод
+    'surround': 1,     # MKV: 5.1 оригинал + стерео перевод
+}
+
+
+def _lavfi(source, duration):
+    return ['-f', 'lavfi', '-t', str(duration), '-i', source]
+
+
+def template_commands(duration=5.0):
+    """{имя шаблона: аргументы ffmpeg без пути к выходному файлу}"""
+    video = _lavfi('testsrc=size=160x120:rate=10', duration)
+    speech = 'sine=frequency=220:sample_rate=48000'
+    noise = 'anoisesrc=color=pink:amplitude=0.2:sample_rate=48000'
+    stereo = ',aformat=channel_layouts=stereo'
+    video_codec = ['-c:v', 'libx264', '-preset', 'ultrafast']
+    languages = ['-metadata:s:a:0', 'language=eng', '-metadata:s:a:1', 'language=rus']
+    return {
+        'embedded.mkv': video + _lavfi(noise + stereo, duration) + _lavfi(speech + stereo, duration)
+        + ['-map', '0', '-map', '1', '-map', '2'] + video_codec + ['-c:a', 'aac'] + languages,
+        'external.mp4': video + _lavfi(noise + stereo, duration)
+        + video_codec + ['-c:a', 'aac'],
+        'external.mp3': _lavfi(speech + stereo, duration) + ['-c:a', 'libmp3lame', '-b:a', '96k'],
+        'mono.mkv': video + _lavfi(noise + ',aformat=channel_layouts=mono', duration)
+        + _lavfi(speech + stereo, duration)
+        + ['-map', '0', '-map', '1', '-map', '2'] + video_codec + ['-c:a', 'aac'] + languages,
+        'surround.mkv': video + _lavfi(noise + ',aformat=channel_layouts=5.1', duration)
+        + _lavfi(speech + stereo, duration)
+        + ['-map', '0', '-map', '1', '-map', '2'] + video_codec + ['-c:a', 'aac'] + languages,
+    }
+
+
+def make_templates(ffmpeg_path, template_dir, duration=5.0):
+    """Создаёт шаблоны (если их ещё нет) и возвращает {имя: путь}"""
+    os.makedirs(template_dir, exist_ok=True)
+    templates = {}
+    for name, args in template_commands(duration).items():
+        path = os.path.join(template_dir, name)
+        if not os.path.exists(path):
+            subprocess.run([ffmpeg_path, '-hide_banner', '-loglevel', 'error'] + args + ['-y', path],
+                           check=True)
+        templates[name] = path
+    return templates
+
+
+def episode_name(rng, index):
+    """Имя серии, в том числе неудобное: префиксы, точки, скобки, кириллица"""
+    show = rng.choice(SHOWS)
+    season, episode = index // 20 + 1, index % 20 + 1
+    return rng.choice([
+        f"{show} S{season:02d}E{episode:02d}",
+        f"{index + 1:02d}. {show} part {index + 1}",
+        f"{show}.{season}x{episode:02d}..ep",
+        f"[Group] {show} - {index + 1:03d} [1080p]",
+        f"{show}_s{season:02d}_e{episode:02d}",
+    ])
+
+
+def audio_name(rng, video_name):
+    """Имя внешней дорожки, как их называют на практике"""
+    style = rng.randrange(3)
+    if style == 0:
+        return f"{video_name}_rus.mp3"
+    if style == 1:
+        return f"{video_name.replace(' ', '_')}_rus.mp3"
+    return f"{video_name} (RUS).mp3"
+
+
+def generate_library(root, pairs, templates, seed=1):
+    """Копирует шаблоны в root под именами серий.
+
+    Возвращает {'video': [...], 'audio': [...], 'kinds': {вид: число пар}}.
+    """
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    kinds = [kind for kind, weight in KINDS.items() for _ in range(weight)]
+    library = {'video': [], 'audio': [], 'kinds': {kind: 0 for kind in KINDS}}
+    used = set()
+    for index in range(pairs):
+        kind = rng.choice(kinds)
+        name = episode_name(rng, index)
+        while name.lower() in used:
+            name = f"{name} {index}"
+        used.add(name.lower())
+        if kind == 'external':
+            video = os.path.join(root, f"{name}.mp4")
+            audio = os.path.join(root, audio_name(rng, name))
+            shutil.copyfile(templates['external.mp4'], video)
+            shutil.copyfile(templates['external.mp3'], audio)
+            library['audio'].append(audio)
+        else:
+            video = os.path.join(root, f"{name}.mkv")
+            shutil.copyfile(templates[f"{kind}.mkv"], video)
+        library['video'].append(video)
+        library['kinds'][kind] += 1
+    return library
@@ -0,0 +1,215 @@
+"""Приглушение оригинала только там, где в переводе говорят (ducking).
+
+Раньше оригинал в смеси шёл с постоянной громкостью (volume=), и музыка
+с эффектами оставались задавленными даже там, где перевод молчит. Теперь
+дорожка перевода один раз декодируется в моно 8 кГц и по огибающей RMS с
+частотой 100 Гц (NumPy, кусками, без хранения всего сигнала) находятся
+фрагменты речи. Из них строится сглаженная кривая усиления: в паузах
+перевода оригинал громче на duck_db, к началу фразы он плавно приглушается
+до обычной громкости. Кривая применяется в том же проходе ffmpeg, что и
+склейка: команды для asendcmd пишутся в файл рядом с временным результатом
+и меняют громкость отдельного фильтра volume на дорожке оригинала.
+
+Фрагменты речи зависят только от файла и дорожки, поэтому хранятся в кэше
+метаданных (ProbeCache, kind 'speech:<дорожка>'), как и громкость в loudness.
+Речь ищется по энергии: если в дорожке перевода вместе с голосом громкая
+музыка, такие места считаются речью и звучат как без ducking.
+"""
+import math
+import re
+import subprocess
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from probe_cache import get_default_cache
+from telemetry import ProcessUsage
+
+# Насколько оригинал громче в паузах перевода
+DEFAULT_DUCK_DB = 12.0
+
+ANALYSIS_SAMPLE_RATE = 8000
+ENVELOPE_RATE = 100                 # кадров огибающей в секунду
+FRAME_SAMPLES = ANALYSIS_SAMPLE_RATE // ENVELOPE_RATE
+READ_FRAMES = 10 * ENVELOPE_RATE    # читаем по 10 секунд сигнала
+
+# Порог речи: на RELATIVE_DB ниже громких мест дорожки, но не ниже FLOOR_DB
+SILENCE_DB = -70.0
+RELATIVE_DB = 22.0
+FLOOR_DB = -50.0
+# Паузы короче MIN_GAP внутри фразы не разрывают её, всплески короче MIN_SPEECH - не речь
+MIN_GAP = 0.25
+MIN_SPEECH = 0.15
+
+# Оригинал приглушается за PRE_ROLL до фразы и возвращается не раньше HOLD после неё;
+# переход сглаживается за RAMP секунд
+PRE_ROLL = 0.3
+HOLD = 0.6
+RAMP = 0.4
+# Команда громкости отправляется, когда кривая изменилась на STEP_DB
+STEP_DB = 0.5
+
+
+def numpy_available():
+    return np is not None
+
+
+def cache_kind(stream):
+    return f'speech:{stream}'
+
+
+def cached_segments(path, stream):
+    """Найденные ранее фрагменты речи [[начало, конец], ...] или None"""
+    cache = get_default_cache()
+    if cache is None:
+        return None
+    data = cache.get(path, kind=cache_kind(stream))
+    return data.get('segments') if data else None
+
+
+def store_segments(path, stream, segments):
+    cache = get_default_cache()
+    if cache is not None:
+        cache.put(path, {'segments': segments}, kind=cache_kind(stream))
+
+
+def analysis_cmd(ffmpeg_path, path, stream):
+    """Дорожка как моно float32 8 кГц в stdout"""
+    return [ffmpeg_path, '-v', 'error', '-nostdin', '-i', path, '-map', f'0:{stream}',
+            '-vn', '-sn', '-dn', '-ac', '1', '-ar', str(ANALYSIS_SAMPLE_RATE), '-f', 'f32le', '-']
+
+
+def rms_envelope(ffmpeg_path, path, stream, stop_event=None, on_usage=None):
+    """RMS дорожки по кадрам 10 мс (массив NumPy); None - остановлено.
+
+    Сигнал читается по READ_FRAMES кадров, в памяти остаётся только огибающая.
+    """
+    started = time.perf_counter()
+    process = subprocess.Popen(analysis_cmd(ffmpeg_path, path, stream), stdin=subprocess.DEVNULL,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    chunk_bytes = READ_FRAMES * FRAME_SAMPLES * 4
+    parts = []
+    tail = b''
+    try:
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                process.kill()
+                return None
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            data = tail + data
+            usable = len(data) - len(data) % (FRAME_SAMPLES * 4)
+            tail = data[usable:]
+            frames = np.frombuffer(data[:usable], dtype='<f4').reshape(-1, FRAME_SAMPLES)
+            parts.append(np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1)))
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+        if on_usage is not None:
+            on_usage(ProcessUsage(wall_seconds=time.perf_counter() - started))
+    if returncode != 0:
+        raise Exception(f"Не удалось декодировать {path} ({stream}) для поиска речи (код {returncode})")
+    return np.concatenate(parts) if parts else np.zeros(0)
+
+
+def runs(mask):
+    """(начала, концы) подряд идущих True в mask, концы не включительно"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def detect_speech(envelope):
+    """Фрагменты речи [[начало, конец], ...] в секундах по огибающей"""
+    if not len(envelope):
+        return []
+    db = 20 * np.log10(np.maximum(envelope, 1e-9))
+    audible = db[db > SILENCE_DB]
+    if not len(audible):
+        return []
+    threshold = max(np.percentile(audible, 95) - RELATIVE_DB, FLOOR_DB)
+    starts, ends = runs(db > threshold)
+    if not len(starts):
+        return []
+    # Склеиваем фразы, разорванные короткими паузами
+    keep = starts[1:] - ends[:-1] >= MIN_GAP * ENVELOPE_RATE
+    starts = np.concatenate((starts[:1], starts[1:][keep]))
+    ends = np.concatenate((ends[:-1][keep], ends[-1:]))
+    long_enough = ends - starts >= MIN_SPEECH * ENVELOPE_RATE
+    return [[round(start / ENVELOPE_RATE, 2), round(end / ENVELOPE_RATE, 2)]
+            for start, end in zip(starts[long_enough].tolist(), ends[long_enough].tolist())]
+
+
+def speech_segments(ffmpeg_path, path, stream, stop_event=None, on_usage=None):
+    """Фрагменты речи дорожки из кэша или найденные заново (блокирующий вызов); None - остановлено"""
+    segments = cached_segments(path, stream)
+    if segments is not None:
+        return segments
+    envelope = rms_envelope(ffmpeg_path, path, stream, stop_event, on_usage)
+    if envelope is None:
+        return None
+    segments = detect_speech(envelope)
+    store_segments(path, stream, segments)
+    return segments
+
+
+def gap_lift_db(orig_volume, duck_db):
+    """Подъём оригинала в паузах: не больше duck_db и не громче 100%"""
+    if orig_volume >= 100:
+        return 0.0
+    return max(0.0, min(duck_db, 20 * math.log10(100 / orig_volume)))
+
+
+def gain_curve(segments, duration, lift_db):
+    """Усиление оригинала в дБ по кадрам 10 мс: 0 во время речи, lift_db в паузах"""
+    frames = max(1, int(math.ceil(duration * ENVELOPE_RATE)))
+    delta = np.zeros(frames + 1)
+    if segments:
+        bounds = np.asarray(segments, dtype=np.float64) * ENVELOPE_RATE
+        # Приглушение начинается до фразы и держится после неё
+        starts = np.clip(np.floor(bounds[:, 0] - PRE_ROLL * ENVELOPE_RATE), 0, frames).astype(int)
+        ends = np.clip(np.ceil(bounds[:, 1] + HOLD * ENVELOPE_RATE), 0, frames).astype(int)
+        np.add.at(delta, starts, 1)
+        np.add.at(delta, ends, -1)
+    speech = np.cumsum(delta)[:frames] > 0
+    target = np.where(speech, 0.0, lift_db)
+    width = max(1, int(RAMP * ENVELOPE_RATE))
+    padded = np.pad(target, (width // 2, width - 1 - width // 2), mode='edge')
+    return np.convolve(padded, np.ones(width) / width, mode='valid')
+
+
+def gain_commands(curve, target):
+    """Команды asendcmd для фильтра volume@target: строка на каждое изменение на STEP_DB"""
+    steps = np.round(curve / STEP_DB)
+    changes = np.concatenate(([0], np.flatnonzero(np.diff(steps)) + 1))
+    top = curve.max() if len(curve) else 0.0
+    lines = []
+    for index in changes.tolist():
+        gain_db = min(steps[index] * STEP_DB, top)
+        lines.append(f"{index / ENVELOPE_RATE:.2f} {target} volume {10 ** (gain_db / 20):.6f};")
+    return "\n".join(lines) + "\n"
+
+
+def filter_arg(value):
+    """Значение опции фильтра внутри -filter_complex (экранирование двух уровней)"""
+    value = re.sub(r"([\\':])", r'\\\1', value)
+    return re.sub(r"([\\'\[\],;])", r'\\\1', value)
+
+
+def target_name(number):
+    return f'duck{number}'
+
+
+def filter_chain(commands_path, number=0):
+    """Продолжение цепочки оригинала: громкость меняют команды из commands_path"""
+    if not commands_path:
+        return ''
+    return f",asendcmd=f={filter_arg(commands_path)},volume@{target_name(number)}=1"
+
+
+def write_commands(commands_path, segments, duration, lift_db, number=0):
+    with open(commands_path, 'w', encoding='utf-8') as f:
+        f.write(gain_commands(gain_curve(segments, duration, lift_db), target_name(number)))
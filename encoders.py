@@ -0,0 +1,128 @@
+"""Профили кодирования смешанной дорожки.
+
+Раньше всегда использовался aac -aac_coder twoloop 96k - самый медленный
+режим встроенного AAC, который на заданиях с -c:v copy часто и есть узкое
+место. Профиль выбирается по имени; доступность проверяется по списку
+кодеров локального ffmpeg (libfdk_aac и libopus есть не в каждой сборке).
+"""
+import os
+import subprocess
+import tempfile
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Tuple
+
+DEFAULT_PROFILE = 'aac-twoloop'
+
+
+@dataclass(frozen=True)
+class EncoderProfile:
+    name: str
+    title: str
+    encoder: str
+    options: Tuple[Tuple[str, str], ...] = ()   # (параметр, значение) для потока
+
+    def codec_args(self, stream=':a'):
+        """Параметры ffmpeg для потока stream (':a' - все аудио, ':a:0' - первый)"""
+        args = [f'-c{stream}', self.encoder]
+        for option, value in self.options:
+            args.extend([f'{option}{stream}', value])
+        return args
+
+
+PROFILES = {profile.name: profile for profile in (
+    EncoderProfile('aac-fast', "AAC, быстрый кодер, 128 кбит/с", 'aac',
+                   (('-aac_coder', 'fast'), ('-b', '128k'))),
+    EncoderProfile('aac-twoloop', "AAC, twoloop, 96 кбит/с (медленно, как раньше)", 'aac',
+                   (('-aac_coder', 'twoloop'), ('-b', '96k'))),
+    EncoderProfile('fdk-aac', "AAC через libfdk_aac, 96 кбит/с", 'libfdk_aac',
+                   (('-b', '96k'),)),
+    EncoderProfile('opus', "Opus, 96 кбит/с", 'libopus',
+                   (('-b', '96k'),)),
+    EncoderProfile('flac', "FLAC без потерь", 'flac',
+                   (('-compression_level', '5'),)),
+)}
+
+
+@lru_cache(maxsize=None)
+def available_encoders(ffmpeg_path):
+    """Имена аудиокодеров, с которыми собран ffmpeg"""
+    try:
+        result = subprocess.run([ffmpeg_path, '-hide_banner', '-encoders'],
+                                capture_output=True, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"Не удалось получить список кодеров ffmpeg: {e}")
+        return frozenset()
+    encoders = set()
+    for line in result.stdout.decode('utf-8', errors='ignore').splitlines():
+        parts = line.split()
+        # Строки вида " A....D aac   AAC (Advanced Audio Coding)"
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0].startswith('A'):
+            encoders.add(parts[1])
+    return frozenset(encoders)
+
+
+def available_profiles(ffmpeg_path):
+    """Профили, которые поддерживает данная сборка ffmpeg, в порядке PROFILES"""
+    encoders = available_encoders(ffmpeg_path)
+    return [profile for profile in PROFILES.values() if profile.encoder in encoders]
+
+
+def resolve_profile(name, ffmpeg_path):
+    """Профиль по имени; если он недоступен - профиль по умолчанию"""
+    profile = PROFILES.get(name or DEFAULT_PROFILE)
+    if profile is None:
+        print(f"Неизвестный профиль кодирования {name}, используется {DEFAULT_PROFILE}")
+        return PROFILES[DEFAULT_PROFILE]
+    if profile.encoder not in available_encoders(ffmpeg_path):
+        print(f"ffmpeg собран без {profile.encoder}, используется {DEFAULT_PROFILE}")
+        return PROFILES[DEFAULT_PROFILE]
+    return profile
+
+
+def reference_input_args(clip=None, duration=60.0):
+    """Вход для замера: файл или синтетический стерео-сигнал (речь+шум) из lavfi"""
+    if clip:
+        return ['-t', str(duration), '-i', clip]
+    return [
+        '-f', 'lavfi', '-t', str(duration),
+        '-i', 'sine=frequency=220:sample_rate=48000,aformat=channel_layouts=stereo',
+        '-f', 'lavfi', '-t', str(duration),
+        '-i', 'anoisesrc=color=pink:amplitude=0.3:sample_rate=48000,aformat=channel_layouts=stereo',
+        '-filter_complex', '[0:a][1:a]amix=inputs=2:duration=first',
+    ]
+
+
+def benchmark_profiles(ffmpeg_path, clip=None, duration=60.0, profiles=None):
+    """Кодирует эталонный фрагмент каждым профилем.
+
+    Возвращает список словарей: профиль, время, во сколько раз быстрее
+    реального времени и получившийся битрейт.
+    """
+    results = []
+    profiles = profiles or available_profiles(ffmpeg_path)
+    with tempfile.TemporaryDirectory(prefix="trackpacker-bench-") as temp_dir:
+        for profile in profiles:
+            output = os.path.join(temp_dir, f"{profile.name}.mka")
+            cmd = [ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-threads', '1']
+            cmd.extend(reference_input_args(clip, duration))
+            cmd.extend(['-vn'])
+            cmd.extend(profile.codec_args())
+            cmd.extend(['-y', output])
+            started = time.perf_counter()
+            result = subprocess.run(cmd, capture_output=True)
+            elapsed = time.perf_counter() - started
+            if result.returncode != 0:
+                error = result.stderr.decode('utf-8', errors='ignore').strip()
+                print(f"Профиль {profile.name}: ошибка ffmpeg: {error}")
+                continue
+            size = os.path.getsize(output)
+            results.append({
+                'profile': profile.name,
+                'encoder': profile.encoder,
+                'seconds': round(elapsed, 3),
+                'realtime': round(duration / elapsed, 1) if elapsed else None,
+                'bitrate_kbps': round(size * 8 / duration / 1000, 1),
+            })
+    return results
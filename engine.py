@@ -0,0 +1,945 @@
+"""Движок пакетной склейки дорожек без зависимости от Tk.
+
+Здесь живёт вся работа, которую раньше делал MergeApp: поиск пар
+видео/аудио, проверка дорожек, запуск ffmpeg, резервные копии и очистка.
+GUI (Voiceover.py) и консольный trackpacker.py используют один и тот же код.
+"""
+import os
+import sys
+import shutil
+import threading
+import time
+import functools
+from collections import Counter, deque
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import Optional
+
+from encoders import DEFAULT_PROFILE, resolve_profile
+import ducking
+from ducking import DEFAULT_DUCK_DB
+import loudness
+import render_cache
+import telemetry
+from joblog import DEFAULT_LOG_LINES, JobLog
+from journal import commit_file, get_default_journal
+from pairing import get_base_name, pair_files  # noqa: F401 - get_base_name нужен GUI
+from probe import probe_media, media_to_dict, media_from_dict
+from probe_cache import get_default_cache
+from progress import ProgressParser, progress_args
+from scanner import AUDIO_EXTENSIONS, VIDEO_EXTENSIONS, MediaFiles, scan_paths
+from scheduler import DEFAULT_ORDER, fill_costs, order_indexes, plan_slots
+from supervisor import ProcessSupervisor
+from variants import DEFAULT_CONTAINER, DEFAULT_SUFFIX, OutputVariant, find_language_audio
+
+# Прежние имена наборов расширений (ими пользуются watcher и GUI)
+video_ext = VIDEO_EXTENSIONS
+audio_ext = AUDIO_EXTENSIONS
+
+# Статусы, с которыми пара снова попадает в обработку.
+# 'probing' - метаданные ещё читаются в GUI, задание дочитает их само
+RUNNABLE_STATUSES = ('pending', 'probing', 'stopped', 'error')
+
+
+def resource_path(relative_path):
+    """ Получает корректный путь для ресурсов в exe и dev режиме """
+    if hasattr(sys, '_MEIPASS'):
+        return os.path.join(sys._MEIPASS, relative_path)
+    else:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        return os.path.join(script_dir, relative_path)
+
+
+@lru_cache(maxsize=None)
+def find_tool(name):
+    """Ищет ffmpeg/ffprobe/ffplay.
+
+    Порядок: переменная окружения TRACKPACKER_<NAME>, копия рядом с программой
+    (сборка PyInstaller под Windows), затем PATH.
+    """
+    override = os.environ.get(f"TRACKPACKER_{name.upper()}")
+    if override:
+        return override
+    exe_name = f"{name}.exe" if os.name == 'nt' else name
+    bundled = resource_path(exe_name)
+    if os.path.isfile(bundled):
+        return bundled
+    found = shutil.which(name)
+    if found:
+        return found
+    raise FileNotFoundError(f"{name} не найден ни рядом с программой, ни в PATH")
+
+
+def own_outputs(paths, journal=None):
+    """Какие из путей - готовые результаты прошлых склеек (по журналу или индексу результатов)"""
+    if journal is None:
+        journal = get_default_journal()
+    found = set(journal.committed_outputs(paths)) if journal is not None else set()
+    found.update(render_cache.recorded_outputs(paths))
+    return found
+
+
+def collect_files(paths, storage=None, workers=1, journal=None):
+    """Раскладывает файлы и содержимое папок по спискам 'video' и 'audio'.
+
+    storage - scanner.MediaFiles (или обычный словарь со списками); файл,
+    который уже есть в нём под этим или другим именем, не добавляется.
+    Готовые *_RUS.mkv прошлых запусков отбрасываются сразу: у них тот же
+    base, что у исходного видео, и при сопоставлении они бы его вытеснили.
+    """
+    if storage is None:
+        storage = MediaFiles()
+    files = storage if isinstance(storage, MediaFiles) else MediaFiles(storage['video'], storage['audio'])
+    found = scan_paths([path.strip('{}') for path in paths], workers)
+    outputs = own_outputs([path for path, kind, _ in found if kind == 'video'], journal)
+    for path, kind, identity in found:
+        if path in outputs:
+            print(f"Пропуск {os.path.basename(path)}: это результат прошлой склейки")
+            continue
+        if files.add(path, kind, identity) and files is not storage:
+            storage[kind].append(path)
+    return storage
+
+
+def build_file_pairs(files, previous=None):
+    """Сопоставляет видео и внешние аудиодорожки по имени.
+
+    Метаданные из previous (прошлый результат) переносятся, чтобы не запускать
+    ffprobe повторно для тех же видео; закрепление пар тоже сохраняется.
+    """
+    known_media = {}
+    priorities = {}
+    for pair in (previous or {}).values():
+        if pair.get('video') and pair.get('media') is not None:
+            known_media[pair['video']] = pair['media']
+        if pair.get('video') and pair.get('priority'):
+            priorities[pair['video']] = pair['priority']
+
+    base_names = pair_files(files['video'], files['audio'])
+    for pair in base_names.values():
+        if pair['video'] in known_media:
+            pair['media'] = known_media[pair['video']]
+        if pair['video'] in priorities:
+            pair['priority'] = priorities[pair['video']]
+    return base_names
+
+
+def probe_video(video_path):
+    """Метаданные файла (MediaInfo или None): из кэша, иначе одним вызовом ffprobe"""
+    cache = get_default_cache()
+    if cache is not None:
+        cached = cache.get(video_path)
+        if cached is not None:
+            try:
+                return media_from_dict(cached)
+            except TypeError:
+                # Запись старого формата - перечитываем файл
+                cache.invalidate(video_path)
+    media = probe_media(video_path, find_tool("ffprobe"))
+    if media is not None and cache is not None:
+        cache.put(video_path, media_to_dict(media))
+    return media
+
+
+def cached_duration(pair):
+    """Длительность видео пары из уже прочитанных метаданных или кэша; ffprobe не запускается"""
+    media = pair.get('media')
+    if media is None and pair.get('video'):
+        cache = get_default_cache()
+        cached = cache.get(pair['video']) if cache is not None else None
+        if cached is not None:
+            try:
+                media = media_from_dict(cached)
+            except TypeError:
+                media = None
+    return media.duration if media is not None else None
+
+
+def order_jobs(jobs, policy=DEFAULT_ORDER):
+    """Пары [(base, pair)] в порядке запуска и их оценки длительности.
+
+    Пары с pair['priority'] > 0 (закреплённые) идут первыми.
+    """
+    sizes = []
+    for base, pair in jobs:
+        try:
+            sizes.append(os.path.getsize(pair['video']))
+        except (OSError, TypeError):
+            sizes.append(0)
+    costs = fill_costs([cached_duration(pair) for base, pair in jobs], sizes)
+    order = order_indexes(costs, policy, [pair.get('priority', 0) for base, pair in jobs])
+    return [jobs[index] for index in order], [costs[index] for index in order]
+
+
+def invalidate_media(path):
+    """Сбрасывает кэш метаданных файла (после переноса или удаления)"""
+    cache = get_default_cache()
+    if cache is not None:
+        cache.invalidate(path)
+
+
+def ensure_media(pair):
+    """Метаданные видео пары; ffprobe запускается один раз и результат хранится в паре"""
+    media = pair.get('media')
+    if media is None and pair.get('video'):
+        media = probe_video(pair['video'])
+        pair['media'] = media
+    return media
+
+
+def pair_tracks(pair):
+    """Внутренние аудиодорожки видео пары"""
+    media = ensure_media(pair)
+    return list(media.audio_streams) if media else []
+
+
+def get_track_language_info(track_info):
+    if not track_info:
+        return "неизвестно"
+
+    lang_info = []
+    for track in track_info:
+        lang = track.language.upper()
+        idx = track.track_index
+        lang_info.append(f"{idx}:{lang}")
+
+    return ", ".join(lang_info)
+
+
+@dataclass
+class MixSettings:
+    """Параметры склейки, общие для всех пар пакета"""
+    orig_volume: float = 5          # громкость оригинала, %
+    new_volume: float = 100         # громкость перевода, %
+    invert_tracks: bool = False     # поменять местами внутренние дорожки
+    delete_original_track: bool = False  # не сохранять оригинальную дорожку в выходном файле
+    backup_files: bool = True       # переносить исходники в backup вместо удаления
+    target_track: int = 0           # индекс внутренней дорожки для смешивания с внешним аудио
+    encoder_profile: str = DEFAULT_PROFILE  # профиль кодирования смеси (encoders.PROFILES)
+    auto_gain: bool = False         # громкости по измеренной громкости дорожек (loudness)
+    target_lufs: float = loudness.DEFAULT_TARGET_LUFS  # громкость перевода в смеси
+    ratio_db: float = loudness.DEFAULT_RATIO_DB        # на сколько дБ оригинал тише перевода
+    ducking: bool = False           # оригинал громче в паузах перевода (ducking)
+    duck_db: float = DEFAULT_DUCK_DB   # на сколько дБ громче в паузах
+    variants: tuple = ()            # результаты задания (variants.OutputVariant); пусто - один _RUS.mkv
+
+
+def select_embedded_tracks(track_info, invert=False):
+    """Возвращает (оригинал, перевод) среди внутренних дорожек"""
+    eng_track = next((t for t in track_info if t.language == 'eng'), None)
+    rus_track = next((t for t in track_info if t.language == 'rus'), None)
+
+    if eng_track and rus_track:
+        orig_track, trans_track = eng_track, rus_track
+    else:
+        orig_track, trans_track = track_info[0], track_info[1]
+
+    if invert:
+        orig_track, trans_track = trans_track, orig_track
+    return orig_track, trans_track
+
+
+def resolve_target_audio_index(track_info, target_track):
+    """Номер внутренней аудиодорожки, с которой смешивается внешнее аудио"""
+    if track_info and len(track_info) > 1 and target_track is not None:
+        if 0 <= target_track < len(track_info):
+            return track_info[target_track].audio_index
+    return 0
+
+
+def loudness_sources(pair, settings, track_info):
+    """[(путь, дорожка, моно) оригинала, то же для перевода] - что смешивается в задании"""
+    if pair.get('audio'):
+        target_audio_index = resolve_target_audio_index(track_info, settings.target_track)
+        return [(pair['video'], f'a:{target_audio_index}', False), (pair['audio'], 'a:0', False)]
+    if len(track_info) < 2:
+        raise Exception("Недостаточно аудиодорожек для склейки")
+    orig_track, trans_track = select_embedded_tracks(track_info, settings.invert_tracks)
+    return [(pair['video'], f'a:{track.audio_index}', track.is_mono) for track in (orig_track, trans_track)]
+
+
+def audio_codec_args(delete_original, profile_name=DEFAULT_PROFILE):
+    profile = resolve_profile(profile_name, find_tool("ffmpeg"))
+    if delete_original:
+        return profile.codec_args(':a')
+    return profile.codec_args(':a:0') + ['-c:a:1', 'copy']
+
+
+def metadata_args(metadata):
+    args = []
+    for key, value in (metadata or {}).items():
+        args.extend(['-metadata', f'{key}={value}'])
+    return args
+
+
+def build_external_cmd(video, audio, output, settings, track_info=None, plan=None, metadata=None,
+                       duck_commands=None):
+    """Команда ffmpeg для смешивания внутренней дорожки с внешним аудиофайлом.
+
+    plan (scheduler.SlotPlan) задаёт число потоков ffmpeg для задания,
+    metadata - глобальные теги выходного файла, duck_commands - файл
+    команд громкости оригинала (ducking.write_commands).
+    """
+    orig_vol = settings.orig_volume / 100
+    new_vol = settings.new_volume / 100
+    target_audio_index = resolve_target_audio_index(track_info, settings.target_track)
+
+    cmd = [find_tool("ffmpeg")] + progress_args()
+    if plan is not None:
+        cmd.extend(plan.input_args())
+    cmd.extend([
+        '-i', video,
+        '-i', audio,
+        '-filter_complex',
+        f'[0:a:{target_audio_index}]volume={orig_vol}{ducking.filter_chain(duck_commands)}[a0];[1:a]volume={new_vol}[a1];[a0][a1]amix=inputs=2:duration=first:dropout_transition=2[a_mix]',
+        '-map', '0:v:0',
+        '-map', '[a_mix]',
+    ])
+    if not settings.delete_original_track:
+        cmd.extend(['-map', f'0:a:{target_audio_index}'])
+    cmd.extend(['-c:v', 'copy'])
+    cmd.extend(audio_codec_args(settings.delete_original_track, settings.encoder_profile))
+    if plan is not None:
+        cmd.extend(plan.output_args())
+    cmd.extend(metadata_args(metadata))
+    cmd.extend(['-y', output])
+    return cmd
+
+
+def build_embedded_cmd(video, output, track_info, settings, plan=None, metadata=None, duck_commands=None):
+    """Команда ffmpeg для смешивания двух внутренних дорожек"""
+    if len(track_info) < 2:
+        raise Exception("Недостаточно аудиодорожек для склейки")
+
+    orig_track, trans_track = select_embedded_tracks(track_info, settings.invert_tracks)
+    orig_vol = settings.orig_volume / 100
+    new_vol = settings.new_volume / 100
+
+    def track_filter(track, volume, label, extra=''):
+        if track.is_mono:
+            return f"[0:a:{track.audio_index}]pan=stereo|c0=c0|c1=c0,volume={volume}{extra}[{label}]"
+        return f"[0:a:{track.audio_index}]volume={volume}{extra}[{label}]"
+
+    filter_complex = (
+        f"{track_filter(orig_track, orig_vol, 'a0', ducking.filter_chain(duck_commands))};"
+        f"{track_filter(trans_track, new_vol, 'a1')};"
+        f"[a0][a1]amix=inputs=2:duration=first:dropout_transition=2[a_mix]"
+    )
+
+    cmd = [find_tool("ffmpeg")] + progress_args()
+    if plan is not None:
+        cmd.extend(plan.input_args())
+    cmd.extend([
+        '-i', video, '-filter_complex', filter_complex,
+        '-map', '0:v:0',
+        '-map', '[a_mix]',
+    ])
+    if not settings.delete_original_track:
+        cmd.extend(['-map', f'0:a:{orig_track.audio_index}'])
+    cmd.extend(['-c:v', 'copy'])
+    cmd.extend(audio_codec_args(settings.delete_original_track, settings.encoder_profile))
+    if plan is not None:
+        cmd.extend(plan.output_args())
+    cmd.extend(metadata_args(metadata))
+    cmd.extend(['-y', output])
+    return cmd
+
+
+def build_multi_cmd(video, track_info, outputs, plan=None):
+    """Одна команда ffmpeg для нескольких результатов (JobOutput) одного видео.
+
+    Каждая используемая дорожка декодируется один раз и размножается
+    asplit по числу смесей, в которых она участвует; видео читается тоже
+    один раз и копируется в каждый результат.
+    """
+    inputs = [video]
+    mixes = []
+    for output in outputs:
+        settings = output.settings
+        if output.audio:
+            if output.audio not in inputs:
+                inputs.append(output.audio)
+            target_audio_index = resolve_target_audio_index(track_info, settings.target_track)
+            orig = (0, f'a:{target_audio_index}', False)
+            trans = (inputs.index(output.audio), 'a:0', False)
+        else:
+            if len(track_info) < 2:
+                raise Exception("Недостаточно аудиодорожек для склейки")
+            orig_track, trans_track = select_embedded_tracks(track_info, settings.invert_tracks)
+            orig = (0, f'a:{orig_track.audio_index}', orig_track.is_mono)
+            trans = (0, f'a:{trans_track.audio_index}', trans_track.is_mono)
+        mixes.append((orig, trans, output))
+
+    uses = Counter(source for orig, trans, output in mixes for source in (orig, trans))
+    labels = {}
+    filters = []
+    for number, ((input_index, stream, is_mono), count) in enumerate(uses.items()):
+        outs = [f'[s{number}_{i}]' for i in range(count)]
+        labels[(input_index, stream, is_mono)] = outs
+        chain = ['pan=stereo|c0=c0|c1=c0'] if is_mono else []
+        chain.append(f'asplit={count}' if count > 1 else 'anull')
+        filters.append(f"[{input_index}:{stream}]{','.join(chain)}{''.join(outs)}")
+    for number, (orig, trans, output) in enumerate(mixes):
+        orig_vol = output.settings.orig_volume / 100
+        new_vol = output.settings.new_volume / 100
+        duck = ducking.filter_chain(output.duck_commands, number)
+        filters.append(f"{labels[orig].pop()}volume={orig_vol}{duck}[o{number}]")
+        filters.append(f"{labels[trans].pop()}volume={new_vol}[t{number}]")
+        filters.append(f"[o{number}][t{number}]amix=inputs=2:duration=first:dropout_transition=2[mix{number}]")
+
+    cmd = [find_tool("ffmpeg")] + progress_args()
+    if plan is not None:
+        cmd.extend(plan.input_args())
+    for path in inputs:
+        cmd.extend(['-i', path])
+    cmd.extend(['-filter_complex', ';'.join(filters)])
+    for number, (orig, trans, output) in enumerate(mixes):
+        settings = output.settings
+        cmd.extend(['-map', '0:v:0', '-map', f'[mix{number}]'])
+        if not settings.delete_original_track:
+            cmd.extend(['-map', f'0:{orig[1]}'])
+        cmd.extend(['-c:v', 'copy'])
+        cmd.extend(audio_codec_args(settings.delete_original_track, settings.encoder_profile))
+        if plan is not None:
+            cmd.extend(plan.output_args())
+        cmd.extend(metadata_args(output.metadata()))
+        cmd.extend(['-y', output.temp_path])
+    return cmd
+
+
+def output_paths(video_path, suffix=DEFAULT_SUFFIX, container=DEFAULT_CONTAINER):
+    """Пути (временный, итоговый) для результата склейки"""
+    video_dir = os.path.dirname(video_path)
+    name, ext = os.path.splitext(os.path.basename(video_path))
+    temp_output_path = os.path.join(video_dir, "temp", f"{name}_{suffix}.{container}")
+    output_path = os.path.join(video_dir, f"{name}_{suffix}.{container}")
+    return temp_output_path, output_path
+
+
+@dataclass
+class JobOutput:
+    """Один результат задания: откуда перевод, с какими настройками и куда"""
+    variant: OutputVariant
+    audio: Optional[str]            # внешний перевод или None - внутренняя дорожка
+    settings: MixSettings           # громкости уже с учётом варианта
+    temp_path: str
+    output_path: str
+    # Настройки до auto_gain: по ним журнал узнаёт уже готовый результат,
+    # громкости из замера в ключ не попадают
+    requested: Optional[MixSettings] = None
+    fingerprint: Optional[str] = None
+    duck_commands: Optional[str] = None   # файл команд громкости оригинала (ducking)
+
+    def duck_commands_path(self):
+        return os.path.splitext(self.temp_path)[0] + '.duck.txt'
+
+    def sources(self, video):
+        return {'video': video, 'audio': self.audio}
+
+    def metadata(self):
+        return {render_cache.FINGERPRINT_TAG: self.fingerprint} if self.fingerprint else None
+
+
+def job_outputs(pair, settings, skipped=None):
+    """Результаты задания: по одному на settings.variants, без них - один _RUS.mkv.
+
+    Вариант, для которого нет дорожки _<LANG>, пропускается, остальные
+    собираются как обычно; в skipped (если передан) добавляются пары
+    (итоговый путь, причина). Исключение - только если не осталось ни одного.
+    """
+    outputs = []
+    missing = []
+    for variant in settings.variants or (OutputVariant(),):
+        audio = pair.get('audio')
+        if variant.audio_lang:
+            audio = find_language_audio(pair['video'], variant.audio_lang, audio_ext)
+            if audio is None:
+                reason = f"не найдена дорожка _{variant.audio_lang}"
+                missing.append(reason)
+                if skipped is not None:
+                    skipped.append((output_paths(pair['video'], variant.suffix, variant.container)[1], reason))
+                continue
+        variant_settings = replace(
+            settings, variants=(),
+            orig_volume=settings.orig_volume if variant.orig_volume is None else variant.orig_volume,
+            new_volume=settings.new_volume if variant.new_volume is None else variant.new_volume)
+        temp_path, output_path = output_paths(pair['video'], variant.suffix, variant.container)
+        outputs.append(JobOutput(variant, audio, variant_settings, temp_path, output_path,
+                                 requested=variant_settings))
+    if not outputs:
+        raise Exception(f"{', '.join(missing).capitalize()} для {os.path.basename(pair['video'])}")
+    return outputs
+
+
+def create_backup_files(files):
+    for f in files:
+        try:
+            if os.path.exists(f):
+                backup_dir = os.path.join(os.path.dirname(f), "backup")
+                os.makedirs(backup_dir, exist_ok=True)
+                dest = os.path.join(backup_dir, os.path.basename(f))
+
+                if os.path.exists(dest):
+                    os.remove(dest)
+
+                shutil.move(f, backup_dir)
+                invalidate_media(f)
+                print(f"Файл перемещен в backup: {f} -> {dest}")
+            else:
+                print(f"Файл не существует: {f}")
+        except Exception as e:
+            print(f"Ошибка перемещения {f}: {str(e)}")
+
+
+def remove_source_files(files):
+    for f in files:
+        try:
+            if os.path.exists(f):
+                os.remove(f)
+                invalidate_media(f)
+                print(f"Файл удален: {f}")
+        except Exception as e:
+            print(f"Ошибка удаления {f}: {str(e)}")
+    # Remove backup folder if it exists
+    for f in files:
+        backup_dir = os.path.join(os.path.dirname(f), "backup")
+        if os.path.exists(backup_dir):
+            try:
+                shutil.rmtree(backup_dir)
+                print(f"Папка backup удалена: {backup_dir}")
+            except Exception as e:
+                print(f"Ошибка удаления папки backup {backup_dir}: {str(e)}")
+
+
+def remove_temp_outputs(file_pairs, file_status, settings=None):
+    """Удаляет недописанные временные файлы у незавершённых пар"""
+    for base, pair in file_pairs.items():
+        if pair['video'] and file_status.get(base) != 'done':
+            try:
+                outputs = job_outputs(pair, settings or MixSettings())
+            except Exception:
+                continue
+            for output in outputs:
+                if os.path.exists(output.temp_path):
+                    try:
+                        os.remove(output.temp_path)
+                    except Exception as e:
+                        print(f"Ошибка при удалении {output.temp_path}: {e}")
+
+
+def cleanup_temp_dirs(file_pairs):
+    """Удаляет папки temp рядом с видео после завершения пакета"""
+    for base, pair in file_pairs.items():
+        if not pair['video']:
+            continue
+        temp_dir = os.path.join(os.path.dirname(pair['video']), "temp")
+        if os.path.exists(temp_dir):
+            try:
+                shutil.rmtree(temp_dir)
+                print(f"Удалена временная папка: {temp_dir}")
+            except Exception as e:
+                print(f"Не удалось удалить временную папку {temp_dir}: {e}")
+
+
+class BatchEngine:
+    """Пакетная обработка пар без GUI.
+
+    on_status(base, status, progress=None) вызывается из потока пакета при
+    смене статуса пары, on_progress(processed, total) - после каждой пары.
+    on_job_progress(base, event) получает каждый ProgressEvent задания
+    (время, скорость, битрейт, размер). max_workers - число одновременных
+    заданий (слотов), threads - потоков ffmpeg на задание; по умолчанию оба
+    выводятся из доступных ядер. order - порядок запуска заданий
+    (scheduler.ORDER_POLICIES). Ресурсы заданий собираются в telemetry, а в
+    конце пакета в report_dir пишутся отчёты (None - не писать). Последние
+    log_lines строк stderr ffmpeg каждого задания хранятся в logs и пишутся в
+    log_dir при ошибке; verbose - печатать строки сразу и писать логи всех заданий.
+    """
+
+    def __init__(self, settings, on_status=None, on_progress=None, max_workers=None, threads=None,
+                 on_job_progress=None, journal=None, force=False, order=DEFAULT_ORDER,
+                 report_dir=None, log_dir=None, log_lines=DEFAULT_LOG_LINES, verbose=False):
+        self.settings = settings
+        self.order = order
+        self.report_dir = report_dir
+        self.log_dir = log_dir
+        self.log_lines = log_lines
+        self.verbose = verbose
+        self.logs = {}        # base -> joblog.JobLog
+        self.telemetry = {}   # base -> telemetry.JobTelemetry
+        self.report_path = None
+        # Журнал заданий (journal.JobJournal); по умолчанию общий журнал пользователя
+        self.journal = journal if journal is not None else get_default_journal()
+        # force - кодировать заново, даже если готовый результат совпадает
+        self.force = force
+        self.batch_id = None
+        self.resumed = 0
+        self.render_hits = 0
+        self.saved_seconds = 0.0
+        self.on_status = on_status
+        self.on_progress = on_progress
+        self.on_job_progress = on_job_progress
+        self.job_progress = {}
+        self.plan = plan_slots(max_workers, threads)
+        self.stop_event = threading.Event()
+        self.supervisor = None
+        self.lock = threading.Lock()
+        self.file_status = {}
+        self.processed = 0
+        self.total = 0
+
+    def set_status(self, base, status, progress=None):
+        self.file_status[base] = status
+        if self.on_status:
+            self.on_status(base, status, progress)
+
+    def runnable_pairs(self, file_pairs, file_status):
+        return [(base, pair) for base, pair in file_pairs.items()
+                if pair['video'] and file_status.get(base, 'pending') in RUNNABLE_STATUSES]
+
+    def run(self, file_pairs, file_status=None, cleanup=True):
+        """Обрабатывает пары и возвращает словарь итоговых статусов.
+        cleanup=False оставляет папки temp (их могут использовать другие процессы)"""
+        self.file_status = dict(file_status or {})
+        jobs = self.runnable_pairs(file_pairs, self.file_status)
+        # Семафор супервизора пускает задания в порядке списка
+        jobs, _ = order_jobs(jobs, self.order)
+        with self.lock:
+            self.telemetry = {}
+            self.logs = {}
+            self.total = len(jobs)
+            self.processed = 0
+            self.resumed = 0
+            self.render_hits = 0
+            self.saved_seconds = 0.0
+        if self.journal is not None:
+            self.batch_id = self.journal.new_batch()
+            queued = []
+            for base, pair in jobs:
+                try:
+                    outputs = job_outputs(pair, self.settings)
+                except Exception:
+                    # Ошибку покажет само задание
+                    continue
+                queued.extend((output.output_path, pair['video'], output.audio) for output in outputs)
+            self.journal.queue(self.batch_id, queued, self.settings)
+        self.supervisor = ProcessSupervisor(self.plan.slots)
+        if self.stop_event.is_set():
+            self.supervisor.stop()
+
+        print(f"Планировщик: {self.plan.describe()}, порядок: {self.order}")
+        started = time.perf_counter()
+        try:
+            self.supervisor.run([functools.partial(self.process_file, base, pair) for base, pair in jobs])
+        finally:
+            # Прерванный пакет тоже попадает в отчёт
+            self.write_report(time.perf_counter() - started)
+
+        if cleanup and not self.stop_event.is_set():
+            cleanup_temp_dirs(file_pairs)
+        return self.file_status
+
+    def write_report(self, wall_seconds):
+        """Отчёты JSON/CSV и файл Prometheus о пакете в report_dir"""
+        with self.lock:
+            records = list(self.telemetry.values())
+        if not self.report_dir or not records:
+            return
+        try:
+            self.report_path = telemetry.write_reports(records, wall_seconds, self.report_dir, self.batch_id)
+            print(f"Отчёт о пакете: {self.report_path}")
+        except OSError as e:
+            print(f"Не удалось записать отчёт о пакете: {e}")
+
+    def stop(self):
+        """Прерывает пакет и завершает запущенные ffmpeg (из любого потока)"""
+        self.stop_event.set()
+        if self.supervisor is not None:
+            self.supervisor.stop()
+
+    def handle_log_line(self, line, base):
+        # В stderr остаются только предупреждения и ошибки ffmpeg
+        self.logs[base].add(line)
+        if self.verbose:
+            print(f"[{base}] {line.strip()}")
+
+    def dump_log(self, base, failed):
+        """Пишет лог задания в log_dir; при ошибке показывает его последние строки"""
+        job_log = self.logs.get(base)
+        if job_log is None:
+            return None
+        if failed:
+            for line in job_log.tail():
+                print(f"[{base}] {line}")
+        path = job_log.dump(self.log_dir)
+        if path and failed:
+            print(f"[{base}] Лог ffmpeg: {path}")
+        return path
+
+    def handle_progress(self, event, base, duration):
+        self.job_progress[base] = event
+        if self.on_job_progress:
+            self.on_job_progress(base, event)
+        percent = event.percent(duration)
+        if percent is not None:
+            self.set_status(base, 'processing', progress=percent)
+
+    def build_command(self, pair, outputs):
+        """Команда для результатов задания; один результат собирается как раньше"""
+        track_info = pair_tracks(pair)
+        if len(outputs) > 1:
+            return build_multi_cmd(pair['video'], track_info, outputs, self.plan)
+        output = outputs[0]
+        if output.audio:
+            return build_external_cmd(pair['video'], output.audio, output.temp_path,
+                                      output.settings, track_info, self.plan, output.metadata(),
+                                      output.duck_commands)
+        return build_embedded_cmd(pair['video'], output.temp_path, track_info, output.settings,
+                                  self.plan, output.metadata(), output.duck_commands)
+
+    async def output_settings(self, base, pair, output):
+        """Настройки результата: с auto_gain громкости выводятся из громкости дорожек.
+
+        Не измеренные ранее дорожки измеряются здесь же, в слоте задания,
+        так что анализ идёт параллельно, как и кодирование. Громкости,
+        заданные вариантом результата явно, не меняются. None - пакет остановлен.
+        """
+        settings = output.settings
+        if not settings.auto_gain:
+            return settings
+        supervisor = self.supervisor
+        ffmpeg_path = find_tool("ffmpeg")
+        values = []
+        for path, stream, is_mono in loudness_sources(output.sources(pair['video']), settings, pair_tracks(pair)):
+            value = await supervisor.run_blocking(loudness.cached_loudness, path, stream)
+            if value is None:
+                # Сводка ebur128 - последние строки вывода
+                lines = deque(maxlen=DEFAULT_LOG_LINES)
+                job_log = self.logs.get(base)
+
+                def on_line(line):
+                    lines.append(line)
+                    if job_log is not None:
+                        job_log.add(line)
+
+                record = self.telemetry.get(base)
+                await supervisor.run_process(loudness.measure_cmd(ffmpeg_path, path, stream, is_mono),
+                                             on_line=on_line,
+                                             on_usage=record.add_process if record else None)
+                if self.stop_event.is_set():
+                    return None
+                value = loudness.parse_summary(lines)
+                if value is None:
+                    print(f"[{base}] Не удалось измерить громкость {os.path.basename(path)} ({stream})")
+                else:
+                    await supervisor.run_blocking(loudness.store_loudness, path, stream, value)
+            values.append(value)
+        orig_volume, new_volume = loudness.auto_volumes(values[0], values[1], settings)
+        if output.variant.orig_volume is not None:
+            orig_volume = output.variant.orig_volume
+        if output.variant.new_volume is not None:
+            new_volume = output.variant.new_volume
+        measured = ", ".join("?" if value is None else f"{value:.1f} LUFS" for value in values)
+        print(f"[{base}] громкость оригинала/перевода: {measured} -> {orig_volume:g}% / {new_volume:g}%")
+        return replace(settings, orig_volume=orig_volume, new_volume=new_volume)
+
+    def prepare_ducking(self, base, pair, output, number, duration, record=None):
+        """Файл команд ducking для результата (number - номер смеси в команде) или None"""
+        settings = output.settings
+        if not settings.ducking:
+            return None
+        if not ducking.numpy_available():
+            print(f"[{base}] Для ducking нужен NumPy, оригинал идёт с постоянной громкостью")
+            return None
+        lift_db = ducking.gap_lift_db(settings.orig_volume, settings.duck_db)
+        if not lift_db:
+            return None
+        # Речь ищется в дорожке перевода этого результата
+        path, stream, _ = loudness_sources(output.sources(pair['video']), settings, pair_tracks(pair))[1]
+        segments = ducking.speech_segments(find_tool("ffmpeg"), path, stream, self.stop_event,
+                                           record.add_process if record else None)
+        if segments is None:
+            return None
+        speech = sum(end - start for start, end in segments)
+        print(f"[{base}] речь перевода: {len(segments)} фрагментов, {min(1.0, speech / duration):.0%} времени; "
+              f"в паузах оригинал +{lift_db:.1f} дБ")
+        commands_path = output.duck_commands_path()
+        ducking.write_commands(commands_path, segments, duration, lift_db, number)
+        return commands_path
+
+    def encoder_name(self):
+        """Профиль и кодер, которыми кодируется смесь (с учётом замены недоступного)"""
+        profile = resolve_profile(self.settings.encoder_profile, find_tool("ffmpeg"))
+        return f"{profile.name} ({profile.encoder})"
+
+    def commit_output(self, temp_output_path, output_path):
+        """Атомарно переносит результат на место и отмечает задание выполненным"""
+        commit_file(temp_output_path, output_path)
+        if self.journal is not None:
+            self.journal.commit(output_path)
+
+    def finish_sources(self, pair, outputs=()):
+        """Исходники задания (видео и все внешние переводы результатов) - в backup или удалить"""
+        current_files = [pair['video']]
+        for audio in [pair['audio']] + [output.audio for output in outputs]:
+            if audio and audio not in current_files:
+                current_files.append(audio)
+        if self.settings.backup_files:
+            create_backup_files(current_files)
+        else:
+            remove_source_files(current_files)
+
+    def record_processed(self):
+        with self.lock:
+            self.processed += 1
+            processed, total = self.processed, self.total
+        if self.on_progress:
+            self.on_progress(processed, total)
+
+    def is_committed(self, pair, output):
+        if self.journal is None or self.force:
+            return False
+        return self.journal.is_committed(output.output_path, pair['video'], output.audio, output.requested)
+
+    def cached_render(self, pair, output):
+        """Секунды, сэкономленные готовым результатом с тем же отпечатком, или None"""
+        if self.force:
+            return None
+        saved = render_cache.lookup(output.output_path, output.fingerprint, find_tool("ffprobe"))
+        if saved is not None and self.journal is not None:
+            self.journal.start(output.output_path, pair['video'], output.audio, output.requested)
+            self.journal.commit(output.output_path)
+        return saved
+
+    def pending_outputs(self, pair, outputs):
+        """Результаты, которые нужно кодировать; готовые учитываются как пропущенные"""
+        pending = []
+        for output in outputs:
+            # Результат уже получен прошлым (прерванным) запуском
+            if self.is_committed(pair, output):
+                print(f"Уже готово, пропуск кодирования: {output.output_path}")
+                self.record_skip(render_cache.lookup(output.output_path), resumed=True)
+                continue
+            # Тот же результат мог получиться раньше из тех же входов с теми же параметрами
+            output.fingerprint = render_cache.job_fingerprint(output.sources(pair['video']), output.settings)
+            saved = self.cached_render(pair, output)
+            if saved is not None:
+                print(f"Результат не изменился, пропуск кодирования: {output.output_path}")
+                self.record_skip(saved, resumed=False)
+                continue
+            pending.append(output)
+        return pending
+
+    def record_skip(self, saved_seconds, resumed):
+        with self.lock:
+            if resumed:
+                self.resumed += 1
+            else:
+                self.render_hits += 1
+            self.saved_seconds += saved_seconds or 0.0
+
+    async def process_file(self, base, pair):
+        if self.stop_event.is_set():
+            return
+        supervisor = self.supervisor
+        journal = self.journal
+        pending = []
+        record = telemetry.JobTelemetry(base, pair['video'], started_at=time.time())
+        with self.lock:
+            self.telemetry[base] = record
+            self.logs[base] = JobLog(base, self.log_lines)
+        job_started = time.perf_counter()
+        failure = "остановлено"
+        try:
+            skipped = []
+            outputs = await supervisor.run_blocking(job_outputs, pair, self.settings, skipped)
+            for output_path, reason in skipped:
+                print(f"[{base}] {os.path.basename(output_path)} пропущен: {reason}")
+            record.skipped_outputs = [output_path for output_path, reason in skipped]
+            record.outputs = [output.output_path for output in outputs]
+            pending = await supervisor.run_blocking(self.pending_outputs, pair, outputs)
+            if not pending:
+                # Всё уже готово - доделываем только исходники
+                record.reused = True
+                await supervisor.run_blocking(self.finish_sources, pair, outputs)
+                self.set_status(base, 'done')
+                return
+
+            media = await supervisor.run_blocking(ensure_media, pair)
+            if media is None or not media.duration:
+                raise Exception("Не удалось получить длительность видео")
+            duration = media.duration
+            record.media_seconds = duration
+            record.encoder = await supervisor.run_blocking(self.encoder_name)
+            self.set_status(base, 'processing', progress=0.0)
+            for output in pending:
+                output.settings = await self.output_settings(base, pair, output)
+                if output.settings is None:
+                    self.set_status(base, 'stopped')
+                    return
+            for output in pending:
+                os.makedirs(os.path.dirname(output.temp_path), exist_ok=True)
+            for number, output in enumerate(pending):
+                output.duck_commands = await supervisor.run_blocking(
+                    self.prepare_ducking, base, pair, output, number, duration, record)
+                if self.stop_event.is_set():
+                    self.set_status(base, 'stopped')
+                    return
+
+            cmd = await supervisor.run_blocking(self.build_command, pair, pending)
+            parser = ProgressParser()
+
+            def on_progress_line(line):
+                event = parser.feed(line)
+                if event is not None:
+                    self.handle_progress(event, base, duration)
+
+            if journal is not None:
+                for output in pending:
+                    await supervisor.run_blocking(journal.start, output.output_path, pair['video'],
+                                                  output.audio, output.requested)
+            started = time.perf_counter()
+            returncode = await supervisor.run_process(
+                cmd, on_line=lambda line: self.handle_log_line(line, base),
+                on_stdout_line=on_progress_line, on_usage=record.add_process)
+            record.exit_code = returncode
+            # Один проход на все результаты - время делится между ними поровну
+            encode_seconds = (time.perf_counter() - started) / len(pending)
+
+            if self.stop_event.is_set():
+                self.set_status(base, 'stopped')
+                return
+            if returncode != 0:
+                raise Exception(f"FFmpeg ошибка (код {returncode})")
+
+            for output in pending:
+                await supervisor.run_blocking(self.commit_output, output.temp_path, output.output_path)
+                await supervisor.run_blocking(render_cache.record, output.output_path, output.fingerprint,
+                                              encode_seconds)
+            await supervisor.run_blocking(self.finish_sources, pair, outputs)
+            self.set_status(base, 'done')
+
+        except Exception as e:
+            print(f"Ошибка при обработке {pair['video']}: {str(e)}")
+            record.error = str(e)
+            failure = e
+            if not self.stop_event.is_set():
+                self.set_status(base, 'error')
+        finally:
+            status = self.file_status.get(base)
+            if journal is not None and status != 'done':
+                # На любом выходе без результата, в том числе при остановке и
+                # отмене задания, запись не должна остаться running. Уже
+                # записанные результаты fail() не трогает
+                for output in pending:
+                    journal.fail(output.output_path, failure)
+            for output in pending:
+                if output.duck_commands:
+                    try:
+                        os.remove(output.duck_commands)
+                    except OSError:
+                        pass
+            if status == 'error' or self.verbose:
+                record.log_path = await supervisor.run_blocking(self.dump_log, base, status == 'error')
+            record.finish(status if status in ('done', 'error') else 'stopped', time.perf_counter() - job_started)
+            self.record_processed()
@@ -0,0 +1,98 @@
+"""Последние строки лога ffmpeg каждого задания.
+
+Раньше каждая строка stderr всех параллельных ffmpeg печаталась в общую
+консоль: при нескольких заданиях строки перемешивались, а на длинных файлах
+с повторяющимися предупреждениями печать отнимала заметную долю процессора.
+Теперь у задания есть кольцевой буфер из последних строк (deque с maxlen),
+так что память и работа на строку не зависят от длины файла. Буфер
+записывается в файл <задание>-<время>.log только при ошибке задания (или
+всегда в подробном режиме), а в окне его можно открыть для выбранной строки.
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from probe_cache import user_cache_dir
+
+# Сколько последних строк лога хранить на задание
+DEFAULT_LOG_LINES = 200
+# Сколько файлов логов хранить в папке по умолчанию
+KEEP_LOGS = 200
+# Сколько последних строк показать в консоли при ошибке
+ERROR_TAIL_LINES = 5
+
+
+class JobLog:
+    """Кольцевой буфер строк одного задания (пишет поток цикла, читает GUI)"""
+
+    def __init__(self, base, max_lines=DEFAULT_LOG_LINES):
+        self.base = base
+        self.lines = deque(maxlen=max_lines)
+        self.dropped = 0        # строки, вытесненные из буфера
+        self.path = None        # файл, куда буфер был записан
+        self.lock = threading.Lock()
+
+    def add(self, line):
+        line = line.rstrip()
+        if not line:
+            return
+        with self.lock:
+            if len(self.lines) == self.lines.maxlen:
+                self.dropped += 1
+            self.lines.append(line)
+
+    def snapshot(self):
+        """(строки, сколько более ранних строк вытеснено)"""
+        with self.lock:
+            return list(self.lines), self.dropped
+
+    def tail(self, count=ERROR_TAIL_LINES):
+        with self.lock:
+            return list(self.lines)[-count:]
+
+    def text(self):
+        lines, dropped = self.snapshot()
+        header = [f"... пропущено более ранних строк: {dropped}"] if dropped else []
+        return "\n".join(header + lines)
+
+    def dump(self, log_dir):
+        """Пишет буфер в файл в log_dir и возвращает путь (None - писать нечего или не удалось)"""
+        text = self.text()
+        if not log_dir or not text:
+            return None
+        safe_base = re.sub(r'[^\w.\-]+', '_', self.base)[:100] or 'job'
+        path = os.path.join(log_dir, f"{safe_base}-{time.strftime('%Y%m%d-%H%M%S')}.log")
+        try:
+            os.makedirs(log_dir, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text + "\n")
+        except OSError as e:
+            print(f"Не удалось записать лог задания {self.base}: {e}")
+            return None
+        self.path = path
+        prune_logs(log_dir)
+        return path
+
+
+def default_log_dir():
+    """Папка логов: TRACKPACKER_LOG_DIR или logs в папке кэша; None - логи не пишутся"""
+    override = os.environ.get("TRACKPACKER_LOG_DIR")
+    if override is not None:
+        return override or None
+    return os.path.join(user_cache_dir(), "logs")
+
+
+def prune_logs(log_dir, keep=KEEP_LOGS):
+    """Удаляет старые логи, кроме последних keep"""
+    try:
+        entries = [entry for entry in os.scandir(log_dir) if entry.name.endswith('.log')]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+    except OSError:
+        return
+    for entry in entries[:-keep] if keep else entries:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
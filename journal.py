@@ -0,0 +1,208 @@
+"""Журнал заданий пакета для продолжения после сбоя.
+
+Каждое задание проходит состояния queued -> running -> committed (или
+failed). committed записывается только после атомарного переименования
+временного файла в итоговый, вместе с размерами и mtime входных файлов,
+параметрами склейки и размером результата. При повторном запуске задание,
+у которого всё это совпадает, не кодируется заново: доделывается только то,
+что не успело выполниться (перенос исходников в backup).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from probe_cache import file_key, user_cache_dir
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMMITTED = 'committed'
+FAILED = 'failed'
+
+
+def inputs_key(video, audio=None):
+    """Размер и mtime_ns входных файлов задания; None, если какого-то нет"""
+    key = []
+    for path in (video, audio):
+        if path is None:
+            continue
+        stat = file_key(path)
+        if stat is None:
+            return None
+        key.append([stat[1], stat[2]])
+    return json.dumps(key)
+
+
+def settings_key(settings):
+    """Параметры, влияющие на содержимое результата (без backup_files)"""
+    key = {
+        'orig_volume': settings.orig_volume,
+        'new_volume': settings.new_volume,
+        'invert_tracks': settings.invert_tracks,
+        'delete_original_track': settings.delete_original_track,
+        'target_track': settings.target_track,
+        'encoder_profile': settings.encoder_profile,
+    }
+    if settings.auto_gain:
+        # Громкости файла выводятся из его содержимого, от настроек зависят только цели
+        key['auto_gain'] = [settings.target_lufs, settings.ratio_db]
+    if settings.ducking:
+        # Кривая громкости выводится из самого перевода, от настроек зависит только подъём
+        key['ducking'] = settings.duck_db
+    return json.dumps(key, sort_keys=True)
+
+
+def commit_file(temp_path, final_path):
+    """Сбрасывает временный файл на диск и атомарно переименовывает в итоговый"""
+    with open(temp_path, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(temp_path, final_path)
+    if os.name != 'nt':
+        # Само переименование тоже должно пережить сбой питания
+        dir_fd = os.open(os.path.dirname(os.path.abspath(final_path)), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class JobJournal:
+    """SQLite-журнал заданий: одна строка на итоговый файл"""
+
+    def __init__(self, db_path=None):
+        if db_path is None:
+            cache_dir = user_cache_dir()
+            os.makedirs(cache_dir, exist_ok=True)
+            db_path = os.path.join(cache_dir, "jobs.sqlite3")
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # Журнал нужен именно после сбоя, поэтому без synchronous=NORMAL
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                output TEXT PRIMARY KEY,
+                batch TEXT NOT NULL,
+                video TEXT NOT NULL,
+                audio TEXT,
+                inputs TEXT,
+                settings TEXT NOT NULL,
+                state TEXT NOT NULL,
+                output_size INTEGER,
+                error TEXT,
+                updated REAL NOT NULL
+            )""")
+
+    def new_batch(self):
+        return uuid.uuid4().hex
+
+    def queue(self, batch, jobs, settings):
+        """jobs - список (output, video, audio). Уже выполненные записи не трогает"""
+        settings_json = settings_key(settings)
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN")
+            for output, video, audio in jobs:
+                self.conn.execute(
+                    "INSERT INTO jobs (output, batch, video, audio, inputs, settings, state, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(output) DO UPDATE SET batch=excluded.batch, state=excluded.state, "
+                    "updated=excluded.updated WHERE jobs.state != ?",
+                    (os.path.abspath(output), batch, video, audio, inputs_key(video, audio),
+                     settings_json, QUEUED, now, COMMITTED))
+            self.conn.execute("COMMIT")
+
+    def start(self, output, video, audio, settings):
+        """running: ffmpeg запущен. Входы запоминаются до того, как исходники уйдут в backup"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET state=?, video=?, audio=?, inputs=?, settings=?, output_size=NULL, "
+                "error=NULL, updated=? WHERE output=?",
+                (RUNNING, video, audio, inputs_key(video, audio), settings_key(settings),
+                 time.time(), os.path.abspath(output)))
+
+    def commit(self, output):
+        """committed: итоговый файл на месте (вызывать после commit_file)"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET state=?, output_size=?, updated=? WHERE output=?",
+                (COMMITTED, os.path.getsize(output), time.time(), os.path.abspath(output)))
+
+    def fail(self, output, error):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET state=?, error=?, updated=? WHERE output=? AND state != ?",
+                (FAILED, str(error), time.time(), os.path.abspath(output), COMMITTED))
+
+    def is_committed(self, output, video, audio, settings):
+        """Результат уже получен из этих же входов с этими же параметрами и не менялся"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT video, audio, inputs, settings, state, output_size FROM jobs WHERE output=?",
+                (os.path.abspath(output),)).fetchone()
+        if row is None:
+            return False
+        saved_video, saved_audio, saved_inputs, saved_settings, state, output_size = row
+        if state != COMMITTED or (saved_video, saved_audio) != (video, audio):
+            return False
+        if saved_settings != settings_key(settings) or saved_inputs != inputs_key(video, audio):
+            return False
+        try:
+            return os.path.getsize(output) == output_size
+        except OSError:
+            return False
+
+    def committed_outputs(self, paths):
+        """Какие из путей - результаты, записанные журналом (их не нужно склеивать снова)"""
+        found = set()
+        with self.lock:
+            for path in paths:
+                row = self.conn.execute("SELECT 1 FROM jobs WHERE output=? AND state=?",
+                                        (os.path.abspath(path), COMMITTED)).fetchone()
+                if row is not None:
+                    found.add(path)
+        return found
+
+    def states(self, batch=None):
+        """{состояние: число заданий} по всему журналу или одному пакету"""
+        with self.lock:
+            if batch is None:
+                rows = self.conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state")
+            else:
+                rows = self.conn.execute(
+                    "SELECT state, COUNT(*) FROM jobs WHERE batch=? GROUP BY state", (batch,))
+            return dict(rows.fetchall())
+
+    def forget(self, output):
+        with self.lock:
+            self.conn.execute("DELETE FROM jobs WHERE output=?", (os.path.abspath(output),))
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM jobs")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_default_journal = None
+_default_journal_lock = threading.Lock()
+
+
+def get_default_journal():
+    """Общий журнал процесса; None, если он отключён или недоступен"""
+    global _default_journal
+    if os.environ.get("TRACKPACKER_NO_JOURNAL"):
+        return None
+    with _default_journal_lock:
+        if _default_journal is None:
+            try:
+                _default_journal = JobJournal()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Журнал заданий недоступен: {e}")
+                _default_journal = False
+        return _default_journal or None
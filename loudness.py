@@ -0,0 +1,127 @@
+"""Анализ громкости дорожек (EBU R128) и автоматическая громкость смеси.
+
+Постоянные проценты orig_volume/new_volume дают разный результат на
+разных сериях: громкость исходников и студий озвучки сильно отличается.
+Здесь фильтр ebur128 ffmpeg измеряет интегральную громкость оригинала и
+перевода, а громкости для каждого файла выводятся из целевой громкости
+перевода и того, на сколько дБ оригинал должен быть тише.
+
+Измерение зависит только от файла и дорожки, поэтому хранится в кэше
+метаданных (ProbeCache, kind 'loudness:<дорожка>') и оплачивается один раз
+на файл, а не при каждой смене настроек.
+"""
+import math
+import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from probe_cache import get_default_cache
+
+DEFAULT_TARGET_LUFS = -23.0
+# Оригинал на 26 дБ тише перевода - как прежние 5% против 100%
+DEFAULT_RATIO_DB = 26.0
+
+# Ниже этого ebur128 считает дорожку тишиной (-70 LUFS - порог гейта)
+SILENCE_LUFS = -69.0
+MAX_VOLUME_PERCENT = 1000.0
+
+# amix делит сумму входов на их число, т.е. каждая дорожка в смеси тише на 6 дБ
+AMIX_COMPENSATION_DB = 20 * math.log10(2)
+
+INTEGRATED_RE = re.compile(r'^\s*I:\s*(-?\d+(?:\.\d+)?)\s*LUFS')
+
+
+def cache_kind(stream):
+    return f'loudness:{stream}'
+
+
+def cached_loudness(path, stream):
+    """Измеренная ранее громкость дорожки или None"""
+    cache = get_default_cache()
+    if cache is None:
+        return None
+    data = cache.get(path, kind=cache_kind(stream))
+    return data.get('integrated') if data else None
+
+
+def store_loudness(path, stream, integrated):
+    cache = get_default_cache()
+    if cache is not None:
+        cache.put(path, {'integrated': integrated}, kind=cache_kind(stream))
+
+
+def measure_cmd(ffmpeg_path, path, stream, is_mono=False):
+    """Команда ffmpeg, печатающая в stderr сводку ebur128 по дорожке.
+
+    Моно-дорожка в смеси раскладывается на оба канала, поэтому и
+    измеряется так же.
+    """
+    audio_filter = 'ebur128=framelog=quiet'
+    if is_mono:
+        audio_filter = 'pan=stereo|c0=c0|c1=c0,' + audio_filter
+    return [ffmpeg_path, '-hide_banner', '-nostats', '-i', path,
+            '-map', f'0:{stream}', '-vn', '-sn', '-dn', '-af', audio_filter, '-f', 'null', '-']
+
+
+def parse_summary(lines):
+    """Интегральная громкость из сводки ebur128 (LUFS) или None"""
+    in_summary = False
+    for line in lines:
+        if 'Summary:' in line:
+            in_summary = True
+            continue
+        if in_summary:
+            match = INTEGRATED_RE.match(line)
+            if match:
+                return float(match.group(1))
+    return None
+
+
+def measure_loudness(ffmpeg_path, path, stream, is_mono=False):
+    """Громкость дорожки из кэша или измеренная заново (блокирующий вызов)"""
+    integrated = cached_loudness(path, stream)
+    if integrated is not None:
+        return integrated
+    result = subprocess.run(measure_cmd(ffmpeg_path, path, stream, is_mono), capture_output=True)
+    integrated = parse_summary(result.stderr.decode('utf-8', errors='ignore').splitlines())
+    if integrated is None:
+        raise Exception(f"Не удалось измерить громкость {path} ({stream})")
+    store_loudness(path, stream, integrated)
+    return integrated
+
+
+def gain_percent(measured, target, fallback):
+    """Громкость в процентах, при которой дорожка звучит в смеси на target LUFS"""
+    if measured is None or measured <= SILENCE_LUFS:
+        return fallback
+    gain_db = target - measured + AMIX_COMPENSATION_DB
+    return min(MAX_VOLUME_PERCENT, 100 * 10 ** (gain_db / 20))
+
+
+def auto_volumes(orig_lufs, new_lufs, settings):
+    """(orig_volume, new_volume) в процентах для одного файла.
+
+    Перевод приводится к settings.target_lufs, оригинал - на
+    settings.ratio_db ниже. Для тихой (или не измеренной) дорожки остаётся
+    громкость из настроек.
+    """
+    new_volume = gain_percent(new_lufs, settings.target_lufs, settings.new_volume)
+    orig_volume = gain_percent(orig_lufs, settings.target_lufs - settings.ratio_db, settings.orig_volume)
+    return round(orig_volume, 2), round(new_volume, 2)
+
+
+def analyze(sources, ffmpeg_path, max_workers=4):
+    """Параллельно измеряет дорожки. sources - {ключ: [(путь, дорожка, моно), ...]};
+    возвращает {ключ: [LUFS или None, ...]}"""
+    def measure_all(items):
+        values = []
+        for path, stream, is_mono in items:
+            try:
+                values.append(measure_loudness(ffmpeg_path, path, stream, is_mono))
+            except Exception as e:
+                print(e)
+                values.append(None)
+        return values
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        return dict(zip(sources, pool.map(measure_all, sources.values())))
@@ -0,0 +1,420 @@
+"""Сопоставление видео и внешних аудиодорожек по имени.
+
+Вместо сравнения каждого аудио с каждым видео (difflib на всех парах)
+используется индекс: сначала точное совпадение нормализованного имени,
+затем нечёткое сравнение только с короткой выборкой кандидатов, у которых
+больше всего общих триграмм. Общие триграммы считаются от самых редких и с
+ограничением на число просмотренных номеров, поэтому работа на одно имя не
+растёт с размером библиотеки. Правила похожести те же, что в is_similar_name.
+"""
+import os
+import re
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+NAME_CACHE_SIZE = 65536
+
+# Сколько кандидатов с наибольшим числом общих триграмм проверять нечётко
+FUZZY_CANDIDATES = 64
+# Сколько номеров из списков триграмм просматривать на одно имя
+CANDIDATE_POSTINGS = 256
+
+
+TRACK_SUFFIX_RE = re.compile(r'_(rus|eng|audio|track)(?=\.[^.]+$)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def get_base_name(path):
+    name = os.path.basename(path)
+    name = TRACK_SUFFIX_RE.sub('', name)
+    name = re.sub(r'\([^)]*\)', '', name)
+    name = re.sub(r'_+', '_', name)
+    base, ext = os.path.splitext(name)
+    base = re.sub(r'\.+', '.', base)
+    name = base + ext
+    return os.path.splitext(name.lower())[0]
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def normalize_name(name):
+    """Улучшенная нормализация имени файла с обработкой числовых префиксов"""
+    # Удаляем расширение
+    name = os.path.splitext(name)[0].lower()
+
+    # Удаляем числовые префиксы в начале (1., 01, 09, etc.)
+    name = re.sub(r'^\d+[\.\s]*', '', name)
+
+    # Удаляем суффиксы языков и типов
+    name = re.sub(r'[_\-\s]*(rus|eng|audio|track|russian|english)(?=\s|$)', '', name, flags=re.IGNORECASE)
+
+    # Удаляем содержимое в скобках и квадратных скобках
+    name = re.sub(r'[\(\[\{].*?[\)\]\}]', '', name)
+
+    # Удаляем лишние пробелы и знаки препинания
+    name = re.sub(r'[^\w\s]', ' ', name)
+    name = re.sub(r'\s+', ' ', name).strip()
+
+    # Приводим к единому формату (только буквы и цифры)
+    normalized = re.sub(r'[^a-z0-9]', '', name)
+
+    return normalized
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def extract_core_name(name):
+    """Извлекает основное имя без префиксов и суффиксов"""
+    # Убираем числовые префиксы
+    clean = re.sub(r'^\d+[\.\s\-_]*', '', name.lower())
+    # Убираем языковые суффиксы
+    clean = re.sub(r'[_\-\s]*(rus|eng|audio|track).*$', '', clean, flags=re.IGNORECASE)
+    # Убираем расширение
+    clean = os.path.splitext(clean)[0]
+    # Нормализуем пробелы
+    clean = re.sub(r'\s+', ' ', clean.strip())
+    return clean
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def char_mask(text):
+    """Биты символов имени (символы с одинаковым битом оценку только ослабляют)"""
+    mask = 0
+    for char in set(text):
+        mask |= 1 << (ord(char) % 128)
+    return mask
+
+
+class AudioMatcher:
+    """Правила is_similar_name для одного аудио против многих видео.
+
+    SequenceMatcher строит индекс второй строки, поэтому имя аудио (вторая
+    строка, как в исходном сравнении) разбирается один раз, а для каждого
+    видео меняется только первая. Дешёвые верхние оценки (длины, состав
+    символов) отсекают заведомо непохожие имена до полного ratio().
+    """
+
+    def __init__(self, audio_base):
+        self.norm = normalize_name(audio_base)
+        self.core = extract_core_name(audio_base)
+        self.matchers = {}  # имя аудио -> SequenceMatcher, строится при первом полном сравнении
+
+    def ratio_at_least(self, a, b, threshold):
+        la, lb = len(a), len(b)
+        # Та же оценка, что real_quick_ratio(), без перестройки matcher
+        if 2.0 * min(la, lb) / (la + lb) < threshold:
+            return False
+        # Каждый символ одного имени, которого нет в другом, - минус одно
+        # совпадение: оценка грубее quick_ratio(), но без цикла по символам
+        mask_a, mask_b = char_mask(a), char_mask(b)
+        common = min(la - bin(mask_a & ~mask_b).count('1'), lb - bin(mask_b & ~mask_a).count('1'))
+        if 2.0 * common / (la + lb) < threshold:
+            return False
+        matcher = self.matchers.get(b)
+        if matcher is None:
+            matcher = self.matchers[b] = SequenceMatcher(None, '', b)
+        matcher.set_seq1(a)
+        return matcher.quick_ratio() >= threshold and matcher.ratio() >= threshold
+
+    def similar_to(self, video_base):
+        norm_video = normalize_name(video_base)
+        norm_audio = self.norm
+
+        # Метод 1: Прямое вхождение (оригинальный)
+        if norm_video and norm_audio:
+            if norm_video in norm_audio or norm_audio in norm_video:
+                return True
+
+        # Метод 2: Сравнение по коэффициенту подобия
+        if len(norm_video) > 3 and len(norm_audio) > 3:
+            if self.ratio_at_least(norm_video, norm_audio, 0.8):  # 80% схожесть
+                return True
+
+        # Метод 3: Альтернативная нормализация для цифровых префиксов
+        video_core = extract_core_name(video_base)
+        audio_core = self.core
+
+        if video_core and audio_core and len(video_core) > 3 and len(audio_core) > 3:
+            if self.ratio_at_least(video_core, audio_core, 0.85):  # 85% схожесть для основных имен
+                return True
+
+        return False
+
+
+def is_similar_name(video_base, audio_base):
+    """Улучшенная функция сравнения имен с несколькими методами"""
+    return AudioMatcher(audio_base).similar_to(video_base)
+
+
+def compact_name(core):
+    """Основное имя без пробелов и знаков: 'doctor_who_42' и 'doctor who 42' совпадают"""
+    return re.sub(r'[\W_]+', '', core)
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class PairingIndex:
+    """Индекс имён (base) в порядке добавления для поиска пары аудиофайлу"""
+
+    def __init__(self):
+        self.keys = []
+        self.norms = []
+        self.exact = defaultdict(list)       # нормализованное имя -> номера ключей
+        self.exact_core = defaultdict(list)  # основное имя -> номера ключей
+        self.compact = defaultdict(list)     # основное имя без знаков -> номера ключей
+        self.norm_grams = defaultdict(list)  # триграмма нормализованного имени -> номера по возрастанию
+        self.core_grams = defaultdict(list)  # триграмма основного имени -> номера по возрастанию
+        self.short = []                      # имена короче триграммы проверяются всегда
+
+    def add(self, base):
+        position = len(self.keys)
+        self.keys.append(base)
+        norm = normalize_name(base)
+        self.norms.append(norm)
+        core = extract_core_name(base)
+        self.exact[norm].append(position)
+        self.exact_core[core].append(position)
+        self.compact[compact_name(core)].append(position)
+        if 0 < len(norm) < 3:
+            self.short.append(position)
+        for gram in trigrams(norm):
+            self.norm_grams[gram].append(position)
+        for gram in trigrams(core):
+            self.core_grams[gram].append(position)
+
+    def candidates(self, audio_base):
+        """Номера ключей для нечёткой проверки: сначала с большим числом общих
+        триграмм, при равенстве - в порядке добавления.
+
+        Общие триграммы считаются от самых редких, пока не набрано
+        CANDIDATE_POSTINGS номеров: частые триграммы ('sho', 's01' в
+        библиотеке одного сериала) есть почти у всех ключей и кандидатов не
+        различают, а работа на одно имя не должна расти с размером библиотеки.
+        """
+        norm = normalize_name(audio_base)
+        found = set(self.short)
+        if 0 < len(norm) < 3:
+            # Короткое имя может входить подстрокой куда угодно - проверяем вхождение напрямую
+            found.update(position for position, key_norm in enumerate(self.norms) if norm in key_norm)
+        postings = [self.norm_grams[gram] for gram in trigrams(norm) if gram in self.norm_grams]
+        postings += [self.core_grams[gram] for gram in trigrams(extract_core_name(audio_base))
+                     if gram in self.core_grams]
+        postings.sort(key=len)
+        shared = Counter()
+        budget = CANDIDATE_POSTINGS
+        for posting in postings:
+            if len(posting) > budget:
+                if shared:
+                    break
+                # Все триграммы частые - берём самые ранние ключи, как полный перебор
+                posting = posting[:budget]
+            shared.update(posting)
+            budget -= len(posting)
+        ranked = sorted((-count, position) for position, count in shared.items())[:FUZZY_CANDIDATES]
+        if found:
+            found.difference_update(position for _, position in ranked)
+            ranked = sorted(ranked + [(-shared.get(position, 0), position) for position in found])
+        return [position for _, position in ranked]
+
+    def exact_positions(self, base):
+        """Номера ключей, совпадающих с base по нормализованному или основному имени"""
+        found = set(self.exact.get(normalize_name(base), ()))
+        core = extract_core_name(base)
+        if len(core) > 3:
+            found.update(self.exact_core.get(core, ()))
+            found.update(self.compact.get(compact_name(core), ()))
+        return found
+
+    def find(self, audio_base):
+        """Ключ, к которому относится аудио, или None.
+
+        Точное совпадение нормализованного имени важнее нечёткого: иначе
+        дорожка S01E02 могла уйти к видео S01E01 (сходство имён > 80%).
+        """
+        norm = normalize_name(audio_base)
+        if norm and norm in self.exact:
+            return self.keys[self.exact[norm][0]]
+        # Совпадение основного имени - то же, что сходство 100% по методу 3
+        core = extract_core_name(audio_base)
+        if len(core) > 3:
+            if core in self.exact_core:
+                return self.keys[self.exact_core[core][0]]
+            # Имена, отличающиеся только разделителями ('01. Show_Name' и
+            # '01. Show Name'), тоже считаем совпавшими: при числовом префиксе
+            # нормализованное имя пустое, а сходство по методу 3 ниже порога
+            compact = compact_name(core)
+            if compact in self.compact:
+                return self.keys[self.compact[compact][0]]
+        # Из похожих имён выбирается самое близкое: у S01E01 и S01E00 сходство
+        # тоже выше 80%, но с S01E01 у дорожки больше общих триграмм
+        matcher = AudioMatcher(audio_base)
+        for position in self.candidates(audio_base):
+            if matcher.similar_to(self.keys[position]):
+                return self.keys[position]
+        return None
+
+
+def exact_keys(name):
+    """Ключи точных стадий find(): нормализованное имя и основное имя без знаков"""
+    keys = []
+    norm = normalize_name(name)
+    if norm:
+        keys.append(('norm', norm))
+    core = extract_core_name(name)
+    if len(core) > 3:
+        keys.append(('core', compact_name(core)))
+    return keys
+
+
+def names_match(audio_base, base):
+    """То же, что find() в индексе из одного ключа base"""
+    if set(exact_keys(audio_base)) & set(exact_keys(base)):
+        return True
+    return AudioMatcher(audio_base).similar_to(base)
+
+
+def match_priority(audio_path, audio_base, matched):
+    """2 - имя совпало точно, 1 - у имени суффикс дорожки (_rus), 0 - только похоже"""
+    if audio_base == matched:
+        return 2
+    if TRACK_SUFFIX_RE.search(os.path.basename(audio_path)):
+        return 1
+    return 0
+
+
+class FilePairing:
+    """Пары, которые пополняются по одному файлу (режим наблюдения за папкой).
+
+    Аудио, пришедшее раньше своего видео, ждёт отдельной записью и
+    переходит к видео, когда оно появится, без пересборки всех пар. Если
+    оно успело попасть к другому видео только по похожести имени, его
+    забирает видео с тем же именем, как при сопоставлении всех файлов сразу.
+    """
+
+    def __init__(self):
+        self.pairs = {}
+        self.index = PairingIndex()
+        self.priorities = {}
+        self.aliases = {}   # ключ аудио без видео -> base видео, к которому оно перешло
+        self.orphans = set()  # ключи аудио, для которых видео пока нет
+        self.loose = {}       # точный ключ имени аудио -> пути аудио, попавших к видео по похожести
+        self.changed = set()  # изменённые и удалённые пары (вызывающий может забрать и очистить)
+        self.owners = {}      # путь аудио -> пара, в которой оно сейчас (вытесненное - ни в какой)
+
+    def add_video(self, video_path):
+        """Добавляет видео и возвращает base его пары"""
+        base = get_base_name(video_path)
+        pair = self.pairs.get(base)
+        if pair is None:
+            self.index.add(base)
+            self.pairs[base] = {'video': video_path, 'audio': None}
+            self._adopt_orphans(base)
+            self._reclaim_loose(base)
+        else:
+            pair['video'] = video_path
+            self.orphans.discard(base)
+        self.changed.add(base)
+        return base
+
+    def add_audio(self, audio_path):
+        """Добавляет аудио и возвращает base пары, в которую оно попало (None - не попало)"""
+        audio_base = get_base_name(audio_path)
+        matched = self.index.find(audio_base)
+        if matched is not None:
+            matched = self.aliases.get(matched, matched)
+            # Точное имя или суффикс _rus не вытесняются просто похожим
+            # именем (например, video_ukr.mp3 - дорожка для другого результата)
+            if not set(exact_keys(audio_base)) & set(exact_keys(matched)):
+                # Только похожее имя - видео с точным именем может прийти позже
+                for key in exact_keys(audio_base):
+                    self.loose.setdefault(key, []).append(audio_path)
+            priority = match_priority(audio_path, audio_base, matched)
+            if priority < self.priorities.get(matched, 0):
+                return None
+            self.priorities[matched] = priority
+            self._set_audio(matched, audio_path)
+            return matched
+        if audio_base not in self.pairs:
+            self.index.add(audio_base)
+        self.pairs[audio_base] = {'video': None, 'audio': None}
+        self._set_audio(audio_base, audio_path)
+        self.orphans.add(audio_base)
+        self.changed.add(audio_base)
+        return audio_base
+
+    def _adopt_orphans(self, base):
+        """Забирает к новому видео аудио, которое раньше пары не нашло.
+
+        Когда все видео добавляются раньше аудио (pair_files), сирот нет и
+        проверка ничего не стоит. Немногих сирот проверяем подряд, а при
+        большом их числе кандидаты берутся из индекса.
+        """
+        if not self.orphans:
+            return
+        if len(self.orphans) <= FUZZY_CANDIDATES:
+            orphans = [key for key in self.pairs if key in self.orphans and key != base]
+        else:
+            positions = self.index.exact_positions(base)
+            positions.update(self.index.candidates(base))
+            keys = self.index.keys
+            orphans = [keys[position] for position in sorted(positions)
+                       if keys[position] in self.orphans and keys[position] != base]
+        for key in orphans:
+            if not names_match(key, base):
+                continue
+            audio_path = self.pairs.pop(key)['audio']
+            self.orphans.discard(key)
+            self.changed.add(key)
+            self.aliases[key] = base
+            priority = match_priority(audio_path, key, base)
+            if priority >= self.priorities.get(base, 0):
+                self.priorities[base] = priority
+                self._set_audio(base, audio_path)
+            else:
+                self.owners.pop(audio_path, None)
+
+    def _reclaim_loose(self, base):
+        """Забирает к новому видео дорожки с его именем, ушедшие к другим видео по похожести"""
+        if not self.loose:
+            return
+        for key in exact_keys(base):
+            for audio_path in self.loose.pop(key, ()):
+                # Дорожку могли уже вытеснить из той пары - тогда она ничья
+                owner = self.owners.get(audio_path)
+                if owner == base:
+                    continue
+                priority = match_priority(audio_path, get_base_name(audio_path), base)
+                if priority < self.priorities.get(base, 0):
+                    continue
+                if owner in self.orphans:
+                    # Пара без видео без своей дорожки пуста - её ключ теперь ведёт сюда
+                    del self.pairs[owner]
+                    self.orphans.discard(owner)
+                    self.aliases[owner] = base
+                    self.priorities.pop(owner, None)
+                    self.changed.add(owner)
+                elif owner is not None:
+                    self.pairs[owner]['audio'] = None
+                    self.priorities.pop(owner, None)
+                    self.changed.add(owner)
+                self.priorities[base] = priority
+                self._set_audio(base, audio_path)
+
+    def _set_audio(self, base, audio_path):
+        pair = self.pairs[base]
+        if pair['audio'] is not None and pair['audio'] != audio_path:
+            self.owners.pop(pair['audio'], None)
+        pair['audio'] = audio_path
+        self.owners[audio_path] = base
+        self.changed.add(base)
+
+
+def pair_files(video_paths, audio_paths):
+    """{base: {'video': путь или None, 'audio': путь или None}}"""
+    pairing = FilePairing()
+    for video_path in video_paths:
+        pairing.add_video(video_path)
+    for audio_path in audio_paths:
+        pairing.add_audio(audio_path)
+    return pairing.pairs
@@ -0,0 +1,291 @@
+"""Предпрослушивание смеси с мгновенной сменой громкости.
+
+Раньше каждое нажатие "▶" запускало цепочку ffmpeg -> ffplay, которая
+заново декодировала 30 секунд обеих дорожек, а новые значения громкости
+были слышны только после перезапуска. Теперь окно каждой дорожки
+декодируется один раз в массив NumPy (кэш с LRU-ограничением по памяти), а
+громкость и смешивание применяются в процессе, пока звук по небольшим
+кускам отдаётся плееру. Изменение ползунка слышно через десятки миллисекунд.
+
+Слушать можно с любой позиции: окно декодируется от неё (-ss перед -i), а
+переход к другой позиции не перезапускает плеер.
+
+Без NumPy предпрослушивание работает по-старому (GUI проверяет
+numpy_available()).
+"""
+import collections
+import struct
+import subprocess
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from probe_cache import file_key
+
+SAMPLE_RATE = 48000
+CHANNELS = 2
+PREVIEW_SECONDS = 30
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+# Сначала декодируется короткое начало окна, чтобы звук пошёл сразу,
+# остальное окно догружается, пока оно играет
+HEAD_SECONDS = 3
+
+# Для уже прочитанных ffprobe файлов потоки известны - длинный анализ
+# входа не нужен
+FAST_PROBE_ARGS = ['-probesize', '262144', '-analyzeduration', '100000']
+
+# Кусок, который смешивается за раз, и насколько запись опережает реальное
+# время: чем меньше запас, тем быстрее слышна новая громкость
+CHUNK_SECONDS = 0.02
+LEAD_SECONDS = 0.06
+
+
+def numpy_available():
+    return np is not None
+
+
+def parse_position(text):
+    """'1:23:45', '12:30' или '90' -> секунды; ValueError, если не разобрать"""
+    seconds = 0.0
+    parts = text.strip().split(':')
+    if len(parts) > 3:
+        raise ValueError(text)
+    for part in parts:
+        seconds = seconds * 60 + float(part or 0)
+    if seconds < 0:
+        raise ValueError(text)
+    return seconds
+
+
+def format_position(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+def decode_pcm(ffmpeg_path, path, stream, start=0.0, duration=PREVIEW_SECONDS, fast_probe=False):
+    """Окно дорожки stream ('a:0' и т.п.) как float32-массив (кадры x 2 канала).
+
+    -ss стоит перед -i: ffmpeg переходит к позиции по индексу контейнера,
+    а не декодирует всё от начала файла.
+    """
+    cmd = [ffmpeg_path, '-v', 'error']
+    if fast_probe:
+        cmd += FAST_PROBE_ARGS
+    cmd += [
+        '-ss', str(start), '-i', path,
+        '-map', f'0:{stream}', '-t', str(duration),
+        '-f', 'f32le', '-ac', str(CHANNELS), '-ar', str(SAMPLE_RATE), '-',
+    ]
+    result = subprocess.run(cmd, capture_output=True, check=True)
+    return np.frombuffer(result.stdout, dtype=np.float32).reshape(-1, CHANNELS)
+
+
+class PcmCache:
+    """Декодированные окна дорожек; самые давно использованные вытесняются по объёму"""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.items = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def peek(self, path, stream, start=0.0, duration=PREVIEW_SECONDS):
+        """Окно, если оно уже декодировано, иначе None"""
+        key = (file_key(path), stream, round(start, 3), duration)
+        with self.lock:
+            pcm = self.items.get(key)
+            if pcm is not None:
+                self.items.move_to_end(key)
+            return pcm
+
+    def load(self, ffmpeg_path, path, stream, start=0.0, duration=PREVIEW_SECONDS, fast_probe=False):
+        """Окно из кэша, иначе декодирует его. Изменившийся файл декодируется заново"""
+        pcm = self.peek(path, stream, start, duration)
+        if pcm is not None:
+            return pcm
+        key = (file_key(path), stream, round(start, 3), duration)
+        pcm = decode_pcm(ffmpeg_path, path, stream, start, duration, fast_probe)
+        with self.lock:
+            if key not in self.items:
+                self.items[key] = pcm
+                self.total_bytes += pcm.nbytes
+            while self.total_bytes > self.max_bytes and len(self.items) > 1:
+                _, old = self.items.popitem(last=False)
+                self.total_bytes -= old.nbytes
+        return pcm
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.total_bytes = 0
+
+
+def mix_chunk(orig, new, orig_gain, new_gain):
+    """Как amix с двумя входами: сумма с весами, делённая на число входов"""
+    mixed = (orig * orig_gain + new * new_gain) * 0.5
+    np.clip(mixed, -1.0, 1.0, out=mixed)
+    return (mixed * 32767).astype('<i2').tobytes()
+
+
+def wav_header():
+    """Заголовок WAV для потока неизвестной длины (как у ffmpeg -f wav -)"""
+    block_align = CHANNELS * 2
+    return (b'RIFF' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE'
+            + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, CHANNELS, SAMPLE_RATE,
+                                    SAMPLE_RATE * block_align, block_align, 16)
+            + b'data' + struct.pack('<I', 0xFFFFFFFF))
+
+
+class PreviewPlayer:
+    """Отдаёт смесь двух PCM-массивов плееру (ffplay читает WAV из stdin).
+
+    Плеер запускается один раз и живёт между прослушиваниями: play() и
+    переход к другой позиции только подменяют источник, поэтому звук
+    начинается без запуска процесса и открытия аудиоустройства. Пока
+    источника нет, в плеер ничего не пишется.
+
+    set_gains() можно вызывать во время воспроизведения из любого потока:
+    новые громкости применяются к следующему куску.
+    """
+
+    def __init__(self, player_cmd):
+        self.player_cmd = player_cmd
+        self.gains = (1.0, 1.0)
+        self.process = None
+        self.thread = None
+        self.cond = threading.Condition()
+        # (orig, new, on_finished, partial) или None
+        self.source = None
+        self.generation = 0
+        self.position = 0
+
+    def set_gains(self, orig_gain, new_gain):
+        self.gains = (orig_gain, new_gain)
+
+    def is_playing(self):
+        return self.source is not None
+
+    def position_seconds(self):
+        return self.position / SAMPLE_RATE
+
+    def start(self):
+        """Запускает плеер заранее (повторный вызов ничего не делает)"""
+        with self.cond:
+            if self.process is not None and self.process.poll() is None:
+                return
+            self.process = subprocess.Popen(self.player_cmd, stdin=subprocess.PIPE,
+                                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            self.thread = threading.Thread(target=self._feed, args=(self.process,), daemon=True)
+            self.thread.start()
+
+    def play(self, orig, new, on_finished=None, partial=False):
+        """Играет смесь с начала массивов. partial=True - это только начало окна,
+        остальное придёт через extend(); до него плеер ждёт, а не завершает.
+        Возвращает номер воспроизведения для extend()."""
+        self.start()
+        with self.cond:
+            self.generation += 1
+            self.source = (orig, new, on_finished, partial)
+            self.cond.notify_all()
+            return self.generation
+
+    def extend(self, generation, orig, new):
+        """Подменяет массивы на более длинные с тем же началом, не сбивая позицию"""
+        with self.cond:
+            if generation != self.generation or self.source is None:
+                return
+            on_finished = self.source[2]
+            self.source = (orig, new, on_finished, False)
+            self.cond.notify_all()
+
+    def stop(self):
+        """Тишина; процесс плеера остаётся запущенным"""
+        with self.cond:
+            self.generation += 1
+            self.source = None
+            self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.generation += 1
+            self.source = None
+            process, self.process = self.process, None
+            thread, self.thread = self.thread, None
+            self.cond.notify_all()
+        if process is not None:
+            try:
+                process.terminate()
+                process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            except OSError:
+                pass
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=1)
+
+    def _next_chunk(self, process, state):
+        """Следующий кусок текущего источника; None - плеер закрыт.
+        state - [номер воспроизведения, время начала] потока записи."""
+        chunk = int(SAMPLE_RATE * CHUNK_SECONDS)
+        finished = None
+        with self.cond:
+            while True:
+                if self.process is not process:
+                    return None, None
+                if self.source is not None and state[0] != self.generation:
+                    state[0], state[1] = self.generation, time.monotonic()
+                    self.position = 0
+                if self.source is None:
+                    self.cond.wait()
+                    continue
+                orig, new, on_finished, partial = self.source
+                frames = min(len(orig), len(new))
+                if self.position < frames:
+                    break
+                if partial:
+                    self.cond.wait()
+                    continue
+                self.source = None
+                finished = on_finished
+                break
+        if finished is not None:
+            finished()
+            return self._next_chunk(process, state)
+        end = min(self.position + chunk, frames)
+        orig_gain, new_gain = self.gains
+        data = mix_chunk(orig[self.position:end], new[self.position:end], orig_gain, new_gain)
+        self.position = end
+        return data, end
+
+    def _feed(self, process):
+        state = [None, 0.0]
+        try:
+            process.stdin.write(wav_header())
+            process.stdin.flush()
+            while True:
+                data, end = self._next_chunk(process, state)
+                if data is None:
+                    break
+                process.stdin.write(data)
+                process.stdin.flush()
+                # Пишем не больше чем на LEAD_SECONDS вперёд реального времени;
+                # новый источник или остановка будят поток сразу
+                ahead = end / SAMPLE_RATE - (time.monotonic() - state[1])
+                if ahead > LEAD_SECONDS:
+                    generation = state[0]
+                    with self.cond:
+                        if self.generation == generation:
+                            self.cond.wait(ahead - LEAD_SECONDS)
+        except (OSError, ValueError):
+            # Плеер закрыли
+            pass
+        with self.cond:
+            if self.process is process:
+                self.process = None
+                self.source = None
@@ -0,0 +1,156 @@
+"""Чтение метаданных медиафайлов одним вызовом ffprobe.
+
+Раньше файл открывался несколько раз: ffmpeg -i с разбором текстового stderr
+для дорожек и отдельный ffprobe для длительности. Теперь один JSON-вызов
+возвращает MediaInfo, который переиспользуется всеми этапами.
+"""
+import json
+import os
+import subprocess
+from dataclasses import dataclass, asdict
+from typing import Optional, Tuple
+
+
+@dataclass(frozen=True)
+class AudioStream:
+    """Аудиодорожка внутри контейнера"""
+    track_index: int            # номер потока в контейнере (Stream #0:N)
+    audio_index: int            # номер среди аудиопотоков, для ссылок вида 0:a:N
+    codec: str = "unknown"
+    language: str = "und"
+    channels: int = 0
+    channel_layout: str = "unknown"
+    sample_rate: int = 0
+    bit_rate: int = 0
+    duration: Optional[float] = None
+    title: str = ""
+
+    @property
+    def is_mono(self):
+        return self.channels == 1 or self.channel_layout == 'mono'
+
+    @property
+    def full_info(self):
+        """Краткое описание дорожки для окна деталей и подсказок"""
+        parts = [self.codec, f"{self.sample_rate} Hz", self.channel_layout]
+        if self.bit_rate:
+            parts.append(f"{self.bit_rate // 1000} kb/s")
+        if self.title:
+            parts.append(self.title)
+        return f"Stream #0:{self.track_index}({self.language}): Audio: " + ", ".join(parts)
+
+
+@dataclass(frozen=True)
+class MediaInfo:
+    """Результат ffprobe для одного файла"""
+    path: str
+    size: int
+    duration: Optional[float]
+    format_name: str = ""
+    video_streams: int = 0
+    audio_streams: Tuple[AudioStream, ...] = ()
+
+    @property
+    def audio_count(self):
+        return len(self.audio_streams)
+
+
+def media_to_dict(media):
+    """MediaInfo -> словарь для JSON (кэш метаданных)"""
+    return asdict(media)
+
+
+def media_from_dict(data):
+    fields = dict(data)
+    fields['audio_streams'] = tuple(AudioStream(**s) for s in fields.get('audio_streams', ()))
+    return MediaInfo(**fields)
+
+
+def _to_int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_tag_duration(value):
+    """Длительность из тега MKV вида 00:42:13.120000000"""
+    try:
+        h, m, s = value.split(':')
+        return int(h) * 3600 + int(m) * 60 + float(s)
+    except (AttributeError, ValueError):
+        return None
+
+
+def parse_probe_json(path, data, size=0):
+    """Превращает вывод ffprobe -of json в MediaInfo"""
+    fmt = data.get('format', {})
+    audio_streams = []
+    video_streams = 0
+    for stream in data.get('streams', []):
+        codec_type = stream.get('codec_type')
+        if codec_type == 'video':
+            # Обложки (attached_pic) видеопотоком не считаем
+            if not stream.get('disposition', {}).get('attached_pic'):
+                video_streams += 1
+        elif codec_type == 'audio':
+            tags = stream.get('tags', {})
+            # В MKV теги бывают и в верхнем регистре
+            tags = {k.lower(): v for k, v in tags.items()}
+            channels = _to_int(stream.get('channels'))
+            audio_streams.append(AudioStream(
+                track_index=_to_int(stream.get('index'), -1),
+                audio_index=len(audio_streams),
+                codec=stream.get('codec_name', 'unknown'),
+                language=(tags.get('language') or 'und').lower(),
+                channels=channels,
+                channel_layout=stream.get('channel_layout') or ('mono' if channels == 1 else 'unknown'),
+                sample_rate=_to_int(stream.get('sample_rate')),
+                bit_rate=_to_int(stream.get('bit_rate')),
+                duration=_to_float(stream.get('duration')) or _parse_tag_duration(tags.get('duration')),
+                title=tags.get('title', ''),
+            ))
+
+    duration = _to_float(fmt.get('duration'))
+    if duration is None:
+        durations = [s.duration for s in audio_streams if s.duration]
+        duration = max(durations) if durations else None
+
+    return MediaInfo(
+        path=path,
+        size=size or _to_int(fmt.get('size')),
+        duration=duration,
+        format_name=fmt.get('format_name', ''),
+        video_streams=video_streams,
+        audio_streams=tuple(audio_streams),
+    )
+
+
+def run_ffprobe(path, ffprobe_path):
+    cmd = [
+        ffprobe_path,
+        '-v', 'error',
+        '-show_streams',
+        '-show_format',
+        '-of', 'json',
+        path
+    ]
+    result = subprocess.run(cmd, capture_output=True, check=True)
+    return json.loads(result.stdout.decode('utf-8', errors='ignore') or '{}')
+
+
+def probe_media(path, ffprobe_path):
+    """Один проход ffprobe: дорожки, длительность и формат. None при ошибке"""
+    try:
+        size = os.path.getsize(path)
+        return parse_probe_json(path, run_ffprobe(path, ffprobe_path), size)
+    except Exception as e:
+        print(f"Ошибка при чтении метаданных {path}: {e}")
+        return None
@@ -0,0 +1,169 @@
+"""Постоянный кэш метаданных файлов (SQLite в кэш-папке пользователя).
+
+Запись действительна, пока у файла не изменились размер и mtime_ns, поэтому
+повторное открытие знакомой библиотеки не запускает ffprobe. Объём кэша
+ограничен: при превышении лимита удаляются давно не использованные записи.
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Время последнего использования обновляем не чаще, чем раз в этот интервал,
+# чтобы чтение знакомой библиотеки не превращалось в тысячи записей
+TOUCH_INTERVAL = 3600
+
+
+def user_cache_dir():
+    """Папка кэша пользователя с учётом ОС (или TRACKPACKER_CACHE_DIR)"""
+    override = os.environ.get("TRACKPACKER_CACHE_DIR")
+    if override:
+        return override
+    if os.name == 'nt':
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser(r"~\AppData\Local")
+        return os.path.join(base, "Track-Packer", "cache")
+    if sys.platform == 'darwin':
+        return os.path.expanduser("~/Library/Caches/Track-Packer")
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "track-packer")
+
+
+def file_key(path):
+    """(абсолютный путь, размер, mtime_ns) или None, если файла нет"""
+    path = os.path.abspath(path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return path, st.st_size, st.st_mtime_ns
+
+
+class ProbeCache:
+    """Кэш JSON-записей по файлу. kind разделяет виды данных (probe и т.п.)"""
+
+    def __init__(self, db_path=None, max_bytes=DEFAULT_MAX_BYTES):
+        if db_path is None:
+            cache_dir = user_cache_dir()
+            os.makedirs(cache_dir, exist_ok=True)
+            db_path = os.path.join(cache_dir, "probe_cache.sqlite3")
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                kind TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                nbytes INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (kind, path)
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)")
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM entries").fetchone()[0]
+
+    def get(self, path, kind='probe'):
+        """Данные для файла или None, если записи нет или файл изменился"""
+        key = file_key(path)
+        if key is None:
+            return None
+        abs_path, size, mtime_ns = key
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT data, size, mtime_ns, last_used FROM entries WHERE kind=? AND path=?",
+                (kind, abs_path)).fetchone()
+            if row is None:
+                return None
+            data, cached_size, cached_mtime, last_used = row
+            if cached_size != size or cached_mtime != mtime_ns:
+                self._delete(kind, abs_path)
+                return None
+            if now - last_used > TOUCH_INTERVAL:
+                self.conn.execute("UPDATE entries SET last_used=? WHERE kind=? AND path=?",
+                                  (now, kind, abs_path))
+        return json.loads(data)
+
+    def put(self, path, data, kind='probe'):
+        key = file_key(path)
+        if key is None:
+            return
+        abs_path, size, mtime_ns = key
+        payload = json.dumps(data, ensure_ascii=False)
+        nbytes = len(payload)
+        with self.lock:
+            self._delete(kind, abs_path)
+            self.conn.execute(
+                "INSERT INTO entries (kind, path, size, mtime_ns, data, nbytes, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, abs_path, size, mtime_ns, payload, nbytes, time.time()))
+            self.total_bytes += nbytes
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def invalidate(self, path, kind=None):
+        """Удаляет записи файла (все виды, если kind не задан)"""
+        abs_path = os.path.abspath(path)
+        with self.lock:
+            if kind is None:
+                kinds = [row[0] for row in self.conn.execute(
+                    "SELECT kind FROM entries WHERE path=?", (abs_path,))]
+            else:
+                kinds = [kind]
+            for k in kinds:
+                self._delete(k, abs_path)
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM entries")
+            self.total_bytes = 0
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _delete(self, kind, abs_path):
+        row = self.conn.execute("SELECT nbytes FROM entries WHERE kind=? AND path=?",
+                                (kind, abs_path)).fetchone()
+        if row is not None:
+            self.conn.execute("DELETE FROM entries WHERE kind=? AND path=?", (kind, abs_path))
+            self.total_bytes -= row[0]
+
+    def _evict(self):
+        """Удаляет самые старые записи, пока кэш не станет меньше 90% лимита"""
+        target = int(self.max_bytes * 0.9)
+        rows = self.conn.execute("SELECT kind, path, nbytes FROM entries ORDER BY last_used")
+        victims = []
+        for kind, path, nbytes in rows:
+            if self.total_bytes <= target:
+                break
+            victims.append((kind, path))
+            self.total_bytes -= nbytes
+        self.conn.executemany("DELETE FROM entries WHERE kind=? AND path=?", victims)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """Общий кэш процесса; None, если кэш отключён или недоступен"""
+    global _default_cache
+    if os.environ.get("TRACKPACKER_NO_CACHE"):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = ProbeCache()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Кэш метаданных недоступен: {e}")
+                _default_cache = False
+        return _default_cache or None
@@ -0,0 +1,103 @@
+"""Фоновое чтение метаданных ограниченным пулом потоков.
+
+Пути ставятся в очередь с приоритетом (меньше - раньше), так что видимые и
+выбранные строки списка проверяются первыми. Результаты складываются в одну
+очередь results, которую GUI разбирает в главном потоке.
+"""
+import heapq
+import itertools
+import queue
+import threading
+
+DEFAULT_PROBE_WORKERS = 4
+
+
+class ProbePool:
+    def __init__(self, probe_func, max_workers=DEFAULT_PROBE_WORKERS):
+        self.probe_func = probe_func
+        self.max_workers = max(1, int(max_workers))
+        self.results = queue.Queue()
+        self.heap = []
+        self.queued = {}        # путь -> текущий приоритет
+        self.in_flight = set()
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.workers = []
+
+    def _start_workers(self):
+        # Потоки создаются лениво, при первой задаче
+        while len(self.workers) < self.max_workers:
+            worker = threading.Thread(target=self._worker, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, path, priority=100):
+        """Ставит путь в очередь; повторная постановка только повышает приоритет"""
+        with self.cond:
+            if self.closed or path in self.in_flight:
+                return
+            current = self.queued.get(path)
+            if current is not None and current <= priority:
+                return
+            self.queued[path] = priority
+            heapq.heappush(self.heap, (priority, next(self.counter), path))
+            self._start_workers()
+            self.cond.notify()
+
+    def prioritize(self, paths, priority=0):
+        """Поднимает уже поставленные в очередь пути (видимые/выбранные строки)"""
+        for path in paths:
+            with self.cond:
+                if path not in self.queued:
+                    continue
+            self.submit(path, priority)
+
+    def cancel(self, path):
+        with self.cond:
+            self.queued.pop(path, None)
+
+    def clear(self):
+        """Снимает все ожидающие задачи (уже запущенные доработают)"""
+        with self.cond:
+            self.queued.clear()
+            self.heap.clear()
+
+    def pending_count(self):
+        with self.cond:
+            return len(self.queued) + len(self.in_flight)
+
+    def shutdown(self):
+        with self.cond:
+            self.closed = True
+            self.queued.clear()
+            self.heap.clear()
+            self.cond.notify_all()
+
+    def _next_path(self):
+        with self.cond:
+            while True:
+                if self.closed:
+                    return None
+                while self.heap:
+                    priority, _, path = heapq.heappop(self.heap)
+                    # Устаревшие записи (отменённые или с прежним приоритетом) пропускаем
+                    if self.queued.get(path) == priority:
+                        del self.queued[path]
+                        self.in_flight.add(path)
+                        return path
+                self.cond.wait()
+
+    def _worker(self):
+        while True:
+            path = self._next_path()
+            if path is None:
+                return
+            try:
+                result = self.probe_func(path)
+            except Exception as e:
+                print(f"Ошибка при чтении метаданных {path}: {e}")
+                result = None
+            with self.cond:
+                self.in_flight.discard(path)
+            self.results.put((path, result))
@@ -0,0 +1,79 @@
+"""Прогресс ffmpeg через -progress вместо разбора текстового лога.
+
+ffmpeg с -progress pipe:1 пишет в stdout блоки строк key=value, каждый
+заканчивается строкой progress=continue или progress=end. Обычный лог при
+этом приглушается до предупреждений, так что разбирать регулярками каждую
+строку stderr больше не нужно.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+
+def progress_args():
+    """Глобальные параметры ffmpeg: прогресс в stdout, в stderr только предупреждения"""
+    return ['-loglevel', 'warning', '-nostats', '-progress', 'pipe:1']
+
+
+@dataclass(frozen=True)
+class ProgressEvent:
+    """Состояние задания по очередному блоку -progress"""
+    out_time: Optional[float] = None    # секунд записано в выходной файл
+    speed: Optional[float] = None       # во сколько раз быстрее реального времени
+    bitrate: Optional[float] = None     # кбит/с
+    total_size: Optional[int] = None    # байт записано
+    done: bool = False                  # progress=end
+
+    def percent(self, duration):
+        if not duration or self.out_time is None:
+            return None
+        return min(self.out_time / duration * 100, 100.0)
+
+    def describe(self):
+        parts = []
+        if self.speed is not None:
+            parts.append(f"{self.speed:.1f}x")
+        if self.bitrate is not None:
+            parts.append(f"{self.bitrate:.0f} кбит/с")
+        if self.total_size is not None:
+            parts.append(f"{self.total_size / (1024 * 1024):.1f} МБ")
+        return ", ".join(parts)
+
+
+def _number(value, suffix=''):
+    """'28.6x' -> 28.6, 'N/A' -> None"""
+    if suffix and value.endswith(suffix):
+        value = value[:-len(suffix)]
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class ProgressParser:
+    """Собирает строки key=value в ProgressEvent по одному на блок"""
+
+    def __init__(self):
+        self.fields = {}
+
+    def feed(self, line):
+        """Строка из -progress; возвращает событие, когда блок закончился"""
+        key, sep, value = line.partition('=')
+        if not sep:
+            return None
+        key, value = key.strip(), value.strip()
+        if key != 'progress':
+            self.fields[key] = value
+            return None
+
+        fields, self.fields = self.fields, {}
+        # out_time_ms на самом деле в микросекундах, как и out_time_us
+        out_us = fields.get('out_time_us') or fields.get('out_time_ms')
+        out_time = _number(out_us) if out_us else None
+        total_size = _number(fields.get('total_size', ''))
+        return ProgressEvent(
+            out_time=out_time / 1_000_000 if out_time is not None and out_time >= 0 else None,
+            speed=_number(fields.get('speed', ''), 'x'),
+            bitrate=_number(fields.get('bitrate', ''), 'kbits/s'),
+            total_size=int(total_size) if total_size is not None else None,
+            done=(value == 'end'),
+        )
@@ -0,0 +1,198 @@
+"""Кэш результатов склейки по отпечатку задания.
+
+Отпечаток задания - хэш от содержимого входов (размер и быстрый частичный
+хэш начала, середины и конца файла) и всех параметров, влияющих на
+результат. Он записывается в сам *_RUS.mkv тегом TRACKPACKER_FINGERPRINT и
+в индекс рядом с результатами (.trackpacker-renders.json) вместе со
+временем кодирования. Если итоговый файл уже есть и его отпечаток совпадает,
+задание не кодируется заново, а сэкономленное время попадает в отчёт.
+
+Индекс могут одновременно обновлять несколько процессов и машин (режим
+очереди на общем диске): запись идёт под блокировкой файла
+.trackpacker-renders.json.lock, индекс перечитывается под ней же и
+заменяется из временного файла с уникальным именем. Если файловая система
+блокировки не поддерживает, запись одного процесса может потеряться - тогда
+результат всё равно узнаётся по тегу в самом файле.
+"""
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+from journal import settings_key
+from probe_cache import get_default_cache
+
+FINGERPRINT_TAG = 'TRACKPACKER_FINGERPRINT'
+INDEX_NAME = '.trackpacker-renders.json'
+
+# Сколько байт читать из начала, середины и конца файла для частичного хэша
+SAMPLE_SIZE = 1024 * 1024
+
+_index_lock = threading.Lock()
+
+
+def partial_hash(path):
+    """Хэш размера и трёх фрагментов файла; кэшируется по (путь, размер, mtime)"""
+    cache = get_default_cache()
+    if cache is not None:
+        cached = cache.get(path, kind='partial_hash')
+        if cached is not None:
+            return cached
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, 'rb') as f:
+        for offset in sorted({0, max(0, size // 2 - SAMPLE_SIZE // 2), max(0, size - SAMPLE_SIZE)}):
+            f.seek(offset)
+            digest.update(f.read(SAMPLE_SIZE))
+    value = digest.hexdigest()
+    if cache is not None:
+        cache.put(path, value, kind='partial_hash')
+    return value
+
+
+def job_fingerprint(pair, settings):
+    """Отпечаток задания: входы по содержимому + параметры склейки"""
+    inputs = [partial_hash(pair['video'])]
+    if pair.get('audio'):
+        inputs.append(partial_hash(pair['audio']))
+    payload = json.dumps({'inputs': inputs, 'settings': settings_key(settings)}, sort_keys=True)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def _index_path(output_path):
+    return os.path.join(os.path.dirname(os.path.abspath(output_path)), INDEX_NAME)
+
+
+def _load_index(index_path):
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def recorded_outputs(paths):
+    """Какие из путей - результаты из индекса своей папки, не менявшиеся с записи"""
+    found = set()
+    indexes = {}
+    for path in paths:
+        index_path = _index_path(path)
+        if index_path not in indexes:
+            with _index_lock:
+                indexes[index_path] = _load_index(index_path)
+        entry = indexes[index_path].get(os.path.basename(path))
+        if not entry:
+            continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if entry.get('size') == st.st_size and entry.get('mtime_ns') == st.st_mtime_ns:
+            found.add(path)
+    return found
+
+
+def read_tag(output_path, ffprobe_path):
+    """Отпечаток из тега файла (если индекса нет, например файл скопировали)"""
+    cmd = [ffprobe_path, '-v', 'error', '-show_entries', f'format_tags={FINGERPRINT_TAG}',
+           '-of', 'json', output_path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, check=True)
+        tags = json.loads(result.stdout.decode('utf-8', errors='ignore') or '{}').get('format', {}).get('tags', {})
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        return None
+    tags = {k.upper(): v for k, v in tags.items()}
+    return tags.get(FINGERPRINT_TAG)
+
+
+def lookup(output_path, fingerprint=None, ffprobe_path=None):
+    """Сколько секунд кодирования экономит готовый результат, или None, если его нет.
+
+    Запись индекса действительна, пока размер и mtime файла те же; без неё
+    проверяется тег в самом файле (тогда время кодирования неизвестно - 0).
+    Без fingerprint отпечаток не сверяется (результат уже подтверждён журналом).
+    """
+    try:
+        st = os.stat(output_path)
+    except OSError:
+        return None
+    with _index_lock:
+        entry = _load_index(_index_path(output_path)).get(os.path.basename(output_path))
+    if entry and entry.get('size') == st.st_size and entry.get('mtime_ns') == st.st_mtime_ns:
+        if fingerprint is None or entry.get('fingerprint') == fingerprint:
+            return entry.get('encode_seconds', 0.0)
+        return None
+    if fingerprint and ffprobe_path and read_tag(output_path, ffprobe_path) == fingerprint:
+        record(output_path, fingerprint, 0.0)
+        return 0.0
+    return None
+
+
+@contextmanager
+def _locked(index_path):
+    """Блокировка индекса между потоками и процессами (файл .lock рядом с ним)"""
+    with _index_lock:
+        try:
+            lock_file = open(index_path + '.lock', 'a+b')
+        except OSError:
+            yield
+            return
+        locked = False
+        try:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                locked = True
+            except OSError:
+                # Сетевой диск без блокировок - остаётся только атомарная замена
+                pass
+            yield
+        finally:
+            if locked and fcntl is None:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            # flock снимается закрытием файла
+            lock_file.close()
+
+
+def record(output_path, fingerprint, encode_seconds):
+    """Записывает отпечаток готового файла в индекс его папки"""
+    st = os.stat(output_path)
+    index_path = _index_path(output_path)
+    with _locked(index_path):
+        # Перечитываем под блокировкой: другие процессы могли дописать свои файлы
+        index = _load_index(index_path)
+        index[os.path.basename(output_path)] = {
+            'fingerprint': fingerprint,
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'encode_seconds': round(encode_seconds, 3),
+        }
+        temp_path = None
+        try:
+            fd, temp_path = tempfile.mkstemp(prefix=INDEX_NAME + '.', suffix='.tmp',
+                                             dir=os.path.dirname(index_path))
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(index, f, ensure_ascii=False, indent=1)
+            # mkstemp создаёт файл только для владельца, а индекс читают и другие исполнители
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, index_path)
+        except OSError as e:
+            print(f"Не удалось обновить индекс результатов {index_path}: {e}")
+            if temp_path is not None:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
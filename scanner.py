@@ -0,0 +1,176 @@
+"""Быстрый поиск медиафайлов в перетащенных папках.
+
+Раньше collect_files обходил папки через os.walk и для каждого файла
+проверял `путь not in список`, т.е. добавление N файлов стоило O(N²), а
+одна и та же серия, попавшая через жёсткую или символическую ссылку,
+появлялась в списке дважды. Здесь папки читаются через os.scandir
+(тип записи и номер inode приходят из самого каталога, без stat на файл),
+уже добавленные пути и идентичности файлов (устройство + inode, если его
+нет - realpath) хранятся во множествах, а расширения проверяются по
+словарю. Служебные папки программы (temp, backup) пропускаются. На сетевых
+дисках верхние папки можно обходить параллельно (workers > 1), порядок
+результата от этого не меняется.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+VIDEO_EXTENSIONS = frozenset({'.flv', '.mp4', '.avi', '.mov', '.mkv', '.m4v'})
+AUDIO_EXTENSIONS = frozenset({'.mp3', '.wav', '.flac', '.aac'})
+EXTENSION_KINDS = {**{ext: 'video' for ext in VIDEO_EXTENSIONS},
+                   **{ext: 'audio' for ext in AUDIO_EXTENSIONS}}
+
+# Папки с собственными файлами программы (временные результаты и исходники после склейки)
+SKIP_DIRS = frozenset({'temp', 'backup'})
+
+
+def media_kind(path):
+    """'video', 'audio' или None"""
+    return EXTENSION_KINDS.get(os.path.splitext(path)[1].lower())
+
+
+def is_media(path):
+    return media_kind(path) is not None
+
+
+def path_identity(path):
+    """Ключ файла: (устройство, inode); для ФС без inode - нормализованный realpath"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        st = None
+    if st is not None and st.st_ino:
+        return st.st_dev, st.st_ino
+    return os.path.normcase(os.path.realpath(path))
+
+
+def entry_identity(entry, dev):
+    """path_identity для записи каталога на устройстве dev без лишнего stat"""
+    if entry.is_symlink():
+        return path_identity(entry.path)
+    inode = entry.inode()
+    if not inode:
+        return os.path.normcase(os.path.realpath(entry.path))
+    return dev, inode
+
+
+def scan_dir(directory):
+    """(медиафайлы папки [(путь, вид, ключ)], вложенные папки для обхода)"""
+    found = []
+    subdirs = []
+    try:
+        dev = os.stat(directory).st_dev
+        with os.scandir(directory) as entries:
+            entries = list(entries)
+    except FileNotFoundError:
+        # Папку удалили или переименовали во время обхода
+        return found, subdirs
+    except OSError as e:
+        print(f"Не удалось прочитать папку {directory}: {e}")
+        return found, subdirs
+    for entry in entries:
+        try:
+            if entry.is_dir():
+                # Как os.walk: в ссылки на папки не заходим
+                if not entry.is_symlink() and entry.name.lower() not in SKIP_DIRS:
+                    subdirs.append(entry.path)
+                continue
+            kind = media_kind(entry.name)
+            if kind is not None:
+                found.append((entry.path, kind, entry_identity(entry, dev)))
+        except OSError:
+            continue
+    return found, subdirs
+
+
+def scan_tree(top):
+    """Медиафайлы дерева top в том же порядке, что и у os.walk сверху вниз"""
+    found = []
+    stack = [top]
+    while stack:
+        files, subdirs = scan_dir(stack.pop())
+        found.extend(files)
+        stack.extend(reversed(subdirs))
+    return found
+
+
+def scan_file(path):
+    kind = media_kind(path)
+    return [(path, kind, path_identity(path))] if kind is not None else []
+
+
+def scan_paths(paths, workers=1):
+    """[(путь, вид, ключ)] для файлов и содержимого папок paths.
+
+    При workers > 1 вложенные папки верхнего уровня обходятся параллельно.
+    """
+    roots = []
+    seen_roots = set()
+    for path in paths:
+        if os.path.isdir(path):
+            real = os.path.normcase(os.path.realpath(path))
+            if real in seen_roots:
+                continue
+            seen_roots.add(real)
+        roots.append(path)
+
+    if workers <= 1:
+        found = []
+        for path in roots:
+            if os.path.isdir(path):
+                found.extend(scan_tree(path))
+            else:
+                found.extend(scan_file(path))
+        return found
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        parts = []
+        for path in roots:
+            if not os.path.isdir(path):
+                parts.append(scan_file(path))
+                continue
+            files, subdirs = scan_dir(path)
+            parts.append(files)
+            parts.extend(pool.submit(scan_tree, subdir) for subdir in subdirs)
+        return [item for part in parts for item in (part if isinstance(part, list) else part.result())]
+
+
+class MediaFiles(dict):
+    """{'video': [...], 'audio': [...]} с множествами для проверки повторов.
+
+    Списки остаются в порядке добавления (от него зависит сопоставление
+    пар); удалять файлы нужно через discard(), чтобы их можно было
+    добавить снова.
+    """
+
+    def __init__(self, video=(), audio=()):
+        super().__init__(video=[], audio=[])
+        self.paths = {}        # путь -> ключ файла
+        self.identities = {}   # ключ файла -> путь
+        for path in video:
+            self.add(path, 'video', path_identity(path))
+        for path in audio:
+            self.add(path, 'audio', path_identity(path))
+
+    def add(self, path, kind, identity):
+        """False, если этот файл (под любым именем) уже есть"""
+        if path in self.paths or identity in self.identities:
+            return False
+        self.paths[path] = identity
+        self.identities[identity] = path
+        self[kind].append(path)
+        return True
+
+    def discard(self, path):
+        identity = self.paths.pop(path, None)
+        if identity is None:
+            return
+        self.identities.pop(identity, None)
+        for files in self.values():
+            if path in files:
+                files.remove(path)
+
+    def clear(self):
+        self['video'].clear()
+        self['audio'].clear()
+        self.paths.clear()
+        self.identities.clear()
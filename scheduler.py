@@ -0,0 +1,129 @@
+"""Распределение ядер между одновременными заданиями ffmpeg.
+
+Раньше пакет запускался в ThreadPoolExecutor() без ограничения (cpu_count+4
+потоков), и каждый ffmpeg сам выбирал число потоков - на многоядерных
+машинах это давало переподписку и пробуксовку. Теперь число заданий
+(слотов) задаётся явно, а доступные процессу ядра делятся между слотами и
+передаются ffmpeg через -threads и -filter_threads.
+
+Порядок запуска тоже важен: задания шли в порядке file_pairs, и двухчасовой
+фильм, попавший в конец пакета, досчитывался, пока остальные слоты стояли.
+Теперь задания упорядочиваются по оценке длительности (order_indexes):
+сначала самые длинные (LPT, наименьшее время всего пакета), сначала короткие
+(первые результаты раньше) или как в списке; закреплённые пользователем
+задания идут первыми при любом порядке. simulate_makespan предсказывает
+время пакета для каждого порядка.
+"""
+import heapq
+import os
+from dataclasses import dataclass
+
+# Видео копируется, кодируется только звук: ffmpeg одного задания редко
+# загружает больше двух ядер (декодирование + фильтры/кодер)
+DEFAULT_THREADS_PER_JOB = 2
+
+# 'longest' - сначала длинные (LPT), 'shortest' - сначала короткие, 'input' - как в списке
+ORDER_POLICIES = ('longest', 'shortest', 'input')
+DEFAULT_ORDER = 'longest'
+
+# Оценка длительности по размеру файла, пока ни одна длительность не известна (~8 Мбит/с)
+DEFAULT_BYTES_PER_SECOND = 1_000_000
+
+
+def available_cpus():
+    """Число ядер, на которых процессу разрешено работать (с учётом affinity)"""
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except (AttributeError, OSError):
+        # Windows и macOS: sched_getaffinity нет
+        return max(1, os.cpu_count() or 1)
+
+
+@dataclass(frozen=True)
+class SlotPlan:
+    """Сколько заданий запускать одновременно и сколько потоков у каждого"""
+    slots: int
+    threads: int
+    filter_threads: int
+    cpus: int
+
+    def input_args(self):
+        """Глобальные параметры ffmpeg (ставятся до -i)"""
+        return ['-filter_threads', str(self.filter_threads)]
+
+    def output_args(self):
+        """Параметры кодера для выходного файла"""
+        return ['-threads', str(self.threads)]
+
+    def describe(self):
+        return (f"{self.slots} заданий x {self.threads} потоков ffmpeg "
+                f"(ядер доступно: {self.cpus})")
+
+
+def plan_slots(job_slots=None, threads=None, cpus=None):
+    """Делит ядра между слотами.
+
+    job_slots - число одновременных заданий (None или 0 - автоматически),
+    threads - потоков на задание (None или 0 - поровну из доступных ядер).
+    """
+    cpus = cpus or available_cpus()
+    if not job_slots or job_slots < 1:
+        if threads and threads > 0:
+            job_slots = max(1, cpus // threads)
+        else:
+            job_slots = max(1, cpus // DEFAULT_THREADS_PER_JOB)
+    if not threads or threads < 1:
+        threads = max(1, cpus // job_slots)
+    return SlotPlan(slots=job_slots, threads=threads, filter_threads=threads, cpus=cpus)
+
+
+def fill_costs(durations, sizes):
+    """Оценки длительности заданий в секундах.
+
+    Неизвестная длительность (None) выводится из размера файла по среднему
+    битрейту заданий, у которых известно и то и другое.
+    """
+    known = [(duration, size) for duration, size in zip(durations, sizes) if duration and size]
+    if known:
+        rate = sum(size for _, size in known) / sum(duration for duration, _ in known)
+    else:
+        rate = DEFAULT_BYTES_PER_SECOND
+    return [duration if duration else (size or 0) / rate for duration, size in zip(durations, sizes)]
+
+
+def order_indexes(costs, policy=DEFAULT_ORDER, priorities=None):
+    """Номера заданий в порядке запуска.
+
+    Задания с priority > 0 (закреплённые) идут первыми, большее значение -
+    раньше; остальные - по policy. Равные задания сохраняют исходный порядок.
+    """
+    if policy not in ORDER_POLICIES:
+        raise ValueError(f"Неизвестный порядок заданий: {policy}")
+    priorities = priorities or [0] * len(costs)
+    if policy == 'longest':
+        def key(index):
+            return -priorities[index], -costs[index], index
+    elif policy == 'shortest':
+        def key(index):
+            return -priorities[index], costs[index], index
+    else:
+        def key(index):
+            return -priorities[index], index
+    return sorted(range(len(costs)), key=key)
+
+
+def simulate_makespan(costs, slots):
+    """Время всего пакета, если задания в этом порядке занимают первый освободившийся слот"""
+    finish_times = [0.0] * max(1, slots)
+    for cost in costs:
+        start = heapq.heappop(finish_times)
+        heapq.heappush(finish_times, start + cost)
+    return max(finish_times)
+
+
+def compare_policies(costs, slots, priorities=None):
+    """{порядок: предсказанное время пакета} и нижняя граница для любого порядка"""
+    predicted = {policy: simulate_makespan([costs[index] for index in order_indexes(costs, policy, priorities)], slots)
+                 for policy in ORDER_POLICIES}
+    lower_bound = max(max(costs, default=0.0), sum(costs) / max(1, slots))
+    return predicted, lower_bound
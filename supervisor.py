@@ -0,0 +1,315 @@
+"""Управление процессами ffmpeg из одного цикла asyncio.
+
+Раньше на каждое задание приходились поток пула, цикл poll() с паузой
+0.1 с и отдельный поток чтения лога. Теперь все дочерние процессы живут в
+одном цикле событий: каналы читаются без блокировки, о завершении процесса
+цикл узнаёт сразу, а число одновременно запущенных процессов ограничено
+семафором. Блокирующие шаги (ffprobe, перенос файлов) уходят в небольшой
+пул потоков цикла.
+"""
+import asyncio
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from telemetry import ProcessUsage, read_proc_io, usage_from_rusage
+
+# Строки прогресса ffmpeg разделяются '\r', остальные - '\n'
+LINE_BREAK = re.compile(rb'[\r\n]+')
+READ_CHUNK = 65536
+
+# Сколько ждать после terminate(), прежде чем убить процесс
+KILL_TIMEOUT = 1.0
+
+
+def install_child_watcher(loop):
+    """На Linux с Python 3.11 ждём завершения детей через pidfd.
+
+    Стандартный ThreadedChildWatcher заводит по потоку на каждый процесс.
+    Начиная с 3.12 pidfd используется по умолчанию. Цикл привязывается явно:
+    пакет из GUI работает не в главном потоке. Возвращает watcher или None.
+    """
+    if sys.version_info >= (3, 12) or os.name == 'nt' or not hasattr(os, 'pidfd_open'):
+        return None
+    watcher = asyncio.PidfdChildWatcher()
+    asyncio.set_child_watcher(watcher)
+    watcher.attach_loop(loop)
+    return watcher
+
+
+async def iter_lines(stream):
+    """Строки из канала процесса (bytes), с разбиением и по '\\r'"""
+    pending = b''
+    while True:
+        chunk = await stream.read(READ_CHUNK)
+        if not chunk:
+            break
+        parts = LINE_BREAK.split(pending + chunk)
+        pending = parts.pop()
+        for part in parts:
+            if part:
+                yield part.decode('utf-8', errors='ignore')
+    if pending:
+        yield pending.decode('utf-8', errors='ignore')
+
+
+class MeasuredProcess:
+    """Дочерний процесс, которого цикл ждёт сам через os.wait4.
+
+    asyncio снимает завершившийся процесс через waitpid, и его rusage
+    теряется; здесь завершение отслеживается по pidfd (или wait4 в пуле
+    потоков), а счётчики ввода-вывода читаются, пока процесс ещё зомби.
+    Интерфейс - тот же, что у asyncio.subprocess.Process, в объёме,
+    нужном супервизору.
+    """
+
+    def __init__(self, popen):
+        self.popen = popen
+        self.pid = popen.pid
+        self.returncode = None
+        self.usage = None
+        self.started = time.perf_counter()
+        self.waiter = asyncio.ensure_future(self._reap())
+
+    async def _reap(self):
+        loop = asyncio.get_running_loop()
+        io = None
+        if hasattr(os, 'pidfd_open'):
+            pidfd = os.pidfd_open(self.pid)
+            exited = loop.create_future()
+            loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+            try:
+                await exited
+            finally:
+                loop.remove_reader(pidfd)
+                os.close(pidfd)
+            io = read_proc_io(self.pid)
+            _, status, rusage = os.wait4(self.pid, 0)
+        else:
+            _, status, rusage = await loop.run_in_executor(None, os.wait4, self.pid, 0)
+        self.returncode = os.waitstatus_to_exitcode(status)
+        # Popen не должен ждать уже снятый процесс
+        self.popen.returncode = self.returncode
+        self.usage = usage_from_rusage(time.perf_counter() - self.started, rusage, io)
+        return self.returncode
+
+    def _signal(self, signum):
+        if self.returncode is not None:
+            raise ProcessLookupError(self.pid)
+        os.kill(self.pid, signum)
+
+    def terminate(self):
+        self._signal(signal.SIGTERM)
+
+    def kill(self):
+        self._signal(signal.SIGKILL)
+
+    async def wait(self):
+        return await asyncio.shield(self.waiter)
+
+
+async def connect_pipe(pipe):
+    """asyncio.StreamReader для канала Popen"""
+    reader = asyncio.StreamReader()
+    transport, _ = await asyncio.get_running_loop().connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), pipe)
+    return reader, transport
+
+
+class ProcessSupervisor:
+    """Запускает задания-корутины и владеет их дочерними процессами.
+
+    run() блокирует вызывающий поток до завершения всех заданий; stop()
+    можно вызывать из любого потока.
+    """
+
+    def __init__(self, max_running):
+        self.max_running = max(1, int(max_running))
+        self.loop = None
+        self.thread = None
+        self.semaphore = None
+        self.lock = threading.Lock()
+        self.processes = set()
+        self.stopping = False
+        self.started = 0
+        self.finished = 0
+
+    def run(self, jobs):
+        """jobs - список функций без аргументов, возвращающих корутину"""
+        asyncio.run(self._main(jobs))
+
+    async def _main(self, jobs):
+        with self.lock:
+            self.loop = asyncio.get_running_loop()
+            self.thread = threading.current_thread()
+        watcher = install_child_watcher(self.loop)
+        self.semaphore = asyncio.Semaphore(self.max_running)
+        tasks = [asyncio.ensure_future(self._guarded(job)) for job in jobs]
+        try:
+            if tasks:
+                await asyncio.wait(tasks)
+            # Непредвиденные ошибки заданий не теряем, как и прежний future.result()
+            for task in tasks:
+                task.result()
+        except asyncio.CancelledError:
+            # Ctrl+C: gather завершился бы при первой отмене, не дожидаясь,
+            # пока задания остановят свои процессы
+            for task in tasks:
+                task.cancel()
+            await asyncio.wait(tasks)
+            raise
+        finally:
+            # Процессы, которые задания не успели дождаться, не оставляем сиротами
+            with self.lock:
+                leftovers = list(self.processes)
+            for process in leftovers:
+                self._kill(process)
+            if watcher is not None:
+                watcher.attach_loop(None)
+            with self.lock:
+                self.loop = None
+
+    async def _guarded(self, job):
+        async with self.semaphore:
+            if self.stopping:
+                return
+            with self.lock:
+                self.started += 1
+            try:
+                await job()
+            finally:
+                with self.lock:
+                    self.finished += 1
+
+    async def run_blocking(self, func, *args):
+        """Выполняет блокирующую функцию в пуле потоков цикла"""
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def run_process(self, cmd, on_line=None, on_stdout_line=None, on_usage=None):
+        """Запускает процесс и возвращает код выхода.
+
+        Строки stderr передаются в on_line, строки stdout - в on_stdout_line
+        (канал -progress). on_usage(telemetry.ProcessUsage) получает ресурсы,
+        которые потратил процесс. Если задание отменено, процесс завершается.
+        """
+        if on_usage is not None and hasattr(os, 'wait4'):
+            return await self._run_measured(cmd, on_line, on_stdout_line, on_usage)
+        started = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE if on_stdout_line is not None else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        with self.lock:
+            self.processes.add(process)
+        try:
+            readers = [self._read_lines(process.stderr, on_line)]
+            if on_stdout_line is not None:
+                readers.append(self._read_lines(process.stdout, on_stdout_line))
+            await asyncio.gather(*readers)
+            returncode = await process.wait()
+            if on_usage is not None:
+                on_usage(ProcessUsage(wall_seconds=time.perf_counter() - started))
+            return returncode
+        except asyncio.CancelledError:
+            self._terminate(process)
+            await process.wait()
+            raise
+        finally:
+            with self.lock:
+                self.processes.discard(process)
+
+    async def _run_measured(self, cmd, on_line, on_stdout_line, on_usage):
+        popen = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE if on_stdout_line is not None else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        process = MeasuredProcess(popen)
+        with self.lock:
+            self.processes.add(process)
+        transports = []
+        try:
+            pipes = [(popen.stderr, on_line)]
+            if on_stdout_line is not None:
+                pipes.append((popen.stdout, on_stdout_line))
+            readers = []
+            for pipe, callback in pipes:
+                reader, transport = await connect_pipe(pipe)
+                transports.append(transport)
+                readers.append(self._read_lines(reader, callback))
+            await asyncio.gather(*readers)
+            returncode = await process.wait()
+            on_usage(process.usage)
+            return returncode
+        except asyncio.CancelledError:
+            self._terminate(process)
+            await process.wait()
+            raise
+        finally:
+            for transport in transports:
+                transport.close()
+            with self.lock:
+                self.processes.discard(process)
+
+    @staticmethod
+    async def _read_lines(stream, callback):
+        async for line in iter_lines(stream):
+            if callback is not None:
+                callback(line)
+
+    def running_count(self):
+        with self.lock:
+            return len(self.processes)
+
+    def stop(self, timeout=KILL_TIMEOUT + 1):
+        """Не запускать новые задания и завершить работающие процессы.
+
+        Из другого потока ждёт до timeout секунд, пока процессы выйдут, чтобы
+        после stop() можно было сразу удалять их временные файлы.
+        """
+        with self.lock:
+            self.stopping = True
+            loop = self.loop
+        if loop is None:
+            return
+        try:
+            future = asyncio.run_coroutine_threadsafe(self._terminate_all(), loop)
+        except RuntimeError:
+            # Цикл уже закрылся
+            return
+        if timeout and threading.current_thread() is not self.thread:
+            try:
+                future.result(timeout)
+            except Exception:
+                pass
+
+    async def _terminate_all(self):
+        with self.lock:
+            processes = list(self.processes)
+        for process in processes:
+            self._terminate(process)
+        await asyncio.gather(*(process.wait() for process in processes), return_exceptions=True)
+
+    @staticmethod
+    def _terminate(process):
+        if process.returncode is None:
+            try:
+                process.terminate()
+            except ProcessLookupError:
+                return
+            asyncio.get_running_loop().call_later(KILL_TIMEOUT, ProcessSupervisor._kill, process)
+
+    @staticmethod
+    def _kill(process):
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
@@ -0,0 +1,268 @@
+"""Ресурсы каждого задания и отчёты о пакете.
+
+Раньше после пакета оставались только лог в консоли и статусы строк, по
+которым нельзя ни подобрать железо, ни заметить, что после обновления
+ffmpeg кодирование стало медленнее. Теперь для каждого задания
+записываются время, процессорное время (user/sys) и пиковая память
+дочерних ffmpeg (rusage из os.wait4), прочитанные и записанные байты
+(/proc/<pid>/io), скорость относительно реального времени, кодер и код
+выхода. В конце пакета пишутся отчёты JSON и CSV и текстовый файл для
+Prometheus (node_exporter, коллектор textfile) с итогами пакета.
+
+Где os.wait4 нет (Windows), у процессов известно только время.
+"""
+import csv
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import asdict, dataclass, field, fields
+from typing import List, Optional
+
+from probe_cache import user_cache_dir
+
+# Сколько последних отчётов хранить в папке по умолчанию
+KEEP_REPORTS = 100
+PROMETHEUS_FILE = 'trackpacker.prom'
+# Исполнители очереди пишут каждый в свой файл: trackpacker-<имя>.prom
+WORKER_PROMETHEUS_PREFIX = 'trackpacker-'
+
+
+@dataclass
+class ProcessUsage:
+    """Что потратил один завершившийся процесс"""
+    wall_seconds: float
+    cpu_user: Optional[float] = None
+    cpu_system: Optional[float] = None
+    max_rss_bytes: Optional[int] = None
+    bytes_read: Optional[int] = None
+    bytes_written: Optional[int] = None
+
+
+def read_proc_io(pid):
+    """(прочитано, записано) байт процесса по /proc/<pid>/io или None.
+
+    Читать нужно до того, как процесс будет снят wait4 (пока он зомби).
+    """
+    try:
+        with open(f'/proc/{pid}/io') as f:
+            values = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(values['rchar']), int(values['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def usage_from_rusage(wall_seconds, rusage, io=None):
+    # На macOS ru_maxrss в байтах, на Linux - в килобайтах
+    rss_scale = 1 if sys.platform == 'darwin' else 1024
+    return ProcessUsage(
+        wall_seconds=wall_seconds,
+        cpu_user=rusage.ru_utime,
+        cpu_system=rusage.ru_stime,
+        max_rss_bytes=rusage.ru_maxrss * rss_scale,
+        bytes_read=io[0] if io else None,
+        bytes_written=io[1] if io else None,
+    )
+
+
+def _add(total, value):
+    if value is None:
+        return total
+    return (total or 0) + value
+
+
+@dataclass
+class JobTelemetry:
+    """Одно задание пакета (все его процессы ffmpeg вместе)"""
+    base: str
+    video: str
+    started_at: float = 0.0                 # time.time() начала
+    status: str = ''
+    exit_code: Optional[int] = None         # код выхода ffmpeg склейки
+    encoder: str = ''
+    outputs: List[str] = field(default_factory=list)
+    skipped_outputs: List[str] = field(default_factory=list)   # варианты без своей дорожки перевода
+    reused: bool = False                    # готовый результат взят без кодирования
+    wall_seconds: float = 0.0               # всё задание, включая анализ и перенос файлов
+    encode_seconds: float = 0.0             # процессы ffmpeg
+    cpu_user: Optional[float] = None
+    cpu_system: Optional[float] = None
+    max_rss_bytes: Optional[int] = None
+    bytes_read: Optional[int] = None
+    bytes_written: Optional[int] = None
+    media_seconds: Optional[float] = None   # длительность видео
+    speed: Optional[float] = None           # media_seconds / encode_seconds
+    processes: int = 0
+    error: Optional[str] = None
+    log_path: Optional[str] = None          # лог ffmpeg (пишется при ошибке)
+
+    def add_process(self, usage):
+        self.processes += 1
+        self.encode_seconds += usage.wall_seconds
+        self.cpu_user = _add(self.cpu_user, usage.cpu_user)
+        self.cpu_system = _add(self.cpu_system, usage.cpu_system)
+        if usage.max_rss_bytes is not None:
+            self.max_rss_bytes = max(self.max_rss_bytes or 0, usage.max_rss_bytes)
+        self.bytes_read = _add(self.bytes_read, usage.bytes_read)
+        self.bytes_written = _add(self.bytes_written, usage.bytes_written)
+
+    def finish(self, status, wall_seconds):
+        self.status = status
+        self.wall_seconds = wall_seconds
+        if self.media_seconds and self.encode_seconds and not self.reused:
+            self.speed = self.media_seconds / self.encode_seconds
+
+
+def batch_totals(records, wall_seconds):
+    """Итоги пакета: задания по статусам, суммы ресурсов и пропускная способность"""
+    statuses = {}
+    for record in records:
+        statuses[record.status] = statuses.get(record.status, 0) + 1
+    encoded = [record for record in records if not record.reused and record.processes]
+    media_seconds = sum(record.media_seconds or 0 for record in encoded)
+    cpu_seconds = sum((record.cpu_user or 0) + (record.cpu_system or 0) for record in encoded)
+    return {
+        'jobs': len(records),
+        'statuses': statuses,
+        'reused': sum(1 for record in records if record.reused),
+        'skipped_outputs': sum(len(record.skipped_outputs) for record in records),
+        'wall_seconds': wall_seconds,
+        'encode_seconds': sum(record.encode_seconds for record in encoded),
+        'cpu_user': sum(record.cpu_user or 0 for record in encoded),
+        'cpu_system': sum(record.cpu_system or 0 for record in encoded),
+        'max_rss_bytes': max((record.max_rss_bytes or 0 for record in encoded), default=0),
+        'bytes_read': sum(record.bytes_read or 0 for record in encoded),
+        'bytes_written': sum(record.bytes_written or 0 for record in encoded),
+        'media_seconds': media_seconds,
+        # Секунд материала за секунду пакета и задания в час
+        'realtime_factor': media_seconds / wall_seconds if wall_seconds else None,
+        'jobs_per_hour': len(encoded) * 3600 / wall_seconds if wall_seconds else None,
+        'cpu_seconds_per_media_second': cpu_seconds / media_seconds if media_seconds else None,
+    }
+
+
+def default_report_dir():
+    """Папка отчётов: TRACKPACKER_REPORT_DIR или reports в папке кэша; None - отчёты отключены"""
+    override = os.environ.get("TRACKPACKER_REPORT_DIR")
+    if override is not None:
+        return override or None
+    return os.path.join(user_cache_dir(), "reports")
+
+
+def _write_atomic(path, text):
+    # node_exporter не должен прочитать файл наполовину
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+def worker_prometheus_file(worker):
+    return WORKER_PROMETHEUS_PREFIX + re.sub(r'[^\w.-]', '-', worker) + '.prom'
+
+
+def prometheus_text(totals, finished_at, worker=None):
+    """Итоги пакета для textfile. worker добавляет метку worker: у файлов
+    разных исполнителей не должно быть одинаковых рядов"""
+    lines = []
+    common = ''
+    if worker:
+        common = 'worker="{}"'.format(worker.replace('\\', '\\\\').replace('"', '\\"'))
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP trackpacker_{name} {help_text}")
+        lines.append(f"# TYPE trackpacker_{name} {kind}")
+        for labels, value in samples:
+            if common:
+                labels = '{' + ','.join(filter(None, (common, labels[1:-1]))) + '}'
+            if value is not None:
+                lines.append(f"trackpacker_{name}{labels} {value:.17g}")
+
+    metric('batch_jobs', 'gauge', 'Jobs in the last batch by status.',
+           [(f'{{status="{status}"}}', count) for status, count in sorted(totals['statuses'].items())])
+    metric('batch_reused_jobs', 'gauge', 'Jobs whose result was reused without encoding.',
+           [('', totals['reused'])])
+    metric('batch_skipped_outputs', 'gauge', 'Outputs skipped because their translation track was missing.',
+           [('', totals['skipped_outputs'])])
+    metric('batch_wall_seconds', 'gauge', 'Wall time of the last batch.', [('', totals['wall_seconds'])])
+    metric('batch_encode_seconds', 'gauge', 'Summed wall time of ffmpeg processes.',
+           [('', totals['encode_seconds'])])
+    metric('batch_cpu_seconds', 'gauge', 'CPU time of ffmpeg processes.',
+           [('{mode="user"}', totals['cpu_user']), ('{mode="system"}', totals['cpu_system'])])
+    metric('batch_max_rss_bytes', 'gauge', 'Peak resident memory of a single ffmpeg process.',
+           [('', totals['max_rss_bytes'])])
+    metric('batch_bytes', 'gauge', 'Bytes read and written by ffmpeg processes.',
+           [('{direction="read"}', totals['bytes_read']), ('{direction="written"}', totals['bytes_written'])])
+    metric('batch_media_seconds', 'gauge', 'Seconds of video processed.', [('', totals['media_seconds'])])
+    metric('batch_realtime_factor', 'gauge', 'Media seconds processed per wall second.',
+           [('', totals['realtime_factor'])])
+    metric('batch_jobs_per_hour', 'gauge', 'Encoded jobs per hour.', [('', totals['jobs_per_hour'])])
+    metric('batch_finished_timestamp_seconds', 'gauge', 'When the last batch finished.', [('', finished_at)])
+    return "\n".join(lines) + "\n"
+
+
+def write_reports(records, wall_seconds, report_dir, batch_id=None, worker=None):
+    """Пишет <время>.json, <время>.csv и trackpacker.prom в report_dir; возвращает путь JSON.
+
+    Исполнитель очереди (worker - его имя) пишет итоги в свой
+    trackpacker-<имя>.prom: общий файл каждый исполнитель затирал бы своими.
+    """
+    os.makedirs(report_dir, exist_ok=True)
+    finished_at = time.time()
+    totals = batch_totals(records, wall_seconds)
+    stem = time.strftime('%Y%m%d-%H%M%S', time.localtime(finished_at))
+    if batch_id:
+        stem += f'-{batch_id[:8]}'
+    json_path = os.path.join(report_dir, stem + '.json')
+    report = {'batch': batch_id, 'finished_at': finished_at, 'totals': totals,
+              'jobs': [asdict(record) for record in records]}
+    _write_atomic(json_path, json.dumps(report, ensure_ascii=False, indent=2))
+
+    columns = [item.name for item in fields(JobTelemetry)]
+    rows = []
+    for record in records:
+        row = asdict(record)
+        row['outputs'] = ';'.join(record.outputs)
+        row['skipped_outputs'] = ';'.join(record.skipped_outputs)
+        rows.append(row)
+    csv_path = os.path.join(report_dir, stem + '.csv')
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    prometheus_file = worker_prometheus_file(worker) if worker else PROMETHEUS_FILE
+    _write_atomic(os.path.join(report_dir, prometheus_file), prometheus_text(totals, finished_at, worker))
+    prune_reports(report_dir)
+    return json_path
+
+
+def prune_reports(report_dir, keep=KEEP_REPORTS):
+    """Удаляет старые отчёты, кроме последних keep"""
+    try:
+        names = sorted(name for name in os.listdir(report_dir) if name.endswith('.json'))
+    except OSError:
+        return
+    for name in names[:-keep] if keep else names:
+        stem = name[:-len('.json')]
+        for ext in ('.json', '.csv'):
+            try:
+                os.remove(os.path.join(report_dir, stem + ext))
+            except OSError:
+                pass
+    # Имя исполнителя меняется с каждым запуском (хост:pid) - файлы давно
+    # закончивших исполнителей удаляются так же, по числу
+    workers = []
+    for name in os.listdir(report_dir):
+        if name.startswith(WORKER_PROMETHEUS_PREFIX) and name.endswith('.prom'):
+            try:
+                workers.append((os.path.getmtime(os.path.join(report_dir, name)), name))
+            except OSError:
+                pass
+    workers.sort()
+    for _, name in workers[:-keep] if keep else workers:
+        try:
+            os.remove(os.path.join(report_dir, name))
+        except OSError:
+            pass
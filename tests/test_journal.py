@@ -0,0 +1,49 @@
+"""Запись журнала не остаётся running, как бы ни закончилось задание"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import engine
+from journal import JobJournal
+from supervisor import ProcessSupervisor
+
+
+@pytest.fixture
+def batch(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRACKPACKER_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("TRACKPACKER_NO_JOURNAL", "1")
+    video = tmp_path / "Show S01E01.mkv"
+    audio = tmp_path / "Show S01E01_rus.mp3"
+    video.write_bytes(b"video")
+    audio.write_bytes(b"audio")
+    monkeypatch.setattr(engine, "ensure_media", lambda pair: SimpleNamespace(duration=40.0))
+    monkeypatch.setattr(engine.BatchEngine, "build_command", lambda self, pair, outputs: ["ffmpeg"])
+    journal = JobJournal(str(tmp_path / "jobs.sqlite3"))
+    batch_engine = engine.BatchEngine(engine.MixSettings(), journal=journal, max_workers=1, threads=1)
+    yield batch_engine, {'show s01e01': {'video': str(video), 'audio': str(audio)}}
+    journal.close()
+
+
+def test_stopped_job_is_not_left_running(batch, monkeypatch):
+    batch_engine, pairs = batch
+
+    async def stopped(self, cmd, **kwargs):
+        batch_engine.stop_event.set()
+        return -15
+
+    monkeypatch.setattr(ProcessSupervisor, "run_process", stopped)
+    assert batch_engine.run(pairs) == {'show s01e01': 'stopped'}
+    assert batch_engine.journal.states() == {'failed': 1}
+
+
+def test_cancelled_job_is_not_left_running(batch, monkeypatch):
+    batch_engine, pairs = batch
+
+    async def cancelled(self, cmd, **kwargs):
+        raise asyncio.CancelledError()
+
+    monkeypatch.setattr(ProcessSupervisor, "run_process", cancelled)
+    with pytest.raises(asyncio.CancelledError):
+        batch_engine.run(pairs)
+    assert batch_engine.journal.states() == {'failed': 1}
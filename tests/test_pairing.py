@@ -0,0 +1,40 @@
+"""Сопоставление большой библиотеки: время и выбор ближайшей серии"""
+import time
+
+import pairing
+
+# Полный перебор кандидатов на таких библиотеках занимал десятки секунд
+TIME_LIMIT = 5.0
+
+
+def episodes(count):
+    return [(season, episode) for season in range(1, 100) for episode in range(100)][:count]
+
+
+def clear_caches():
+    for function in (pairing.get_base_name, pairing.normalize_name, pairing.extract_core_name):
+        function.cache_clear()
+
+
+def test_fuzzy_library_is_fast_and_exact():
+    videos = [f"/lib/Show.S{s:02d}E{e:02d}.1080p.WEB-DL.mkv" for s, e in episodes(5000)]
+    audios = [f"/lib/Show S{s:02d}E{e:02d}_rus.mp3" for s, e in episodes(5000)]
+    clear_caches()
+    started = time.perf_counter()
+    pairs = pairing.pair_files(videos, audios)
+    elapsed = time.perf_counter() - started
+    assert elapsed < TIME_LIMIT, f"10000 файлов сопоставлены за {elapsed:.1f} с"
+    for s, e in episodes(5000):
+        pair = pairs[f"show.s{s:02d}e{e:02d}.1080p.web-dl"]
+        assert pair['audio'] == f"/lib/Show S{s:02d}E{e:02d}_rus.mp3"
+
+
+def test_unmatched_audio_is_fast():
+    videos = [f"/lib/Show.S{s:02d}E{e:02d}.1080p.WEB-DL.mkv" for s, e in episodes(1000)]
+    audios = [f"/lib/Other Show S{i % 99:02d}E{i % 97:02d} commentary {i}_eng.mp3" for i in range(9000)]
+    clear_caches()
+    started = time.perf_counter()
+    pairs = pairing.pair_files(videos, audios)
+    elapsed = time.perf_counter() - started
+    assert elapsed < TIME_LIMIT, f"10000 файлов сопоставлены за {elapsed:.1f} с"
+    assert all(pair['audio'] is None for pair in pairs.values() if pair['video'])
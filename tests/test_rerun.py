@@ -0,0 +1,57 @@
+"""Повторный запуск по папке, где исходники лежат рядом с готовыми результатами"""
+import pytest
+
+import engine
+import render_cache
+from journal import JobJournal
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRACKPACKER_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("TRACKPACKER_NO_JOURNAL", "1")
+    folder = tmp_path / "library"
+    folder.mkdir()
+    paths = {}
+    for name, data in (("Show S01E01.mkv", b"source"), ("Show S01E01_rus.mp3", b"audio"),
+                       ("Show S01E01_RUS.mkv", b"result")):
+        path = folder / name
+        path.write_bytes(data)
+        paths[name] = str(path)
+    return folder, paths
+
+
+def assert_source_paired(files, paths):
+    assert files['video'] == [paths["Show S01E01.mkv"]]
+    pairs = engine.build_file_pairs(files)
+    assert pairs == {'show s01e01': {'video': paths["Show S01E01.mkv"],
+                                     'audio': paths["Show S01E01_rus.mp3"]}}
+
+
+def test_journal_output_does_not_replace_source(library, tmp_path):
+    folder, paths = library
+    output = paths["Show S01E01_RUS.mkv"]
+    journal = JobJournal(str(tmp_path / "jobs.sqlite3"))
+    journal.queue('batch', [(output, paths["Show S01E01.mkv"], paths["Show S01E01_rus.mp3"])], engine.MixSettings())
+    journal.start(output, paths["Show S01E01.mkv"], paths["Show S01E01_rus.mp3"], engine.MixSettings())
+    journal.commit(output)
+    try:
+        assert_source_paired(engine.collect_files([str(folder)], journal=journal), paths)
+    finally:
+        journal.close()
+
+
+def test_render_index_output_does_not_replace_source(library):
+    folder, paths = library
+    render_cache.record(paths["Show S01E01_RUS.mkv"], 'fingerprint', 1.0)
+    assert_source_paired(engine.collect_files([str(folder)]), paths)
+
+
+def test_changed_output_is_collected_again(library):
+    folder, paths = library
+    output = paths["Show S01E01_RUS.mkv"]
+    render_cache.record(output, 'fingerprint', 1.0)
+    with open(output, 'ab') as f:
+        f.write(b"edited")
+    files = engine.collect_files([str(folder)])
+    assert sorted(files['video']) == sorted([paths["Show S01E01.mkv"], output])
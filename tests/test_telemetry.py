@@ -0,0 +1,24 @@
+"""Файлы Prometheus исполнителей очереди в общей папке отчётов"""
+import telemetry
+
+
+def record(base, status):
+    return telemetry.JobTelemetry(base=base, video=f"/lib/{base}.mkv", status=status, wall_seconds=1.0)
+
+
+def test_workers_do_not_overwrite_each_other(tmp_path):
+    telemetry.write_reports([record('ep01', 'done')], 1.0, str(tmp_path), 'host-1', worker='host:1')
+    telemetry.write_reports([record('ep02', 'error')], 1.0, str(tmp_path), 'host-2', worker='host:2')
+    first = (tmp_path / 'trackpacker-host-1.prom').read_text(encoding='utf-8')
+    second = (tmp_path / 'trackpacker-host-2.prom').read_text(encoding='utf-8')
+    assert 'trackpacker_batch_jobs{worker="host:1",status="done"} 1' in first
+    assert 'trackpacker_batch_jobs{worker="host:2",status="error"} 1' in second
+    assert 'trackpacker_batch_wall_seconds{worker="host:2"} 1' in second
+    assert not (tmp_path / telemetry.PROMETHEUS_FILE).exists()
+
+
+def test_old_worker_files_are_pruned(tmp_path):
+    for index in range(3):
+        telemetry.write_reports([record('ep01', 'done')], 1.0, str(tmp_path), f'host-{index}', worker=f'host:{index}')
+    telemetry.prune_reports(str(tmp_path), keep=1)
+    assert len(list(tmp_path.glob('trackpacker-*.prom'))) == 1
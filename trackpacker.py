@@ -0,0 +1,438 @@
+"""Консольный режим Track-Packer.
+
+Запуск без окна, например на Linux-серверах:
+    python trackpacker.py /mnt/library/Season1 --orig-volume 10 --no-backup
+ffmpeg и ffprobe ищутся в PATH (или в TRACKPACKER_FFMPEG / TRACKPACKER_FFPROBE).
+"""
+import argparse
+import fnmatch
+import os
+import subprocess
+import sys
+import time
+
+import engine
+from encoders import DEFAULT_PROFILE, PROFILES, available_profiles, benchmark_profiles
+from engine import BatchEngine, MixSettings
+import ducking
+import joblog
+from joblog import DEFAULT_LOG_LINES
+import loudness
+import telemetry
+from probe import probe_media
+from probe_cache import get_default_cache
+from scheduler import DEFAULT_ORDER, ORDER_POLICIES, compare_policies, plan_slots
+from variants import parse_variant
+from watcher import DEFAULT_SETTLE_SECONDS, DEFAULT_VIDEO_WAIT, HotFolder
+from workqueue import DEFAULT_LEASE_SECONDS, DONE, FAILED, IDLE_POLL_SECONDS, QueueWorker, WorkQueue
+
+
+def volume_arg(value):
+    volume = float(value)
+    if not 1 <= volume <= 100:
+        raise argparse.ArgumentTypeError("громкость должна быть от 1 до 100")
+    return volume
+
+
+def variant_arg(value):
+    try:
+        return parse_variant(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="trackpacker",
+        description="Пакетное смешивание оригинальной и переведённой аудиодорожек.")
+    parser.add_argument("paths", nargs="*", help="папки и/или файлы (видео и внешние аудиодорожки)")
+    parser.add_argument("--orig-volume", type=volume_arg, default=5,
+                        help="громкость оригинальной дорожки, %% (по умолчанию 5)")
+    parser.add_argument("--new-volume", type=volume_arg, default=100,
+                        help="громкость перевода, %% (по умолчанию 100)")
+    parser.add_argument("--invert", action="store_true",
+                        help="поменять местами внутренние дорожки")
+    parser.add_argument("--delete-original", action="store_true",
+                        help="не сохранять оригинальную дорожку в выходном файле")
+    parser.add_argument("--no-backup", action="store_true",
+                        help="удалять исходники вместо переноса в папку backup")
+    parser.add_argument("--target-track", type=int, default=0,
+                        help="индекс внутренней дорожки для смешивания с внешним аудио")
+    parser.add_argument("--auto-gain", action="store_true",
+                        help="громкости для каждого файла по измеренной громкости дорожек (EBU R128)")
+    parser.add_argument("--target-lufs", type=float, default=loudness.DEFAULT_TARGET_LUFS,
+                        help=f"громкость перевода в смеси, LUFS (по умолчанию {loudness.DEFAULT_TARGET_LUFS:g})")
+    parser.add_argument("--ratio-db", type=float, default=loudness.DEFAULT_RATIO_DB,
+                        help=f"на сколько дБ оригинал тише перевода (по умолчанию {loudness.DEFAULT_RATIO_DB:g})")
+    parser.add_argument("--duck", action="store_true",
+                        help="оригинал громче в паузах перевода (фрагменты речи ищутся по огибающей перевода)")
+    parser.add_argument("--duck-db", type=float, default=ducking.DEFAULT_DUCK_DB,
+                        help=f"на сколько дБ оригинал громче в паузах (по умолчанию {ducking.DEFAULT_DUCK_DB:g})")
+    parser.add_argument("--analyze", action="store_true",
+                        help="только измерить громкость дорожек и показать громкости для --auto-gain")
+    parser.add_argument("--output", dest="variants", type=variant_arg, action="append", default=[],
+                        metavar="SUFFIX[:ORIG:NEW[:CONTAINER[:LANG]]]",
+                        help="результат задания <имя>_SUFFIX.CONTAINER; можно указать несколько раз - "
+                             "все результаты собираются за один проход ffmpeg. LANG - перевод из <имя>_LANG.*")
+    parser.add_argument("--encoder", choices=sorted(PROFILES), default=DEFAULT_PROFILE,
+                        help=f"профиль кодирования смеси (по умолчанию {DEFAULT_PROFILE})")
+    parser.add_argument("--list-encoders", action="store_true",
+                        help="показать профили, доступные в локальном ffmpeg")
+    parser.add_argument("--benchmark-encoders", nargs="?", const="", metavar="CLIP",
+                        help="замерить скорость и битрейт профилей на фрагменте CLIP "
+                             "(без CLIP - на синтетическом сигнале)")
+    parser.add_argument("--benchmark-seconds", type=float, default=60.0,
+                        help="длина фрагмента для замера, с (по умолчанию 60)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="число одновременных заданий (по умолчанию - по числу доступных ядер)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="потоков ffmpeg на задание (по умолчанию ядра делятся поровну между заданиями)")
+    parser.add_argument("--order", choices=ORDER_POLICIES, default=DEFAULT_ORDER,
+                        help="порядок заданий: longest - сначала длинные (быстрее весь пакет), "
+                             "shortest - сначала короткие (быстрее первые результаты), input - как найдены")
+    parser.add_argument("--pin", metavar="GLOB", action="append", default=[],
+                        help="склеить первыми видео, имя которых подходит под шаблон (можно несколько раз)")
+    parser.add_argument("--simulate", action="store_true",
+                        help="только предсказать время пакета при каждом порядке заданий")
+    parser.add_argument("--scan-workers", type=int, default=1,
+                        help="сколько папок верхнего уровня обходить параллельно (полезно на сетевых дисках)")
+    parser.add_argument("--watch", action="store_true",
+                        help="следить за папками и склеивать новые пары по мере появления (Ctrl+C - выход)")
+    parser.add_argument("--settle-seconds", type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help="сколько секунд файл не должен меняться, чтобы считаться дописанным")
+    parser.add_argument("--video-wait", type=float, default=DEFAULT_VIDEO_WAIT,
+                        help="сколько секунд ждать внешний перевод к видео со встроенными дорожками")
+    parser.add_argument("--poll", action="store_true",
+                        help="опрашивать папки вместо событий inotify")
+    parser.add_argument("--queue", metavar="FILE",
+                        help="общая очередь заданий (SQLite на общем диске): с папками - поставить пары в очередь "
+                             "и дождаться их, с --worker - выполнять задания из очереди")
+    parser.add_argument("--worker", action="store_true",
+                        help="брать задания из --queue, пока они не кончатся")
+    parser.add_argument("--spawn-workers", type=int, default=0, metavar="N",
+                        help="запустить N исполнителей на этой машине вместе с координатором")
+    parser.add_argument("--no-wait", action="store_true",
+                        help="только поставить пары в --queue, не дожидаясь исполнителей")
+    parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS,
+                        help="срок аренды задания; задание упавшего исполнителя выдаётся снова после него")
+    parser.add_argument("--report-dir", default=None,
+                        help="куда писать отчёты о пакете (JSON, CSV и trackpacker.prom для Prometheus); "
+                             "по умолчанию - reports в папке кэша")
+    parser.add_argument("--no-report", action="store_true",
+                        help="не писать отчёты о пакете")
+    parser.add_argument("--log-dir", default=None,
+                        help="куда писать логи ffmpeg заданий с ошибками; по умолчанию - logs в папке кэша")
+    parser.add_argument("--log-lines", type=int, default=DEFAULT_LOG_LINES,
+                        help=f"сколько последних строк лога ffmpeg хранить на задание (по умолчанию {DEFAULT_LOG_LINES})")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="печатать строки ffmpeg сразу и сохранять логи всех заданий")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="только показать найденные пары")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="не использовать кэш метаданных")
+    parser.add_argument("--force", action="store_true",
+                        help="кодировать заново даже готовые результаты с теми же входами и настройками")
+    parser.add_argument("--no-journal", action="store_true",
+                        help="не вести журнал заданий (повторный запуск начнёт всё заново)")
+    parser.add_argument("--clear-cache", action="store_true",
+                        help="очистить кэш метаданных перед запуском")
+    return parser
+
+
+def make_status_printer(job_progress=None):
+    """job_progress - словарь последних ProgressEvent заданий (BatchEngine.job_progress)"""
+    last_status = {}
+
+    def print_status(base, status, progress=None):
+        # Печатаем только смену статуса: проценты сотен заданий сделали бы лог нечитаемым
+        if last_status.get(base) != status:
+            last_status[base] = status
+            event = (job_progress or {}).get(base)
+            if status == 'done' and event is not None and event.describe():
+                print(f"[{status}] {base} ({event.describe()})")
+            else:
+                print(f"[{status}] {base}")
+
+    return print_status
+
+
+def list_encoders():
+    ffmpeg_path = engine.find_tool("ffmpeg")
+    available = {profile.name for profile in available_profiles(ffmpeg_path)}
+    for name, profile in PROFILES.items():
+        mark = "+" if name in available else "-"
+        print(f"{mark} {name:12} {profile.title}")
+    return 0
+
+
+def benchmark_encoders(clip, seconds):
+    ffmpeg_path = engine.find_tool("ffmpeg")
+    if clip:
+        media = probe_media(clip, engine.find_tool("ffprobe"))
+        if media is None or not media.duration:
+            return 1
+        seconds = min(seconds, media.duration)
+    print(f"Замер на {seconds:.0f} с {'фрагмента ' + clip if clip else 'синтетического сигнала'}, 1 поток")
+    results = benchmark_profiles(ffmpeg_path, clip or None, seconds)
+    print(f"{'профиль':12} {'время, с':>9} {'x реального':>12} {'кбит/с':>8}")
+    for row in results:
+        print(f"{row['profile']:12} {row['seconds']:>9.2f} {row['realtime']:>12.1f} {row['bitrate_kbps']:>8.1f}")
+    return 0 if results else 1
+
+
+def make_settings(args):
+    return MixSettings(
+        orig_volume=args.orig_volume,
+        new_volume=args.new_volume,
+        invert_tracks=args.invert,
+        delete_original_track=args.delete_original,
+        backup_files=not args.no_backup,
+        target_track=args.target_track,
+        encoder_profile=args.encoder,
+        auto_gain=args.auto_gain,
+        target_lufs=args.target_lufs,
+        ratio_db=args.ratio_db,
+        ducking=args.duck,
+        duck_db=args.duck_db,
+        variants=tuple(args.variants),
+    )
+
+
+def watch(args, settings):
+    """Режим наблюдения: новые пары склеиваются сами, пока не нажат Ctrl+C"""
+    folders = [path for path in args.paths if os.path.isdir(path)]
+    if not folders:
+        print("Для --watch нужны папки")
+        return 2
+    hot_folder = HotFolder(folders, settings, settle_seconds=args.settle_seconds,
+                           video_wait=args.video_wait, use_inotify=not args.poll,
+                           on_status=make_status_printer(), max_workers=args.jobs,
+                           threads=args.threads, force=args.force, order=args.order,
+                           report_dir=report_dir(args), **log_options(args))
+    try:
+        result = hot_folder.run()
+    except KeyboardInterrupt:
+        hot_folder.stop()
+        if hot_folder.batch_engine is not None:
+            engine.remove_temp_outputs(hot_folder.pairing.pairs, hot_folder.batch_engine.file_status, settings)
+        print("Наблюдение остановлено")
+        return 130
+    error_count = sum(1 for status in result.values() if status == 'error')
+    return 1 if error_count else 0
+
+
+def pin_pairs(file_pairs, patterns):
+    """Закрепляет пары, видео которых подходит под шаблоны; первый шаблон - самый первый"""
+    for base, pair in file_pairs.items():
+        if not pair['video']:
+            continue
+        name = os.path.basename(pair['video']).lower()
+        for number, pattern in enumerate(patterns):
+            if fnmatch.fnmatch(name, pattern.lower()):
+                pair['priority'] = len(patterns) - number
+                break
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def simulate_orders(file_pairs, slots):
+    """Предсказанное время пакета при каждом порядке заданий (в секундах материала)"""
+    jobs = [(base, pair) for base, pair in file_pairs.items() if pair['video']]
+    for base, pair in jobs:
+        engine.ensure_media(pair)
+    _, costs = engine.order_jobs(jobs, 'input')
+    predicted, lower_bound = compare_policies(costs, slots, [pair.get('priority', 0) for base, pair in jobs])
+    print(f"Заданий: {len(jobs)}, материала {format_duration(sum(costs))}, слотов: {slots}")
+    for policy, makespan in predicted.items():
+        ratio = f" ({makespan / lower_bound:.2f} от минимума)" if lower_bound else ""
+        print(f"{policy:9} {format_duration(makespan)}{ratio}")
+    print(f"{'минимум':9} {format_duration(lower_bound)}")
+    print("Время - в секундах материала на самый загруженный слот; реальное зависит от скорости кодирования")
+    return 0
+
+
+def report_dir(args):
+    if args.no_report:
+        return None
+    return args.report_dir or telemetry.default_report_dir()
+
+
+def log_options(args):
+    """Параметры логов заданий для BatchEngine"""
+    return {'log_dir': args.log_dir or joblog.default_log_dir(),
+            'log_lines': max(1, args.log_lines), 'verbose': args.verbose}
+
+
+def spawn_worker(args, threads):
+    """Исполнитель для той же очереди в отдельном процессе"""
+    if getattr(sys, 'frozen', False):
+        cmd = [sys.executable]
+    else:
+        cmd = [sys.executable, os.path.abspath(__file__)]
+    cmd += ["--queue", args.queue, "--worker", "-j", "1", "--threads", str(threads),
+            "--lease-seconds", str(args.lease_seconds)]
+    if args.force:
+        cmd.append("--force")
+    if args.no_report:
+        cmd.append("--no-report")
+    elif args.report_dir:
+        cmd += ["--report-dir", args.report_dir]
+    if args.log_dir:
+        cmd += ["--log-dir", args.log_dir]
+    cmd += ["--log-lines", str(args.log_lines)]
+    if args.verbose:
+        cmd.append("--verbose")
+    return subprocess.Popen(cmd)
+
+
+def coordinate(args, file_pairs, settings):
+    """Ставит пары в общую очередь и ждёт, пока исполнители их склеят"""
+    queue = WorkQueue(args.queue)
+    # Задания выдаются в порядке постановки
+    ordered, _ = engine.order_jobs([(base, pair) for base, pair in file_pairs.items() if pair['video']], args.order)
+    count = queue.enqueue(dict(ordered), settings)
+    print(f"Поставлено в очередь {args.queue}: {count}")
+    if args.no_wait:
+        return 0
+    threads = plan_slots(args.spawn_workers, args.threads).threads
+    workers = [spawn_worker(args, threads) for _ in range(args.spawn_workers)]
+    started = time.monotonic()
+    last_counts = None
+    try:
+        while True:
+            counts = queue.counts()
+            if counts != last_counts:
+                last_counts = counts
+                print("Очередь: " + ", ".join(f"{state} {number}" for state, number in sorted(counts.items())))
+            if queue.pending() == 0:
+                break
+            time.sleep(IDLE_POLL_SECONDS)
+    except KeyboardInterrupt:
+        # Исполнители получают тот же Ctrl+C и возвращают свои задания в очередь
+        for process in workers:
+            process.wait()
+        print("Ожидание прервано, оставшиеся задания остаются в очереди")
+        return 130
+    for process in workers:
+        process.wait()
+    for video, error in queue.failures():
+        print(f"Ошибка: {video}: {error}")
+    counts = queue.counts()
+    print(f"Готово за {time.monotonic() - started:.1f} с! Успешно: {counts.get(DONE, 0)}, "
+          f"Ошибок: {counts.get(FAILED, 0)}")
+    return 1 if counts.get(FAILED) else 0
+
+
+def work(args):
+    """Исполнитель: склеивает задания из общей очереди, пока они есть"""
+    plan = plan_slots(args.jobs, args.threads)
+    worker = QueueWorker(WorkQueue(args.queue), slots=plan.slots, threads=plan.threads,
+                         lease_seconds=args.lease_seconds, on_status=make_status_printer(),
+                         force=args.force, report_dir=report_dir(args), **log_options(args))
+    print(f"Исполнитель {worker.name}: {plan.describe()}")
+    try:
+        result = worker.run()
+    except KeyboardInterrupt:
+        print("Исполнитель остановлен, взятые задания возвращены в очередь")
+        return 130
+    error_count = sum(1 for status in result.values() if status == 'error')
+    print(f"Исполнитель {worker.name} закончил. Заданий: {len(result)}, Ошибок: {error_count}")
+    return 1 if error_count else 0
+
+
+def analyze_loudness(file_pairs, settings, workers):
+    """Измеряет громкость всех пар параллельно (результаты остаются в кэше)"""
+    sources = {}
+    for base, pair in file_pairs.items():
+        if not pair['video'] or engine.ensure_media(pair) is None:
+            continue
+        try:
+            sources[base] = engine.loudness_sources(pair, settings, engine.pair_tracks(pair))
+        except Exception as e:
+            print(f"Пропуск {base}: {e}")
+    results = loudness.analyze(sources, engine.find_tool("ffmpeg"), workers)
+    for base, (orig_lufs, new_lufs) in sorted(results.items()):
+        orig_volume, new_volume = loudness.auto_volumes(orig_lufs, new_lufs, settings)
+        measured = " / ".join("?" if value is None else f"{value:.1f}" for value in (orig_lufs, new_lufs))
+        print(f"{base}: {measured} LUFS -> {orig_volume:g}% / {new_volume:g}%")
+    return 0 if all(None not in values for values in results.values()) else 1
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.list_encoders:
+        return list_encoders()
+    if args.benchmark_encoders is not None:
+        return benchmark_encoders(args.benchmark_encoders, args.benchmark_seconds)
+    if args.worker:
+        if not args.queue:
+            parser.error("для --worker нужна --queue")
+    elif not args.paths:
+        parser.error("не указаны папки или файлы")
+    if args.no_journal:
+        os.environ["TRACKPACKER_NO_JOURNAL"] = "1"
+    if args.no_cache:
+        os.environ["TRACKPACKER_NO_CACHE"] = "1"
+    elif args.clear_cache:
+        cache = get_default_cache()
+        if cache is not None:
+            cache.clear()
+
+    if args.worker:
+        return work(args)
+    if args.watch:
+        return watch(args, make_settings(args))
+
+    files = engine.collect_files(args.paths, workers=args.scan_workers)
+    file_pairs = engine.build_file_pairs(files)
+    file_status = {}
+    for base, pair in file_pairs.items():
+        if not pair['video']:
+            print(f"Пропуск {os.path.basename(pair['audio'])}: видео не найдено")
+            file_status[base] = 'skipped'
+
+    pin_pairs(file_pairs, args.pin)
+    if args.simulate:
+        return simulate_orders(file_pairs, plan_slots(args.jobs, args.threads).slots)
+    if args.dry_run:
+        for base, pair in file_pairs.items():
+            if pair['video']:
+                audio = os.path.basename(pair['audio']) if pair['audio'] else "(внутренние дорожки)"
+                print(f"{os.path.basename(pair['video'])} <- {audio}")
+        return 0
+
+    settings = make_settings(args)
+    if args.queue:
+        return coordinate(args, file_pairs, settings)
+    if args.analyze:
+        return analyze_loudness(file_pairs, settings, plan_slots(args.jobs, args.threads).slots)
+    batch = BatchEngine(settings, max_workers=args.jobs, threads=args.threads, force=args.force,
+                        order=args.order, report_dir=report_dir(args), **log_options(args))
+    batch.on_status = make_status_printer(batch.job_progress)
+    try:
+        result = batch.run(file_pairs, file_status)
+    except KeyboardInterrupt:
+        batch.stop()
+        engine.remove_temp_outputs(file_pairs, batch.file_status, settings)
+        print("Обработка остановлена")
+        return 130
+
+    success_count = sum(1 for status in result.values() if status == 'done')
+    error_count = sum(1 for status in result.values() if status == 'error')
+    if batch.resumed:
+        print(f"Готовых по журналу (без повторного кодирования): {batch.resumed}")
+    if batch.render_hits:
+        print(f"Результат не изменился (без повторного кодирования): {batch.render_hits}")
+    if batch.resumed or batch.render_hits:
+        print(f"Сэкономлено времени кодирования: {batch.saved_seconds:.1f} с")
+    print(f"Готово! Успешно: {success_count}, Ошибок: {error_count}")
+    return 1 if error_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
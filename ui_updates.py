@@ -0,0 +1,40 @@
+"""Очередь обновлений интерфейса с объединением по заданию.
+
+Рабочие потоки не трогают Tk напрямую, а кладут сюда состояние. Для каждой
+пары хранится только последнее состояние, для общего прогресса - последнее
+значение, поэтому сколько бы заданий ни работало и как часто бы они ни
+сообщали о себе, главный поток за один тик применяет не больше одного
+обновления на строку.
+"""
+import threading
+
+DEFAULT_REFRESH_HZ = 10
+
+
+class UiUpdateQueue:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows = {}        # base -> (status, progress)
+        self.batch = None     # (processed, total)
+        self.calls = []       # функции, которые нужно выполнить после строк
+
+    def put_status(self, base, status, progress=None):
+        with self.lock:
+            self.rows[base] = (status, progress)
+
+    def put_batch(self, processed, total):
+        with self.lock:
+            self.batch = (processed, total)
+
+    def call_soon(self, func):
+        """Выполнить func в главном потоке на ближайшем тике, после обновления строк"""
+        with self.lock:
+            self.calls.append(func)
+
+    def drain(self):
+        """({base: (status, progress)}, (processed, total) или None, [функции]) с прошлого вызова"""
+        with self.lock:
+            rows, self.rows = self.rows, {}
+            batch, self.batch = self.batch, None
+            calls, self.calls = self.calls, []
+        return rows, batch, calls
@@ -0,0 +1,74 @@
+"""Несколько результатов одного задания за один проход ffmpeg.
+
+Раньше две смеси одной серии (например, оригинал на 5% и на 20%, или
+внешние _rus и _ukr) требовали двух полных заданий: многогигабайтное видео
+читалось, а оригинальная дорожка декодировалась дважды. Задание может
+объявить несколько результатов (OutputVariant) со своими громкостями,
+источником перевода и контейнером; все они собираются одним вызовом
+ffmpeg, где каждая декодированная дорожка размножается фильтром asplit.
+"""
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+DEFAULT_SUFFIX = 'RUS'
+DEFAULT_CONTAINER = 'mkv'
+CONTAINERS = ('mkv', 'mp4', 'mov')
+
+
+@dataclass(frozen=True)
+class OutputVariant:
+    """Один результат задания: <имя видео>_<suffix>.<container>"""
+    suffix: str = DEFAULT_SUFFIX
+    orig_volume: Optional[float] = None   # None - громкость из MixSettings
+    new_volume: Optional[float] = None
+    audio_lang: Optional[str] = None      # перевод из <имя видео>_<lang>.* рядом с видео; None - перевод задания
+    container: str = DEFAULT_CONTAINER
+
+    def describe(self):
+        parts = [f"_{self.suffix}.{self.container}"]
+        if self.orig_volume is not None or self.new_volume is not None:
+            parts.append(f"{self.orig_volume if self.orig_volume is not None else '-'}%"
+                         f"/{self.new_volume if self.new_volume is not None else '-'}%")
+        if self.audio_lang:
+            parts.append(f"перевод _{self.audio_lang}")
+        return " ".join(parts)
+
+
+def parse_variant(text):
+    """'SUFFIX[:ORIG:NEW[:CONTAINER[:LANG]]]' -> OutputVariant.
+
+    Пустые поля берутся из общих настроек: 'RUS20:20:' - оригинал на 20%,
+    'UKR:::mkv:ukr' - перевод из <имя>_ukr.*.
+    """
+    fields = text.split(':')
+    if not fields[0] or len(fields) > 5:
+        raise ValueError(f"Неверное описание результата: {text}")
+    fields += [''] * (5 - len(fields))
+    suffix, orig, new, container, lang = fields
+    container = (container or DEFAULT_CONTAINER).lower().lstrip('.')
+    if container not in CONTAINERS:
+        raise ValueError(f"Неподдерживаемый контейнер {container}: {text}")
+    return OutputVariant(
+        suffix=suffix,
+        orig_volume=float(orig) if orig else None,
+        new_volume=float(new) if new else None,
+        audio_lang=lang or None,
+        container=container,
+    )
+
+
+def find_language_audio(video_path, lang, audio_ext):
+    """Внешняя дорожка <имя видео>_<lang>.<аудио> из папки видео или None"""
+    stem = os.path.splitext(os.path.basename(video_path))[0].lower()
+    wanted = f"{stem}_{lang.lower()}"
+    folder = os.path.dirname(video_path) or '.'
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return None
+    for name in sorted(names):
+        name_stem, ext = os.path.splitext(name)
+        if name_stem.lower() == wanted and ext.lower() in audio_ext:
+            return os.path.join(folder, name)
+    return None
@@ -0,0 +1,335 @@
+"""Режим наблюдения за папкой приёма (hot folder).
+
+Раньше новые серии и дорожки приходилось каждый раз заново перетаскивать
+в окно, а каждое добавление пересканировало дерево через os.walk. Здесь
+папки отслеживаются событиями inotify (на Linux, без сторонних пакетов;
+в остальных случаях - периодическим опросом). Новый или переименованный
+файл считается готовым, когда его размер и mtime перестали меняться.
+Готовые файлы по одному добавляются в pairing.FilePairing, а пары, которые
+можно склеивать, сразу уходят в очередь обработки.
+"""
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import struct
+import threading
+import time
+
+from engine import BatchEngine, ensure_media, job_outputs, own_outputs, pair_tracks, video_ext
+from journal import get_default_journal
+from pairing import FilePairing
+from scanner import SKIP_DIRS, is_media, scan_tree
+
+DEFAULT_SETTLE_SECONDS = 2.0
+# Сколько ждать внешний перевод к видео со встроенными дорожками, прежде чем склеивать их
+DEFAULT_VIDEO_WAIT = 10.0
+POLL_INTERVAL = 1.0
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def walk_media(root):
+    """Медиафайлы дерева root, кроме служебных папок"""
+    return [path for path, _, _ in scan_tree(root)]
+
+
+class InotifyWatcher:
+    """События файловой системы Linux через inotify (ctypes)"""
+
+    def __init__(self, roots):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self.roots = roots
+        self.dirs = {}
+        for root in roots:
+            self.add_tree(root)
+
+    def add_tree(self, root):
+        """Следит за root и вложенными папками; возвращает уже лежащие в них файлы"""
+        found = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [name for name in dirnames if name.lower() not in SKIP_DIRS]
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                print(f"Не удалось следить за {dirpath}: {os.strerror(ctypes.get_errno())}")
+                continue
+            self.dirs[wd] = dirpath
+            found.extend(os.path.join(dirpath, name) for name in filenames)
+        return [path for path in found if is_media(path)]
+
+    def read(self, timeout):
+        """Пути медиафайлов, которые создались или менялись (ждёт до timeout секунд)"""
+        paths = []
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return paths
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return paths
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].split(b'\0', 1)[0]
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                # Очередь событий переполнилась - один раз просматриваем всё заново
+                print("Очередь событий inotify переполнена, повторный просмотр папок")
+                for root in self.roots:
+                    paths.extend(walk_media(root))
+                continue
+            directory = self.dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and os.path.basename(path).lower() not in SKIP_DIRS:
+                    # Папку могли перенести целиком, вместе с файлами
+                    paths.extend(self.add_tree(path))
+            elif is_media(path):
+                paths.append(path)
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Запасной вариант без inotify: раз в POLL_INTERVAL сравнивает размеры и mtime"""
+
+    def __init__(self, roots):
+        self.roots = roots
+        self.snapshot = self.scan()
+
+    def scan(self):
+        snapshot = {}
+        for root in self.roots:
+            for path in walk_media(root):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+    def read(self, timeout):
+        time.sleep(max(timeout, POLL_INTERVAL))
+        snapshot = self.scan()
+        changed = [path for path, stat in snapshot.items() if self.snapshot.get(path) != stat]
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+def open_watcher(roots, use_inotify=True):
+    """(наблюдатель, уже лежащие в папках файлы)"""
+    if use_inotify and hasattr(select, 'select') and os.name == 'posix':
+        try:
+            watcher = InotifyWatcher(roots)
+            return watcher, [path for root in roots for path in walk_media(root)]
+        except (OSError, AttributeError) as e:
+            print(f"inotify недоступен ({e}), папки будут опрашиваться раз в {POLL_INTERVAL:g} с")
+    watcher = PollingWatcher(roots)
+    return watcher, list(watcher.snapshot)
+
+
+class SettleTracker:
+    """Файл готов, когда его размер и mtime не менялись settle_seconds"""
+
+    def __init__(self, settle_seconds=DEFAULT_SETTLE_SECONDS):
+        self.settle_seconds = settle_seconds
+        self.files = {}  # путь -> ((размер, mtime_ns), с какого момента не меняется)
+
+    def touch(self, path):
+        self.files.setdefault(path, (None, time.monotonic()))
+
+    def ready(self):
+        now = time.monotonic()
+        done = []
+        for path, (stat, since) in list(self.files.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                # Файл удалили или переименовали - событие о новом имени придёт отдельно
+                del self.files[path]
+                continue
+            current = (st.st_size, st.st_mtime_ns)
+            if current != stat:
+                self.files[path] = (current, now)
+            elif now - since >= self.settle_seconds:
+                del self.files[path]
+                done.append(path)
+        return done
+
+
+class FolderFeed:
+    """Дописанные медиафайлы из папок: события (или опрос) -> SettleTracker.
+
+    run(on_files) вызывает on_files(пути) примерно дважды в секунду, в том
+    числе с пустым списком, чтобы вызывающий мог проверять свои таймауты.
+    ignore(путь) отсекает файлы, которые не нужно отслеживать.
+    """
+
+    def __init__(self, roots, settle_seconds=DEFAULT_SETTLE_SECONDS, use_inotify=True):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.use_inotify = use_inotify
+        self.tracker = SettleTracker(settle_seconds)
+        self.stop_event = threading.Event()
+
+    def run(self, on_files, ignore=None):
+        watcher, existing = open_watcher(self.roots, self.use_inotify)
+        print(f"Наблюдение за папками: {', '.join(self.roots)} "
+              f"({'inotify' if isinstance(watcher, InotifyWatcher) else 'опрос'})")
+        try:
+            for path in existing:
+                self.tracker.touch(path)
+            while not self.stop_event.is_set():
+                for path in watcher.read(0.5):
+                    if ignore is None or not ignore(path):
+                        self.tracker.touch(path)
+                on_files(self.tracker.ready())
+        finally:
+            # Выход по исключению (Ctrl+C) - тоже остановка: HotFolder по этому
+            # флагу прерывает текущую пачку, а не ждёт её и все следующие
+            self.stop_event.set()
+            watcher.close()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class HotFolder:
+    """Наблюдение за папками и склейка пар по мере их появления.
+
+    Обработка идёт в отдельном потоке пачками: пары, готовые к одному
+    моменту, склеиваются одним BatchEngine.run, а новые файлы тем временем
+    продолжают отслеживаться. on_batch(pairs) вызывается перед пачкой,
+    engine_kwargs передаются BatchEngine (on_status, max_workers и т.п.).
+    """
+
+    def __init__(self, roots, settings, settle_seconds=DEFAULT_SETTLE_SECONDS,
+                 video_wait=DEFAULT_VIDEO_WAIT, use_inotify=True, on_batch=None, **engine_kwargs):
+        self.feed = FolderFeed(roots, settle_seconds, use_inotify)
+        self.settings = settings
+        self.video_wait = video_wait
+        self.on_batch = on_batch
+        self.engine_kwargs = engine_kwargs
+        self.pairing = FilePairing()
+        self.journal = get_default_journal()
+        self.waiting = {}       # base -> когда пара изменилась
+        self.needs_audio = set()
+        self.outputs = set()    # результаты, которые пишем сами - это не новые видео
+        self.seen = {}          # путь -> (размер, mtime_ns) уже добавленного файла
+        self.jobs = queue.Queue()
+        self.batch_engine = None
+        self.processed = {}
+
+    def add_file(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        stat = (st.st_size, st.st_mtime_ns)
+        if path in self.outputs or self.seen.get(path) == stat:
+            return
+        if own_outputs([path], self.journal):
+            return
+        self.seen[path] = stat
+        ext = os.path.splitext(path)[1].lower()
+        if ext in video_ext:
+            base = self.pairing.add_video(path)
+        else:
+            base = self.pairing.add_audio(path)
+        if base is not None:
+            print(f"Новый файл: {path}")
+            self.waiting[base] = time.monotonic()
+            self.needs_audio.discard(base)
+
+    def ready_pairs(self):
+        """Пары, которые можно склеивать сейчас"""
+        now = time.monotonic()
+        ready = {}
+        for base, since in list(self.waiting.items()):
+            pair = self.pairing.pairs.get(base)
+            if pair is None or not pair['video']:
+                if pair is None:
+                    del self.waiting[base]
+                continue
+            if not os.path.exists(pair['video']):
+                # Видео уже склеено и ушло в backup - поздний перевод ждёт новое видео
+                del self.waiting[base]
+                continue
+            if not pair['audio']:
+                # Перевод может прийти следом - без него ждём video_wait
+                if base in self.needs_audio or now - since < self.video_wait:
+                    continue
+                ensure_media(pair)
+                if len(pair_tracks(pair)) < 2:
+                    print(f"{os.path.basename(pair['video'])}: ждём внешний перевод")
+                    self.needs_audio.add(base)
+                    continue
+            del self.waiting[base]
+            ready[base] = dict(pair)
+        return ready
+
+    def submit(self, pairs):
+        for pair in pairs.values():
+            try:
+                self.outputs.update(output.output_path for output in job_outputs(pair, self.settings))
+            except Exception:
+                pass
+        self.jobs.put(pairs)
+
+    def worker(self):
+        while True:
+            pairs = self.jobs.get()
+            if pairs is None:
+                return
+            if self.on_batch:
+                self.on_batch(pairs)
+            self.batch_engine = BatchEngine(self.settings, **self.engine_kwargs)
+            if self.feed.stop_event.is_set():
+                return
+            self.processed.update(self.batch_engine.run(pairs))
+
+    def run(self):
+        """Следит за папками до stop() (блокирующий вызов)"""
+        worker = threading.Thread(target=self.worker, daemon=True)
+        worker.start()
+        try:
+            self.feed.run(self.on_files, ignore=self.outputs.__contains__)
+        finally:
+            self.jobs.put(None)
+            if self.batch_engine is not None and self.feed.stop_event.is_set():
+                self.batch_engine.stop()
+            worker.join()
+        return self.processed
+
+    def on_files(self, paths):
+        for path in paths:
+            self.add_file(path)
+        pairs = self.ready_pairs()
+        if pairs:
+            self.submit(pairs)
+
+    def stop(self):
+        self.feed.stop()
+        if self.batch_engine is not None:
+            self.batch_engine.stop()
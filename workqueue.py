@@ -0,0 +1,347 @@
+"""Общая очередь заданий для нескольких машин (координатор и исполнители).
+
+Раньше пакет склеивался только на той машине, где запущен Track-Packer.
+Теперь координатор (trackpacker.py <папки> --queue Q) записывает пары в
+очередь - файл SQLite на общем диске, - а любое число исполнителей
+(trackpacker.py --queue Q --worker, на этой же или на других машинах)
+берёт задания в аренду и склеивает их обычным BatchEngine. Пока задание
+идёт, исполнитель продлевает аренду. Если исполнитель упал или потерял
+сеть, аренда истекает, и задание выдаётся другому исполнителю, но не
+больше MAX_ATTEMPTS раз.
+
+Очередь не использует WAL: он не работает на сетевых дисках. Все записи
+идут в BEGIN IMMEDIATE под блокировкой файла. Пути к файлам должны быть
+одинаковыми на всех машинах, а часы - синхронизированы, потому что срок
+аренды задаётся по time.time().
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass, replace
+
+from engine import BatchEngine, MixSettings, cleanup_temp_dirs, remove_temp_outputs
+from joblog import DEFAULT_LOG_LINES
+import telemetry
+from variants import OutputVariant
+
+QUEUED = 'queued'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+DEFAULT_LEASE_SECONDS = 60.0
+MAX_ATTEMPTS = 3
+# Как часто свободный исполнитель проверяет очередь, пока другие заняты
+IDLE_POLL_SECONDS = 2.0
+BUSY_TIMEOUT = 30.0
+
+
+def settings_to_json(settings):
+    return json.dumps(asdict(settings), sort_keys=True)
+
+
+def settings_from_json(text):
+    data = json.loads(text)
+    variants = tuple(OutputVariant(**variant) for variant in data.pop('variants', ()))
+    return replace(MixSettings(**data), variants=variants)
+
+
+def default_worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+@dataclass
+class LeasedJob:
+    """Задание, выданное исполнителю"""
+    id: int
+    base: str
+    video: str
+    audio: str
+    settings: MixSettings
+    attempt: int
+
+    def pair(self):
+        return {'video': self.video, 'audio': self.audio}
+
+
+class WorkQueue:
+    """Очередь пар в SQLite: queued -> leased -> done (или failed)"""
+
+    def __init__(self, db_path, timeout=BUSY_TIMEOUT):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS queue (
+                id INTEGER PRIMARY KEY,
+                base TEXT NOT NULL,
+                video TEXT NOT NULL UNIQUE,
+                audio TEXT,
+                settings TEXT NOT NULL,
+                state TEXT NOT NULL,
+                worker TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                status TEXT,
+                error TEXT,
+                updated REAL NOT NULL
+            )""")
+
+    def _write(self, func, *args):
+        """func(*args) в одной пишущей транзакции"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(*args)
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            return result
+
+    def enqueue(self, file_pairs, settings):
+        """Ставит пары с видео в очередь. Выполняющиеся сейчас задания не трогает.
+        Возвращает число поставленных заданий"""
+        settings_json = settings_to_json(settings)
+        jobs = [(base, os.path.abspath(pair['video']), os.path.abspath(pair['audio']) if pair['audio'] else None)
+                for base, pair in file_pairs.items() if pair['video']]
+
+        def insert():
+            now = time.time()
+            count = 0
+            for base, video, audio in jobs:
+                cursor = self.conn.execute(
+                    "INSERT INTO queue (base, video, audio, settings, state, updated) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(video) DO UPDATE SET base=excluded.base, audio=excluded.audio, "
+                    "settings=excluded.settings, state=excluded.state, worker=NULL, lease_until=NULL, "
+                    "attempts=0, status=NULL, error=NULL, updated=excluded.updated WHERE queue.state != ?",
+                    (base, video, audio, settings_json, QUEUED, now, LEASED))
+                count += cursor.rowcount
+            return count
+
+        return self._write(insert)
+
+    def lease(self, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Следующее задание для worker или None. Задания с истёкшей арендой
+        выдаются снова, после MAX_ATTEMPTS попыток считаются неудачными"""
+        def take():
+            now = time.time()
+            while True:
+                row = self.conn.execute(
+                    "SELECT id, base, video, audio, settings, state, attempts, worker FROM queue "
+                    "WHERE state=? OR (state=? AND lease_until < ?) ORDER BY id LIMIT 1",
+                    (QUEUED, LEASED, now)).fetchone()
+                if row is None:
+                    return None
+                job_id, base, video, audio, settings_json, state, attempts, previous = row
+                if state == LEASED:
+                    print(f"Аренда {base} у {previous} истекла")
+                    if attempts >= MAX_ATTEMPTS:
+                        self.conn.execute(
+                            "UPDATE queue SET state=?, error=?, worker=NULL, lease_until=NULL, updated=? WHERE id=?",
+                            (FAILED, f"аренда истекла {attempts} раз", now, job_id))
+                        continue
+                self.conn.execute(
+                    "UPDATE queue SET state=?, worker=?, lease_until=?, attempts=attempts+1, updated=? WHERE id=?",
+                    (LEASED, worker, now + lease_seconds, now, job_id))
+                return LeasedJob(job_id, base, video, audio, settings_from_json(settings_json), attempts + 1)
+
+        return self._write(take)
+
+    def heartbeat(self, job_id, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Продлевает аренду; False - задание уже отдано другому исполнителю"""
+        def extend():
+            now = time.time()
+            cursor = self.conn.execute(
+                "UPDATE queue SET lease_until=?, updated=? WHERE id=? AND state=? AND worker=?",
+                (now + lease_seconds, now, job_id, LEASED, worker))
+            return cursor.rowcount == 1
+
+        return self._write(extend)
+
+    def finish(self, job_id, worker, status, error=None):
+        """Итог задания: статус BatchEngine ('done', 'error' и т.п.)"""
+        state = FAILED if status == 'error' else DONE
+
+        def update():
+            self.conn.execute(
+                "UPDATE queue SET state=?, status=?, error=?, lease_until=NULL, updated=? "
+                "WHERE id=? AND state=? AND worker=?",
+                (state, status, error, time.time(), job_id, LEASED, worker))
+
+        self._write(update)
+
+    def release(self, job_id, worker):
+        """Возвращает задание в очередь без траты попытки (исполнитель остановлен)"""
+        def update():
+            self.conn.execute(
+                "UPDATE queue SET state=?, worker=NULL, lease_until=NULL, attempts=MAX(attempts-1, 0), "
+                "updated=? WHERE id=? AND state=? AND worker=?",
+                (QUEUED, time.time(), job_id, LEASED, worker))
+
+        self._write(update)
+
+    def counts(self):
+        """{состояние: число заданий}"""
+        with self.lock:
+            return dict(self.conn.execute("SELECT state, COUNT(*) FROM queue GROUP BY state").fetchall())
+
+    def pending(self):
+        """Сколько заданий ещё не завершено (в очереди или в аренде)"""
+        counts = self.counts()
+        return counts.get(QUEUED, 0) + counts.get(LEASED, 0)
+
+    def failures(self):
+        """[(видео, ошибка)] неудачных заданий"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT video, COALESCE(error, status) FROM queue WHERE state=? ORDER BY id", (FAILED,)).fetchall()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class QueueWorker:
+    """Исполнитель: берёт задания из очереди, пока они не кончатся.
+
+    slots - сколько заданий выполнять одновременно (по аренде и BatchEngine
+    на каждое), threads - потоков ffmpeg на задание. on_status передаётся
+    BatchEngine. Отчёт о всех выполненных заданиях пишется в report_dir,
+    логи ffmpeg заданий (log_dir, log_lines, verbose) - как у BatchEngine.
+    """
+
+    def __init__(self, queue, name=None, slots=1, threads=None, lease_seconds=DEFAULT_LEASE_SECONDS,
+                 on_status=None, force=False, report_dir=None, log_dir=None,
+                 log_lines=DEFAULT_LOG_LINES, verbose=False):
+        self.queue = queue
+        self.name = name or default_worker_name()
+        self.slots = max(1, slots)
+        self.threads = threads
+        self.lease_seconds = lease_seconds
+        self.on_status = on_status
+        self.force = force
+        self.report_dir = report_dir
+        self.log_dir = log_dir
+        self.log_lines = log_lines
+        self.verbose = verbose
+        self.records = []
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.engines = {}
+        self.pairs = {}
+        self.results = {}
+
+    def run(self):
+        """Блокирующий вызов; возвращает {base: статус} выполненных заданий"""
+        remaining = [self.slots]
+        all_done = threading.Event()
+
+        def slot(name):
+            try:
+                self.loop(name)
+            finally:
+                with self.lock:
+                    remaining[0] -= 1
+                    if not remaining[0]:
+                        all_done.set()
+
+        started = time.perf_counter()
+        for index in range(self.slots):
+            threading.Thread(target=slot, args=(f"{self.name}/{index}",), daemon=True).start()
+        # Не Thread.join: прерванный Ctrl+C join потом возвращается сразу, не дожидаясь потока
+        try:
+            while not all_done.wait(0.5):
+                pass
+        except KeyboardInterrupt:
+            self.stop()
+            all_done.wait()
+            raise
+        finally:
+            self.write_report(time.perf_counter() - started)
+        if not self.stop_event.is_set() and self.queue.pending() == 0:
+            # Очередь пуста и никто больше не пишет во временные папки
+            cleanup_temp_dirs(self.pairs)
+        return self.results
+
+    def loop(self, name):
+        while not self.stop_event.is_set():
+            job = self.queue.lease(name, self.lease_seconds)
+            if job is None:
+                if self.queue.pending() == 0:
+                    return
+                self.stop_event.wait(IDLE_POLL_SECONDS)
+                continue
+            self.run_job(name, job)
+
+    def run_job(self, name, job):
+        print(f"[{name}] {job.base} (попытка {job.attempt})")
+        batch = BatchEngine(job.settings, on_status=self.on_status, max_workers=1,
+                            threads=self.threads, force=self.force, log_dir=self.log_dir,
+                            log_lines=self.log_lines, verbose=self.verbose)
+        with self.lock:
+            self.engines[name] = batch
+            self.pairs[job.base] = job.pair()
+        lost = threading.Event()
+        finished = threading.Event()
+
+        def keep_lease():
+            while not finished.wait(self.lease_seconds / 4):
+                try:
+                    alive = self.queue.heartbeat(job.id, name, self.lease_seconds)
+                except sqlite3.Error as e:
+                    # Очередь временно недоступна - аренда ещё действует
+                    print(f"[{name}] Не удалось продлить аренду {job.base}: {e}")
+                    continue
+                if not alive:
+                    print(f"[{name}] Аренда {job.base} потеряна, задание остановлено")
+                    lost.set()
+                    batch.stop()
+                    return
+
+        heartbeat = threading.Thread(target=keep_lease, daemon=True)
+        heartbeat.start()
+        try:
+            # Временные папки общие с другими исполнителями - их убирает последний
+            status = batch.run({job.base: job.pair()}, cleanup=False).get(job.base, 'done')
+        except Exception as e:
+            print(f"[{name}] {job.base}: {e}")
+            status = 'error'
+        finally:
+            finished.set()
+            heartbeat.join()
+            with self.lock:
+                self.engines.pop(name, None)
+                self.records.extend(batch.telemetry.values())
+        if lost.is_set():
+            return
+        if status == 'stopped' or (self.stop_event.is_set() and status != 'done'):
+            self.queue.release(job.id, name)
+            remove_temp_outputs({job.base: job.pair()}, {job.base: status}, job.settings)
+            return
+        self.queue.finish(job.id, name, status)
+        with self.lock:
+            self.results[job.base] = status
+
+    def write_report(self, wall_seconds):
+        if not self.report_dir or not self.records:
+            return
+        try:
+            path = telemetry.write_reports(self.records, wall_seconds, self.report_dir,
+                                           self.name.replace(':', '-'), worker=self.name)
+            print(f"Отчёт исполнителя: {path}")
+        except OSError as e:
+            print(f"Не удалось записать отчёт исполнителя: {e}")
+
+    def stop(self):
+        """Останавливает выполнение; взятые задания возвращаются в очередь"""
+        self.stop_event.set()
+        with self.lock:
+            engines = list(self.engines.values())
+        for batch in engines:
+            batch.stop()